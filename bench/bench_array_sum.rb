@@ -0,0 +1,18 @@
+require "libz3"
+require "libarraysolver"
+
+# Constrains the sum of a 10k element array, which builds one flat n-ary
+# term instead of a chain of nested partial sums
+
+SIZE = 10000
+
+ary = [0] * SIZE
+
+t = Time.now
+c = always { ary.sum == 1000 }
+puts "always { ary.sum == 1000 }: #{(Time.now - t) * 1000} ms for #{SIZE} elements"
+
+t = Time.now
+c.disable
+c.enable
+puts "disable/enable: #{(Time.now - t) * 1000} ms"
@@ -0,0 +1,24 @@
+require "libz3"
+
+# Reads a constrained instance variable 10M times without writing it in
+# between, so every read after the first can use the stored value
+
+class Counter
+  def initialize
+    @count = 0
+    always { @count >= 42 }
+  end
+
+  def read(n)
+    i = 0
+    while i < n
+      @count
+      i += 1
+    end
+  end
+end
+
+counter = Counter.new
+t = Time.now
+counter.read(10_000_000)
+puts "#{(Time.now - t) * 1000} ms for 10M reads"
@@ -0,0 +1,40 @@
+require "libcassowary"
+require "libz3"
+
+# Reads instance variables constrained by Cassowary and Z3 in a tight
+# loop and reports how often the solvers were asked for their #weight
+
+$weight_sends = 0
+[Cassowary::SimplexSolver, Z3].each do |solver_class|
+  solver_class.class_eval do
+    alias_method :uncounted_weight, :weight
+    def weight
+      $weight_sends += 1
+      uncounted_weight
+    end
+  end
+end
+
+class Point
+  attr_reader :x, :y
+
+  def initialize
+    @x = 0.0
+    @y = 0
+    always(solver: Cassowary::SimplexSolver.instance) { @x >= 10 }
+    always(solver: Z3::Instance) { @y >= 10 && @y <= 20 }
+  end
+
+  def sum
+    @x + @y
+  end
+end
+
+ITERATIONS = 100000
+
+point = Point.new
+$weight_sends = 0
+t = Time.now
+ITERATIONS.times { point.sum }
+puts "#{(Time.now - t) * 1000} ms for #{ITERATIONS} reads of two constrained ivars"
+puts "#{$weight_sends} #weight sends"
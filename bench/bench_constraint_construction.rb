@@ -0,0 +1,16 @@
+require "libz3"
+
+# Constructs 10k constraints over the same three variables, first only
+# running their predicates and then also enabling and disabling them
+
+ITERATIONS = 10000
+
+a, b, c = 1, 2, 3
+
+t = Time.now
+ITERATIONS.times { Constraint.new { a + b == c } }
+puts "Constraint.new: #{(Time.now - t) * 1000} ms for #{ITERATIONS} constraints"
+
+t = Time.now
+ITERATIONS.times { always { a + b == c }.disable }
+puts "always: #{(Time.now - t) * 1000} ms for #{ITERATIONS} constraints"
@@ -0,0 +1,28 @@
+require "libdeltablue"
+
+# A spreadsheet column where every cell is the one above plus one. Only
+# the first assignment to the top cell has to plan, the others run the
+# cached plan for it
+
+class Cell
+  attr_accessor :value
+
+  def initialize(value)
+    self.value = value
+  end
+end
+
+ITERATIONS = 200
+
+[10, 100].each do |count|
+  cells = count.times.map { |i| Cell.new(i) }
+  cells.each_cons(2) do |above, below|
+    always predicate: -> { below.value == above.value + 1 },
+           methods: -> {[ below.value <-> { above.value + 1 } ]}
+  end
+  plans = DeltaBlue::Instance.plan_count
+  t = Time.now
+  ITERATIONS.times { |i| cells.first.value = i }
+  puts "#{count} cells: #{(Time.now - t) * 1000 / ITERATIONS} ms/assignment, " \
+       "#{DeltaBlue::Instance.plan_count - plans} plans"
+end
@@ -0,0 +1,52 @@
+require "libcassowary"
+require "libsimplex"
+
+# Compares the Ruby Cassowary solver with the built-in SimplexSolver on
+# layouts in the style of rectangle_constraint_demo.rb: a row of
+# rectangles sharing the width of a window, which is resized in a loop
+
+class Rect
+  attr_accessor :left, :right
+
+  def initialize(left, right)
+    @left = left
+    @right = right
+  end
+
+  def width
+    right - left
+  end
+end
+
+def layout(solver, count, constraints)
+  window = Rect.new(0.0, 1000.0)
+  rects = count.times.map { |i| Rect.new(i * 20.0, i * 20.0 + 10.0) }
+  first, last = rects.first, rects.last
+  constraints << always(solver: solver) { first.left == window.left }
+  constraints << always(solver: solver) { last.right == window.right }
+  rects.each_cons(2) do |a, b|
+    constraints << always(solver: solver) { b.left == a.right + 10 }
+  end
+  rects.each do |r|
+    constraints << always(solver: solver) { r.width >= 10 }
+    constraints << always(priority: :medium, solver: solver) { r.width == 100 }
+  end
+  window
+end
+
+ITERATIONS = 100
+
+[10, 40].each do |count|
+  [["cassowary", Cassowary::SimplexSolver.instance],
+   ["simplex", SimplexSolver::Instance]].each do |name, solver|
+    constraints = []
+    t = Time.now
+    window = layout(solver, count, constraints)
+    setup = (Time.now - t) * 1000
+    t = Time.now
+    ITERATIONS.times { |i| window.right = 1000.0 + (i % 50) * 20 }
+    puts "#{count} rectangles (#{name}): #{setup} ms setup, " \
+         "#{(Time.now - t) * 1000 / ITERATIONS} ms/resize"
+    constraints.each(&:disable)
+  end
+end
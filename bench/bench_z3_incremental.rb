@@ -0,0 +1,81 @@
+require "libz3"
+
+# Compares incremental (push/pop) and reset-and-reassert solving in
+# Z3 on edit loops over the eight queens workload from
+# tests/constraints/constraintfixtures/nqueens.rb and a 4x4 version of
+# the puzzle in sudoku.rb
+
+class Queen
+  attr_accessor :row, :column
+
+  def initialize(row, column, constraints)
+    self.row = row
+    self.column = column
+    constraints << always do
+      self.row >= 0 && self.row <= 7 &&
+        self.column >= 0 && self.column <= 7
+    end
+  end
+
+  def diagonal
+    row - column - 1
+  end
+end
+
+class Cell
+  attr_accessor :value
+
+  def initialize(constraints)
+    self.value = 0
+    constraints << always { self.value >= 1 && self.value <= 4 }
+  end
+end
+
+def nqueens(constraints)
+  queens = 8.times.map { Queen.new(0, 0, constraints) }
+  queens.each do |queen1|
+    queens.each do |queen2|
+      if queen1 != queen2
+        constraints << always do
+          queen1.row != queen2.row &&
+            queen1.column != queen2.column &&
+            queen1.diagonal != queen2.diagonal
+        end
+      end
+    end
+  end
+  lambda { |i| queens[0].row = i % 8 }
+end
+
+def sudoku(constraints)
+  rows = 4.times.map { 4.times.map { Cell.new(constraints) } }
+  groups = rows + 4.times.map { |c| rows.map { |r| r[c] } }
+  [0, 2].each do |r|
+    [0, 2].each do |c|
+      groups << [rows[r][c], rows[r][c + 1], rows[r + 1][c], rows[r + 1][c + 1]]
+    end
+  end
+  groups.each do |group|
+    group.each_with_index do |cell1, idx|
+      group[(idx + 1)..-1].each do |cell2|
+        constraints << always { cell1.value != cell2.value }
+      end
+    end
+  end
+  lambda { |i| rows[0][0].value = (i % 4) + 1 }
+end
+
+ITERATIONS = 200
+
+[[:nqueens, method(:nqueens)], [:sudoku, method(:sudoku)]].each do |name, workload|
+  constraints = []
+  edit = workload.call(constraints)
+  [true, false].each do |incremental|
+    Z3::Instance.incremental = incremental
+    t = Time.now
+    ITERATIONS.times { |i| edit.call(i) }
+    mode = incremental ? "incremental" : "reset"
+    puts "#{name} (#{mode}): #{(Time.now - t) * 1000 / ITERATIONS} ms/assignment"
+  end
+  constraints.each(&:disable)
+end
@@ -0,0 +1,21 @@
+require "libz3"
+
+# Reads 100k real-valued interpretations from a solved Z3 model, half
+# of them rationals and half of them algebraic numbers
+
+third = 0.0
+root = 0.0
+always { third * 3 == 1 }
+always { root * root == 2 && root > 0 }
+ptrs = Constraint.new { [third, root] }.value
+
+t = Time.now
+50000.times { Z3::Instance.values_for(ptrs) }
+puts "values_for: #{(Time.now - t) * 1000} ms"
+
+t = Time.now
+50000.times do
+  ptrs[0].value
+  ptrs[1].value
+end
+puts "Z3Pointer#value: #{(Time.now - t) * 1000} ms"
@@ -3,7 +3,13 @@ class ArrayConstraintVariable < ConstraintObject
   # array.
   class RangeConstraint < ConstraintObject
     def initialize(constraints)
-      @constraints = constraints
+      solver = ArraySolver.solver_of(constraints)
+      if solver.respond_to?(:and)
+        # one conjunction to enable and disable in bulk
+        @constraints = [solver.and(constraints)]
+      else
+        @constraints = constraints
+      end
     end
 
     def enable(strength = :required)
@@ -31,8 +37,7 @@ class NumericArrayConstraintVariable < ArrayConstraintVariable
   end
 
   def sum
-    return 0 if value.empty?
-    @constraint_variables[0] + self[1..-1].sum
+    ArraySolver.sum(@constraint_variables)
   end
 
   def __size
@@ -83,8 +88,7 @@ class NumericArrayConstraintVariable < ArrayConstraintVariable
 
   def alldifferent?
     raise "Need Z3 for this" unless defined? Z3
-    return true if @constraint_variables.empty?
-    @constraint_variables[0].alldifferent(*@constraint_variables[1..-1])
+    Z3.distinct(@constraint_variables)
   end
 
   include Enumerable
@@ -151,6 +155,22 @@ module ArraySolver
   def self.weight
     50
   end
+
+  # The solver of the first term, asked to build flat n-ary terms
+  def self.solver_of(terms)
+    terms[0].solver if !terms.empty? && terms[0].respond_to?(:solver)
+  end
+
+  def self.sum(terms)
+    solver = solver_of(terms)
+    if terms.empty?
+      0
+    elsif solver.respond_to?(:sum)
+      solver.sum(terms)
+    else
+      terms.inject(:+)
+    end
+  end
 end
 
 class Array
@@ -159,8 +179,7 @@ class Array
   end
 
   def sum
-    return 0 if empty?
-    self[0] + self[1..-1].sum
+    ArraySolver.sum(self)
   end
 
   def assign_constraint_value(val)
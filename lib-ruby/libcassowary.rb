@@ -11,15 +11,73 @@ class Cassowary::SimplexSolver
     when Numeric, nil
       v = Cassowary::Variable.new(value: value || 0)
       v.solver = self
-      Cassowary::SimplexSolver.instance.add_stay(v)
+      v.lazy_stay = !@without_stays
       v
     end
   end
+
+  # Variables created in the block get no stays, for regions that their
+  # constraints determine completely
+  def without_stays
+    without_stays, @without_stays = @without_stays, true
+    yield
+  ensure
+    @without_stays = without_stays
+  end
+
+  # Stays are only added for variables that constraints leave
+  # under-determined. A required equation determines one of its
+  # variables without a stay from the others, which get one. Variables
+  # that are only read never grow the tableau
+  alias add_constraint_without_lazy_stays add_constraint
+  def add_constraint(constraint, *args)
+    free = constraint.expression.terms.keys.select do |var|
+      var.is_a?(Cassowary::Variable) && var.lazy_stay && !var.determined_by
+    end
+    if constraint.is_a?(Cassowary::LinearEquation) && constraint.required? && !free.empty?
+      free.pop.determined_by = constraint
+    end
+    free.each(&:ensure_stay)
+    add_constraint_without_lazy_stays(constraint, *args)
+  end
+
+  # Variables the removed equation determined need their stay now
+  alias remove_constraint_without_lazy_stays remove_constraint
+  def remove_constraint(constraint, *args)
+    result = remove_constraint_without_lazy_stays(constraint, *args)
+    constraint.expression.terms.each_key do |var|
+      if var.is_a?(Cassowary::Variable) && var.determined_by.equal?(constraint)
+        var.determined_by = nil
+        var.ensure_stay
+      end
+    end
+    result
+  end
+
+  # One flat linear expression instead of a chain of partial sums
+  def sum(terms)
+    terms.inject(Cassowary::LinearExpression.new) do |expression, term|
+      expression.add_expression(term.as_linear_expression)
+    end
+  end
 end
 
 class Cassowary::Variable
-  attr_accessor :solver
+  attr_accessor :solver, :lazy_stay, :determined_by
+
+  def ensure_stay
+    if @lazy_stay
+      @lazy_stay = false
+      solver.add_stay(self)
+    end
+  end
 
+  def stay_free!
+    @lazy_stay = false
+  end
+
+  # Pinned with a required equation rather than an edit variable, edit
+  # variables are left to the edit sessions of Object#edit
   def readonly!
     unless @ro_constraint
       @ro_constraint = self == value
@@ -97,7 +155,7 @@ class Object
 
     accessors = opts[:accessors]
 
-    return stream, strength, accessors, block
+    return stream, strength, accessors, block, opts
   end
 
   def __create_edit_vars_from_accessors(accessors, constraints, block)
@@ -134,6 +192,7 @@ class Object
         solver.add_edit_var var, strength
       end
       solver.solve
+      Constraint.solution_changed(solver)
       solver.begin_edit
       next_vals = stream.next
 
@@ -147,6 +206,7 @@ class Object
         end
 
         solver.resolve [*next_vals]
+        Constraint.solution_changed(solver)
         begin
           next_vals = stream.next
         rescue StopIteration
@@ -154,11 +214,78 @@ class Object
         end
       end
       solver.end_edit
+      Constraint.solution_changed(solver)
+    end
+  end
+
+  # With chunked: true, each stream.next returns many frames, either as
+  # an array of frames or as a flat array of values. Only the last
+  # frame of each chunk is solved, unless a results: array is given to
+  # receive the values of all edit variables after every frame.
+  def __do_chunked_edit(stream, strength, vars, accessors, results)
+    Cassowary::SimplexSolver.instance.tap do |solver|
+      vars.each do |var|
+        solver.add_edit_var var, strength
+      end
+      solver.solve
+      Constraint.solution_changed(solver)
+      solver.begin_edit
+
+      width = vars.size
+      # values or complex objects making up one frame
+      per_frame = accessors ? width / accessors.size : width
+      values = Array.new(width, 0.0)
+      offset = 0
+      while chunk = __next_edit_chunk(stream)
+        next if chunk.empty?
+        nested = chunk[0].is_a?(Array)
+        frames = nested ? chunk.size : chunk.size / per_frame
+        frame = results ? 0 : frames - 1
+        while frame < frames
+          __fill_edit_frame(values, chunk, nested, frame, per_frame, accessors)
+          solver.resolve values
+          if results
+            i = 0
+            while i < width
+              results[offset] = vars[i].value
+              offset += 1
+              i += 1
+            end
+          end
+          frame += 1
+        end
+        Constraint.solution_changed(solver)
+      end
+      solver.end_edit
+      Constraint.solution_changed(solver)
+    end
+  end
+
+  def __next_edit_chunk(stream)
+    stream.next
+  rescue StopIteration
+    nil
+  end
+
+  def __fill_edit_frame(values, chunk, nested, frame, per_frame, accessors)
+    i = 0
+    while i < per_frame
+      item = nested ? chunk[frame][i] : chunk[frame * per_frame + i]
+      if accessors
+        j = 0
+        while j < accessors.size
+          values[i * accessors.size + j] = item.send(accessors[j])
+          j += 1
+        end
+      else
+        values[i] = item
+      end
+      i += 1
     end
   end
 
   def edit(stream, opts = nil, &block)
-    stream, strength, accessors, block = __parse_edit_constraint_arguments(stream, opts, block)
+    stream, strength, accessors, block, opts = __parse_edit_constraint_arguments(stream, opts, block)
     temp_constraints = nil
 
     if accessors
@@ -169,7 +296,11 @@ class Object
     end
 
     __check_edit_vars(vars)
-    __do_edit(stream, strength, vars, accessors)
+    if opts[:chunked]
+      __do_chunked_edit(stream, strength, vars, accessors, opts[:results])
+    else
+      __do_edit(stream, strength, vars, accessors)
+    end
 
     temp_constraints.each(&:disable) if temp_constraints
     nil
@@ -1,106 +1,31 @@
-$LOAD_PATH.unshift(File.expand_path("../deltablue/lib/", __FILE__))
-require "deltared"
-
-# XXX: Ugh, no namespace
-class DeltaRed::Variable < ConstraintObject
-  def predicates
-    @predicates ||= []
-  end
-
-  def add_predicate(pred)
-    predicates << pred if pred
-  end
-
-  def <(block)
-    # TODO: check that we're in `always'
-    # TODO: strength and stuff
-    constraint = ::Constraint.new(&block)
-    k_sources = constraint.constraint_variables
-    mapping = {k_sources => self}
-    DeltaRed::Formula.new(mapping, block)
-  end
+# The built-in DeltaBlue local propagation solver. Constraints are
+# added with a predicate and formulas for their variables:
+#
+#   always predicate: -> { string == number.to_s },
+#          methods: -> {[ string <-> { number.to_s },
+#                         number <-> { string.to_i } ]}
+DeltaBlue::Instance = DeltaBlue.new
+
+# the names of the deltared library this solver replaces
+module DeltaRed
+  Solver = DeltaBlue
+  Variable = DeltaBlue::Variable
+  Formula = DeltaBlue::Formula
+end
 
+class DeltaBlue::Variable
+  # while the formulas are built, calculations on variables are
+  # placeholders for their results
   def method_missing(name, *args, &block)
-    # XXX: Is this really necessary?
     super unless value.respond_to?(name)
     self
   end
-
-  def begin_assign(v)
-    @proposed_value = v
-  end
-
-  def assign
-    prev = @value
-    @value = @proposed_value
-    unless predicates.all?(&:call)
-      # assign previous value and let deltablue handle the constraints
-      @value = prev
-      self.value = @proposed_value
-    end
-  end
-
-  def end_assign
-    @proposed_value = nil
-  end
-end
-
-class DeltaRed::Formula < ConstraintObject
-  def initialize(mapping, block)
-    @mapping, @block = mapping, block
-  end
-
-  def add_to_constraint(c)
-    c.formula(@mapping) {|*a| @block.call }
-  end
-
-  def add_predicate(proc)
-    variables.each do |var|
-      var.add_predicate(proc)
-    end
-  end
-
-  def variables
-    (@mapping.keys + @mapping.values).flatten.uniq
-  end
-end
-
-class DeltaRed::Solver < ConstraintObject
-  def add_constraint(predicate, strength, methods)
-    formulas = Constraint.new(&methods).value
-
-    strength ||= :required
-    strength = case strength
-               when :weak then DeltaRed::WEAK
-               when :medium then DeltaRed::MEDIUM
-               when :strong then DeltaRed::STRONG
-               when :required then DeltaRed::REQUIRED
-               else raise ArgumentError, "unsupported strength #{strength}"
-               end
-
-    DeltaRed.constraint!(strength: strength) do |c|
-      formulas.each do |formula|
-        formula.add_to_constraint(c)
-        formula.add_predicate(predicate)
-      end
-    end
-  end
-
-  Instance = self.new
-
-  def constraint_variable_for(obj)
-    DeltaRed.variables(obj)
-  end
-
-  def weight
-    10
-  end
 end
 
 # Enable DeltaBlue
 class Object
   def constraint_solver
-    DeltaRed::Solver::Instance
+    DeltaBlue::Instance
   end
 end
 
@@ -119,7 +44,7 @@ class Object
       elsif block and predicate.nil?
         predicate = block
       end
-      solver = strength_or_hash[:solver] || DeltaRed::Solver::Instance
+      solver = strength_or_hash[:solver] || DeltaBlue::Instance
       solver.add_constraint(predicate, strength, methods)
     else
       if strength_or_hash.nil?
@@ -0,0 +1,49 @@
+# The built-in simplex solver, for linear constraints over floats with
+# strengths (:required, :strong, :medium, :weak) and edit variables
+SimplexSolver::Instance = SimplexSolver.new
+
+class Numeric
+  alias coerce_wo_simplex coerce
+  def coerce(other)
+    if other.kind_of?(SimplexSolver::Variable) || other.kind_of?(SimplexSolver::Expression)
+      [other, other.solver.constant(self)]
+    else
+      coerce_wo_simplex(other)
+    end
+  end
+end
+
+class Float
+  alias coerce_wo_simplex coerce
+  def coerce(other)
+    if other.kind_of?(SimplexSolver::Variable) || other.kind_of?(SimplexSolver::Expression)
+      [other, other.solver.constant(self)]
+    else
+      coerce_wo_simplex(other)
+    end
+  end
+end
+
+class Fixnum
+  alias coerce_wo_simplex coerce
+  def coerce(other)
+    if other.kind_of?(SimplexSolver::Variable) || other.kind_of?(SimplexSolver::Expression)
+      [other, other.solver.constant(self)]
+    else
+      coerce_wo_simplex(other)
+    end
+  end
+end
+
+# Only claim plain numbers when no other solver library has, so that
+# requiring libsimplex next to libz3 or libcassowary leaves their
+# constraints alone. Pass the solver explicitly to use both.
+class Numeric
+  unless method_defined?(:constraint_solver)
+    def constraint_solver
+      SimplexSolver::Instance
+    end
+  end
+end
+
+puts "Simplex constraint solver loaded."
@@ -1,9 +1,11 @@
+# Configure it with Z3::Instance.configure(logic: ..., timeout_ms: ...,
+# tactic: ...) before adding constraints
 Z3::Instance = Z3.new
 
 class Z3::Z3Pointer
   def begin_assign(v)
     @proposed_value_constraint = self == v
-    Z3::Instance.add_constraint(@proposed_value_constraint)
+    Z3::Instance.add_temporary_constraint(@proposed_value_constraint)
   end
 
   def assign
@@ -11,7 +13,7 @@ class Z3::Z3Pointer
   end
 
   def end_assign
-    Z3::Instance.remove_constraint(@proposed_value_constraint)
+    Z3::Instance.remove_temporary_constraint(@proposed_value_constraint)
     @proposed_value_constraint = nil
   end
 
@@ -25,13 +27,13 @@ class Z3::Z3Pointer
   def readonly!
     unless @ro_constraint
       @ro_constraint = self == value
-      Z3::Instance.add_constraint(@ro_constraint)
+      Z3::Instance.add_temporary_constraint(@ro_constraint)
     end
   end
 
   def writable!
     if @ro_constraint
-      Z3::Instance.remove_constraint(@ro_constraint)
+      Z3::Instance.remove_temporary_constraint(@ro_constraint)
       @ro_constraint = nil
     end
   end
@@ -71,6 +73,27 @@ class Fixnum
 end
 
 class Z3
+  # n-ary terms over arrays of pointers and constants, built in one call
+  def self.sum(terms)
+    Z3::Instance.sum(terms)
+  end
+
+  def self.product(terms)
+    Z3::Instance.product(terms)
+  end
+
+  def self.and(terms)
+    Z3::Instance.and(terms)
+  end
+
+  def self.or(terms)
+    Z3::Instance.or(terms)
+  end
+
+  def self.distinct(terms)
+    Z3::Instance.distinct(terms)
+  end
+
   def weight
     100
   end
@@ -106,15 +129,17 @@ class FalseClass
 end
 
 class Array
-  def alldifferent?(to=[])
+  def alldifferent?
     if self.empty?
       return true
     elsif defined? Z3 and self[0].is_a?(Z3::Z3Pointer)
-      if self.size == 1
-        return self[0].alldifferent(*to)
-      else
-        return self[1..-1].alldifferent?(to << self[0])
+      terms = []
+      i = 0
+      while i < self.size
+        terms << self[i]
+        i += 1
       end
+      return Z3.distinct(terms)
     else
       # we're not constructing constraints or Z3 cannot solve this
       return self.uniq.size == self.size
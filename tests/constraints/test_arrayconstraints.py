@@ -177,3 +177,56 @@ class TestArrayConstraints(BaseTopazTest):
             "libcassowary", "libz3")
         assert reduce(operator.add, self.unwrap(space, w_ca)) == 100
         assert reduce(operator.add, self.unwrap(space, w_z3)) == 100
+
+    def test_constraints_follow_moved_elements(self, space):
+        w_ca, w_z3 = self.execute(
+            space,
+            """
+            a = [1, 2, 3]
+            always { a[2] == 10 }
+            a.unshift(0)
+            a[2] = 7
+            res = [[a[0], a[1], a[2], a[3]]]
+            a.delete_at(0)
+            a.rotate!
+            always { a[0] == a[1] }
+            res << [a[0], a[1], a[2]]
+            a.insert(1, 5)
+            res << a[2]
+            return res
+            """,
+            "libcassowary", "libz3")
+        assert self.unwrap(space, w_ca) == [[0, 1, 7, 10], [10, 10, 1], 10]
+        assert self.unwrap(space, w_z3) == [[0, 1, 7, 10], [10, 10, 1], 10]
+
+    def test_constraints_follow_sorted_elements(self, space):
+        w_ca, w_z3 = self.execute(
+            space,
+            """
+            a = [30, 10, 20]
+            always { a[0] == 2 * a[1] + 10 }
+            a.sort!
+            a[0] = 15
+            res = [[a[0], a[1], a[2]]]
+            a.sort_by! { |x| -x }
+            a[0] = 50
+            res << [a[0], a[1], a[2]]
+            return res
+            """,
+            "libcassowary", "libz3")
+        assert self.unwrap(space, w_ca) == [[15, 20, 40], [50, 20, 20]]
+        assert self.unwrap(space, w_z3) == [[15, 20, 40], [50, 20, 20]]
+
+    def test_flat_sum(self, space):
+        w_res = space.execute("""
+        require "libz3"
+        require "libarraysolver"
+        a = [0] * 20
+        always { a.sum == 100 }
+        always { a[0] == 100 }
+        x, y = 1, 2
+        ptrs = Constraint.new { [x, y] }.value
+        same = Z3::Instance.sum(ptrs).equal?(Z3::Instance.sum(ptrs))
+        return a.inject(:+), a[0], same, Z3::Instance.sum([]).equal?(Z3::Instance.make_int(0))
+        """)
+        assert self.unwrap(space, w_res) == [100, 100, True, True]
@@ -579,6 +579,44 @@ class TestConstraintVariableObject(BaseTopazTest):
             True, 20, # after cassowary assigned 20, Z3 is triggered and picks up 20
         ]
 
+    def test_solver_interaction_reads_propagate_once(self, space):
+        w_res = space.execute("""
+        require "libcassowary"
+        require "libz3"
+
+        a = true
+        b = 10
+        always(solver: Cassowary::SimplexSolver.instance) { b >= 11 }
+        always(solver: Z3::Instance) { a == (b > 15) }
+        b = 20
+        Topaz.reset_propagation_stats
+        10.times { b }
+        stats = Topaz.propagation_stats
+        return a, b, stats[:reads], stats[:propagating_reads], stats[:solves]
+        """)
+        assert self.unwrap(space, w_res) == [True, 20, 11, 0, 0]
+
+    def test_constraint_stats(self, space):
+        w_res = space.execute("""
+        require "libz3"
+        Topaz::ConstraintStats.reset
+        Topaz::ConstraintStats.enable
+        a = 1
+        c = always { a >= 0 }
+        a = 5
+        Topaz::ConstraintStats.disable
+        a = 6
+        report = Topaz::ConstraintStats.report
+        z3 = report[:solvers]["Z3"]
+        json = Topaz::ConstraintStats.to_json
+        return report[:events][:run_predicate][:count],
+               report[:constraints][c][:enable][:count],
+               z3[:begin_assign][:count],
+               z3.has_key?(:solve),
+               json.start_with?('{"events": {"run_predicate"')
+        """)
+        assert self.unwrap(space, w_res) == [1, 1, 1, True, True]
+
     @py.test.mark.xfail
     def test_solver_interaction_assignment2(self, space):
         w_res = space.execute("""
@@ -732,6 +770,21 @@ class TestConstraintVariableObject(BaseTopazTest):
         """)
         assert self.unwrap(space, w_res) == [[100, 99, 99], 2]
 
+    def test_path_unchanged_inputs(self, space):
+        w_res = space.execute("""
+        require "libcassowary"
+        $executions = 0
+        content = "50"
+        quality = 0
+        always { $executions += 1; quality == content.to_f }
+        res = [quality, $executions]
+        content = "50"
+        res << quality << $executions
+        content = "60"
+        return res << quality << $executions
+        """)
+        assert self.unwrap(space, w_res) == [50, 1, 50, 1, 60, 2]
+
     def test_and(self, space):
         w_ca, w_z3 = self.execute(
             space,
@@ -1010,6 +1063,61 @@ class TestConstraintVariableObject(BaseTopazTest):
             10, 5
         ]
 
+    def test_edit_chunked_stream(self, space):
+        w_ca = space.execute("""
+        require "libcassowary"
+        class ChunkStream
+          def initialize(chunks)
+            @chunks = chunks
+          end
+
+          def next
+            @chunks.shift
+          end
+        end
+
+        @x = 20
+        @y = 30
+        always { @x == @y * 2 }
+
+        results = []
+        edit(ChunkStream.new([[1, 2, 3], [[4], [5]]]), chunked: true, results: results) { @y }
+        res = [results, @x, @y]
+        edit(ChunkStream.new([[7, 8, 9]]), chunked: true) { @y }
+        return res << @x << @y
+        """)
+        assert self.unwrap(space, w_ca) == [[1, 2, 3, 4, 5], 10, 5, 18, 9]
+
+    def test_cassowary_lazy_stays(self, space):
+        w_ca = space.execute("""
+        require "libcassowary"
+        $stays = 0
+        class Cassowary::SimplexSolver
+          alias uncounted_add_stay add_stay
+          def add_stay(*args)
+            $stays += 1
+            uncounted_add_stay(*args)
+          end
+        end
+
+        a, b, c = 1, 2, 3
+        Constraint.new { c }.value
+        res = [$stays]
+        # the equation determines one of a and b from the other
+        sum = always { a + b == 10 }
+        res << $stays
+        always { c >= b }
+        res << $stays
+        sum.disable
+        res << $stays
+        d, e = 5, 0
+        Cassowary::SimplexSolver.instance.without_stays do
+          always { e == d * 2 }
+        end
+        return res << $stays << (e == d * 2)
+        """)
+        assert self.unwrap(space, w_ca) == [0, 1, 2, 3, 3, True]
+
     def test_non_solveable_variable_constraint_blocks(self, space):
         w_res = space.execute("""
         $calls = 0
@@ -1269,6 +1377,89 @@ class TestConstraintVariableObject(BaseTopazTest):
         assert cassowary[0][1] == cassowary[1][1]
         assert cassowary[0][2] == cassowary[1][0]
 
+    def test_atomic_assignment_solves_once(self, space):
+        w_res = space.execute("""
+        require "libz3"
+        $solves = 0
+        class Z3
+          alias plain_solve solve
+          def solve
+            $solves += 1
+            plain_solve
+          end
+        end
+
+        x = 1
+        y = 9
+        always { x + y == 10 }
+        $solves = 0
+        x, y = 3, 7
+        return $solves, x, y
+        """)
+        assert self.unwrap(space, w_res) == [1, 3, 7]
+
+    def test_solver_weight_is_cached(self, space):
+        w_res = space.execute("""
+        require "libcassowary"
+        require "libz3"
+        $weights = 0
+        class Z3
+          def weight
+            $weights += 1
+            100
+          end
+        end
+
+        a = 1
+        always(solver: Z3::Instance) { a >= 5 }
+        always(solver: Cassowary::SimplexSolver.instance) { a <= 10 }
+        a
+        $weights = 0
+        10.times { a }
+        res = [$weights]
+        class Z3
+          def weight
+            $weights += 1
+            300
+          end
+        end
+        a
+        return res << $weights
+        """)
+        assert self.unwrap(space, w_res) == [0, 1]
+
+    def test_move_constraint_to_other_solver(self, space):
+        w_res = space.execute("""
+        require "libz3"
+        require "libcassowary"
+        $executions = 0
+        a = 1.0
+        b = 1.0
+        c = always(solver: Z3::Instance) { $executions += 1; a + b == 10 }
+        res = [a + b]
+        c.solver = Cassowary::SimplexSolver.instance
+        a = 3
+        return res << a << b << c.solver.equal?(Cassowary::SimplexSolver.instance) << $executions
+        """)
+        assert self.unwrap(space, w_res) == [10, 3, 7, True, 1]
+
+    def test_move_constraint_with_solver_constants(self, space):
+        w_res = space.execute("""
+        require "libz3"
+        require "libcassowary"
+        $executions = 0
+        a = 1.0
+        b = 0.0
+        # the coerced constant is made by Z3::Instance, not by a recorded
+        # send, so moving the constraint runs the predicate again
+        c = always(solver: Z3::Instance) { $executions += 1; 1.0 + a == b }
+        res = [b - a]
+        c.solver = Cassowary::SimplexSolver.instance
+        a = 3.0
+        return res << b << $executions
+        """)
+        assert self.unwrap(space, w_res) == [1.0, 4.0, 2]
+
     def test_no_solver(self, space):
         w_c, w_z3 = self.execute(
             space,
@@ -1287,3 +1478,50 @@ class TestConstraintVariableObject(BaseTopazTest):
         )
         assert self.unwrap(space, w_c) == "100.0"
         assert self.unwrap(space, w_z3) == "100"
+
+    def test_hash_entries(self, space):
+        w_c, w_z3 = self.execute(
+            space,
+            """
+            config = {:width => 10, :height => 20}
+            always { config[:width] + config[:height] == 100 }
+            res = [config[:width] + config[:height]]
+            config[:width] = 30
+            res << config[:width] << config[:height]
+            config.delete(:height)
+            config[:width] = 0
+            return res << config[:width] << config.key?(:height)
+            """,
+            "libcassowary", "libz3"
+        )
+        assert self.unwrap(space, w_c) == [100, 30, 70, 0, False]
+        assert self.unwrap(space, w_z3) == [100, 30, 70, 0, False]
+
+    def test_hash_entry_reads(self, space):
+        w_c, w_z3 = self.execute(
+            space,
+            """
+            config = {:width => 10, :height => 20}
+            always { config[:width] + config[:height] == 100 }
+            config[:width] = 30
+            res = [config.fetch(:height)]
+            config[:width] = 40
+            res << config.values
+            config[:width] = 50
+            res << config.to_a
+            config[:width] = 55
+            res << config.dup[:height] << config.clone.values
+            config[:width] = 60
+            res << config.delete(:height)
+            key = "a"
+            strings = {"a" => 10, "b" => 20}
+            always { strings[key] + strings["b"] == 30 }
+            key << "x"
+            strings["a"] = 12
+            return res << strings["b"]
+            """,
+            "libcassowary", "libz3"
+        )
+        expected = [70, [40, 60], [["width", 50], ["height", 50]], 45, [55, 45], 40, 18]
+        assert self.unwrap(space, w_c) == expected
+        assert self.unwrap(space, w_z3) == expected
@@ -105,3 +105,116 @@ class TestLocalPropagation(BaseTopazTest):
             [20, -20, 0],
             [20, 80, 100]
         ]
+
+    def test_cached_plans(self, space):
+        w_res = space.execute("""
+        require "libdeltablue"
+        x, y, z = 0, 0, 0
+
+        c = always predicate: -> { x + y == z } do
+          [x <-> { z - y },
+           y <-> { z - x },
+           z <-> { x + y }]
+        end
+
+        z = 100
+        plans = DeltaBlue::Instance.plan_count
+        10.times { |i| z = i }
+        res = [x, y, z, DeltaBlue::Instance.plan_count - plans]
+        c.disable
+        z = 5
+        return res << x << y << z
+        """)
+        assert self.unwrap(space, w_res) == [9, 0, 9, 0, 9, 0, 5]
+
+    def test_solver_option(self, space):
+        w_res = space.execute("""
+        require "libdeltablue"
+        solver = DeltaRed::Solver.new
+        a, b = 1, 0
+        always solver: solver,
+               predicate: -> { b == a * 2 },
+               methods: -> {[ b <-> { a * 2 } ]}
+
+        res = [b]
+        a = 5
+        return res << b << solver.plan_count << DeltaBlue::Instance.plan_count
+        """)
+        assert self.unwrap(space, w_res) == [2, 10, 1, 0]
+
+    def test_cycle_closed_by_overridden_constraint(self, space):
+        w_res = space.execute("""
+        require "libdeltablue"
+        a, b, p, q = 1, 0, 0, 0
+        always predicate: -> { b == a },
+               methods: -> {[ b <-> { a } ]}
+        always predicate: -> { q == b },
+               methods: -> {[ q <-> { b } ]}
+        always predicate: -> { p == b },
+               methods: -> {[ p <-> { b }, a <-> { p } ]},
+               priority: :medium
+
+        res = []
+        begin
+          always predicate: -> { p == q },
+                 methods: -> {[ p <-> { q } ]},
+                 priority: :strong
+        rescue RuntimeError => e
+          res << e.message
+        end
+        a = 7
+        return res << a << b << p << q
+        """)
+        assert self.unwrap(space, w_res) == ["cyclic constraint graph", 7, 7, 7, 7]
+
+    def test_cycle_while_retracting_an_edit(self, space):
+        w_res = space.execute("""
+        require "libdeltablue"
+        a, b = 0, 0
+        strong = always predicate: -> { a == b },
+                        methods: -> {[ a <-> { b }, b <-> { a } ]},
+                        priority: :strong
+        always predicate: -> { a == b },
+               methods: -> {[ a <-> { b }, b <-> { a } ]},
+               priority: :weak
+
+        res = []
+        begin
+          a = 5
+        rescue RuntimeError => e
+          res << e.message
+        end
+        b = 8
+        return res << strong.disable << a << b
+        """)
+        assert self.unwrap(space, w_res) == ["cyclic constraint graph", None, 8, 8]
+
+    def test_failed_add_restores_overridden_constraints(self, space):
+        w_res = space.execute("""
+        require "libdeltablue"
+        x, y = 0, 0
+        medium = always predicate: -> { x == y },
+                        methods: -> {[ x <-> { y }, y <-> { x } ]},
+                        priority: :medium
+        always predicate: -> { x == y },
+               methods: -> {[ x <-> { y }, y <-> { x } ]}
+
+        res = []
+        begin
+          always predicate: -> { x == y },
+                 methods: -> {[ y <-> { x } ]},
+                 priority: :medium
+        rescue RuntimeError => e
+          res << e.message
+        end
+        begin
+          x = 3
+        rescue RuntimeError => e
+          res << e.message
+        end
+        y = 4
+        return res << medium.disable << x << y
+        """)
+        assert self.unwrap(space, w_res) == [
+            "cyclic constraint graph", "cyclic constraint graph", None, 4, 4
+        ]
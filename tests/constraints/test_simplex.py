@@ -0,0 +1,87 @@
+from ..base import BaseTopazTest
+
+
+class TestSimplex(BaseTopazTest):
+    def test_assignments(self, space):
+        w_res = space.execute("""
+        require "libsimplex"
+        res = []
+        a = 0
+        b = 0
+        c = always { a + b == 10 }
+        a = 3
+        res << a << b
+        always { b >= 0 }
+        a = 20
+        res << a << b
+        c.disable
+        a = 20
+        return res << a << b
+        """)
+        assert self.unwrap(space, w_res) == [3, 7, 10, 0, 20, 0]
+
+    def test_preferences(self, space):
+        w_res = space.execute("""
+        require "libsimplex"
+        res = []
+        x = 10
+        always(:strong) { x > 10 }
+        res << x
+        always(:medium) { x < 5 }
+        res << x
+        always(:required) { x < 10 }
+        res << x
+        return res
+        """)
+        assert self.unwrap(space, w_res) == [11, 11, 9]
+
+    def test_edit_variables(self, space):
+        w_res = space.execute("""
+        require "libsimplex"
+        a = 0
+        b = 0
+        always { a + b == 10 }
+        always { b >= 0 }
+        solver = SimplexSolver::Instance
+        solver.add_edit_var(Constraint.new { a }.value)
+        res = []
+        [3, 12, -5].each do |v|
+          solver.resolve([v])
+          res << a << b
+        end
+        solver.end_edit
+        return res, solver.edit_variables
+        """)
+        assert self.unwrap(space, w_res) == [[3, 7, 10, 0, -5, 15], []]
+
+    def test_unsatisfiable(self, space):
+        w_res = space.execute("""
+        require "libsimplex"
+        a = 5
+        always { a > 10 }
+        begin
+          always { a < 3 }
+        rescue RuntimeError => e
+          return a, e.message
+        end
+        """)
+        assert self.unwrap(space, w_res) == [11, "unsatisfiable constraint system"]
+
+    def test_readonly_pins_without_rebuild(self, space):
+        w_res = space.execute("""
+        require "libsimplex"
+        a = 0
+        b = 0
+        always { a + b == 10 }
+        b0 = b
+        vb = Constraint.new { b }.value
+        solver = SimplexSolver::Instance
+        rebuilds = solver.rebuild_count
+        vb.readonly!
+        always(:strong) { b == 5 }
+        res = [b == b0]
+        vb.writable!
+        solver.solve
+        return res << a << b << solver.rebuild_count - rebuilds
+        """)
+        assert self.unwrap(space, w_res) == [True, 5, 5, 0]
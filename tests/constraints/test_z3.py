@@ -0,0 +1,232 @@
+from ..base import BaseTopazTest
+
+
+class TestZ3(BaseTopazTest):
+    def test_incremental_assignments(self, space):
+        w_res = space.execute("""
+        require "libz3"
+        res = []
+        [true, false].each do |incremental|
+          Z3::Instance.incremental = incremental
+          a = 0
+          b = 0
+          c = always { a + b == 10 }
+          always { b >= 0 }
+          a = 3
+          res << a << b
+          a = 7
+          res << a << b
+          c.disable
+          a = 20
+          res << a
+        end
+        return res
+        """)
+        res = self.unwrap(space, w_res)
+        assert res == [3, 7, 7, 3, 20] * 2
+
+    def test_temporary_constraints(self, space):
+        w_res = space.execute("""
+        require "libz3"
+        a = 5
+        always { a >= 0 }
+        ptr = Constraint.new { a }.value
+        tmp = Z3::Instance.add_temporary_constraint(ptr == 2)
+        Z3::Instance.solve
+        first = ptr.value
+        Z3::Instance.remove_temporary_constraint(tmp)
+        Z3::Instance.add_temporary_constraint(ptr == 3)
+        Z3::Instance.solve
+        return first, ptr.value, Z3::Instance.incremental
+        """)
+        assert self.unwrap(space, w_res) == [2, 3, True]
+
+    def test_unsat_core(self, space):
+        w_res = space.execute("""
+        require "libz3"
+        a = 5
+        c = always { a > 10 }
+        begin
+          always { a < 3 }
+        rescue RuntimeError => e
+          return Z3::Instance.unsat_core.include?(c), e.message
+        end
+        """)
+        [included, msg] = self.unwrap(space, w_res)
+        assert included
+        assert msg.startswith("unsatisfiable constraint system, conflicting constraints: #<Constraint")
+
+    def test_unsat_core_names_enabling_constraint(self, space):
+        w_res = space.execute("""
+        require "libz3"
+        a = 50
+        c1 = always { a > 10 }
+        c1.disable
+        c2 = always { a > 10 }
+        begin
+          always { a < 3 }
+        rescue RuntimeError
+          core = Z3::Instance.unsat_core
+          return c1.value.equal?(c2.value), core.include?(c1), core.include?(c2)
+        end
+        """)
+        assert self.unwrap(space, w_res) == [True, False, True]
+
+    def test_toggle_constraint(self, space):
+        w_res = space.execute("""
+        require "libz3"
+        a = 5
+        c = always { a > 10 }
+        res = [a > 10]
+        c.disable
+        a = 1
+        res << a
+        c.enable
+        res << (a > 10)
+        return res
+        """)
+        assert self.unwrap(space, w_res) == [True, 1, True]
+
+    def test_values_for(self, space):
+        w_res = space.execute("""
+        require "libz3"
+        a = 1
+        b = true
+        always { a == 42 }
+        always { b == false }
+        ptrs = Constraint.new { [a, b] }.value
+        return Z3::Instance.values_for(ptrs)
+        """)
+        assert self.unwrap(space, w_res) == [42, False]
+
+    def test_real_decoding(self, space):
+        w_res = space.execute("""
+        require "libz3"
+        third = 0.0
+        root = 0.0
+        always { third * 3 == 1 }
+        always { root * root == 2 && root > 0 }
+        Z3::Instance.algebraic_precision = 10
+        return third, root
+        """)
+        [third, root] = self.unwrap(space, w_res)
+        assert abs(third - 1.0 / 3) < 1e-15
+        assert abs(root - 2 ** 0.5) < 1e-10
+
+    def test_make_real(self, space):
+        w_res = space.execute("""
+        require "libz3"
+        a = 0.0
+        always { a == 0.1 + 1e12 }
+        return a, Z3::Instance.make_real(2013).equal?(Z3::Instance.make_real(2013))
+        """)
+        assert self.unwrap(space, w_res) == [0.1 + 1e12, True]
+
+    def test_hash_consed_expressions(self, space):
+        w_res = space.execute("""
+        require "libz3"
+        a, b, c = 1, 2, 3
+        c1 = always { a + b == c }
+        c2 = always { a + b == c }
+        same = c1.value.equal?(c2.value)
+        c1.disable
+        a = 10
+        return same, a + b == c
+        """)
+        assert self.unwrap(space, w_res) == [True, True]
+
+    def test_reads_use_solution_epoch(self, space):
+        w_res = space.execute("""
+        require "libz3"
+        $values = 0
+        class Z3::Z3Pointer
+          alias uncounted_value value
+          def value
+            $values += 1
+            uncounted_value
+          end
+        end
+
+        class Counter
+          def initialize
+            @count = 0
+            always { @count >= 42 }
+          end
+
+          def read(n)
+            n.times { @count }
+            @count
+          end
+        end
+
+        # neither variable is assigned after it was constrained
+        a = 0
+        always { a >= 5 }
+        res = [a]
+        $values = 0
+        100.times { a }
+        res << $values
+        counter = Counter.new
+        res << counter.read(1)
+        $values = 0
+        counter.read(100)
+        res << $values
+        a = 7
+        res << a
+        Z3::Instance.add_temporary_constraint(Constraint.new { a }.value == 9)
+        Z3::Instance.solve
+        return res << a
+        """)
+        assert self.unwrap(space, w_res) == [5, 0, 42, 0, 7, 9]
+
+    def test_nary_builders(self, space):
+        w_res = space.execute("""
+        require "libz3"
+        a, b, c = 0, 0, 0
+        ptrs = Constraint.new { [a, b, c] }.value
+        Z3::Instance.add_constraint(Z3.sum(ptrs + [1]) == 10)
+        Z3::Instance.add_constraint(Z3.product([ptrs[0], 2]) == ptrs[2])
+        Z3::Instance.add_constraint(Z3.and(ptrs.map { |p| p > 0 }))
+        Z3::Instance.add_constraint(Z3.or([ptrs[0] == 2, ptrs[0] == 5]))
+        Z3::Instance.add_constraint(Z3.distinct(ptrs))
+        Z3::Instance.solve
+        return Z3::Instance.values_for(ptrs), Z3.sum(ptrs).equal?(Z3.sum(ptrs))
+        """)
+        assert self.unwrap(space, w_res) == [[2, 3, 4], True]
+
+    def test_configuration(self, space):
+        w_res = space.execute("""
+        require "libz3"
+        res = []
+        [{logic: :QF_LIA, timeout_ms: 1000}, {tactic: "qflia"}].each do |options|
+          z3 = Z3.new(options)
+          x = z3.make_int_variable(0)
+          z3.add_constraint(x > 3)
+          z3.add_constraint(x < 5)
+          z3.solve
+          res << z3[x] << z3.incremental
+          begin
+            z3.configure(logic: :QF_LRA)
+          rescue RuntimeError
+            res << :in_use
+          end
+          begin
+            z3.incremental = true
+            res << z3.incremental
+          rescue RuntimeError
+            res << :tactic
+          end
+        end
+        [{tactic: "no-such-tactic"}, {logic: "NO_SUCH_LOGIC"}].each do |options|
+          begin
+            Z3.new(options)
+          rescue ArgumentError => e
+            res << e.message
+          end
+        end
+        return res
+        """)
+        assert self.unwrap(space, w_res) == [
+            4, True, "in_use", True, 4, False, "in_use", "tactic",
+            "unknown Z3 tactic no-such-tactic", "unknown Z3 logic NO_SUCH_LOGIC"
+        ]
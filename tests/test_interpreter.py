@@ -1665,6 +1665,15 @@ class TestBlocks(BaseTopazTest):
         with self.raises(space, "LocalJumpError", "break from proc-closure"):
             space.execute("create_block.call")
 
+    def test_break_block_after_default_args(self, space):
+        w_res = space.execute("""
+        def f(a = [1, 2].each { |x| break x * 10 })
+          [3, 4].each { |y| break a + y }
+        end
+        return f
+        """)
+        assert space.int_w(w_res) == 13
+
     def test_singleton_class_block(self, space):
         w_res = space.execute("""
         def f(o)
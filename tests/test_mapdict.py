@@ -39,3 +39,14 @@ class TestMapDict(object):
 
         assert class_node.size_estimate.object_size_estimate() in [(i + 10) // 2, (i + 11) // 2]
         assert class_node.size_estimate.unboxed_size_estimate() == 0
+
+    def test_has_constraint_vars(self, space):
+        class_node = mapdict.ClassNode(None)
+        w_obj = FakeObject(class_node)
+        w_obj.map = w_obj.map.add(space, mapdict.ObjectAttributeNode, "a", w_obj)
+        assert not w_obj.map.has_constraint_vars
+        w_obj.map = w_obj.map.add(space, mapdict.ConstraintVarNode, "a", w_obj)
+        assert w_obj.map.has_constraint_vars
+        w_obj.map = w_obj.map.add(space, mapdict.ObjectAttributeNode, "b", w_obj)
+        assert w_obj.map.has_constraint_vars
+        assert w_obj.map.change_class(space, None).has_constraint_vars
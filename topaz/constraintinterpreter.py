@@ -1,4 +1,8 @@
+import os
+import time
+
 from rpython.rlib import jit
+from rpython.rlib.rfloat import formatd
 
 from topaz.celldict import CellDict
 from topaz.coerce import Coerce
@@ -8,9 +12,13 @@ from topaz.objects.moduleobject import W_ModuleObject
 
 
 class ConstraintInterpreter(Interpreter):
-    def __init__(self):
-        Interpreter.__init__(self)
-        self.junction_stack = [] # stack for keeping lhs's or "or" and "and" bytecodes
+    def push_junction(self, frame, w_lhs):
+        if frame.junction_stack is None:
+            frame.junction_stack = []
+        frame.junction_stack.append(w_lhs)
+
+    def pop_junction(self, frame):
+        return frame.junction_stack.pop()
 
     def LOAD_SELF(self, space, bytecode, frame, pc):
         w_self = w_res = frame.w_self
@@ -40,7 +48,9 @@ class ConstraintInterpreter(Interpreter):
     def LOAD_INSTANCE_VAR(self, space, bytecode, frame, pc, idx):
         name = space.symbol_w(bytecode.consts_w[idx])
         w_obj = frame.pop()
-        c_var = space.newconstraintvariable(w_owner=w_obj, ivar=name)
+        c_var = None
+        if space.may_have_constraint_ivars(w_obj):
+            c_var = space.newconstraintvariable(w_owner=w_obj, ivar=name)
         if c_var and c_var.is_solveable(space):
             w_res = c_var.get_external_variable(space)
         else:
@@ -65,14 +75,14 @@ class ConstraintInterpreter(Interpreter):
     def JUMP_AND(self, space, bytecode, frame, pc, target_pc):
         w_lhs = frame.peek()
         if space.is_kind_of(w_lhs, space.w_constraintobject):
-            self.junction_stack.append(frame.pop())
+            self.push_junction(frame, frame.pop())
             return pc
         else:
-            self.junction_stack.append(None)
+            self.push_junction(frame, None)
             return Interpreter.JUMP_AND(self, space, bytecode, frame, pc, target_pc)
 
     def JUMP_AND_END(self, space, bytecode, frame, pc):
-        w_lhs = self.junction_stack.pop()
+        w_lhs = self.pop_junction(frame)
         if w_lhs:
             w_rhs = frame.pop()
             frame.push(space.send(w_lhs, "and", [w_rhs]))
@@ -82,14 +92,14 @@ class ConstraintInterpreter(Interpreter):
     def JUMP_OR(self, space, bytecode, frame, pc, target_pc):
         w_lhs = frame.peek()
         if space.is_kind_of(w_lhs, space.w_constraintobject):
-            self.junction_stack.append(frame.pop())
+            self.push_junction(frame, frame.pop())
             return pc
         else:
-            self.junction_stack.append(None)
+            self.push_junction(frame, None)
             return Interpreter.JUMP_OR(self, space, bytecode, frame, pc, target_pc)
 
     def JUMP_OR_END(self, space, bytecode, frame, pc):
-        w_lhs = self.junction_stack.pop()
+        w_lhs = self.pop_junction(frame)
         w_rhs = frame.pop()
         if w_lhs:
             frame.push(space.send(w_lhs, "or", [w_rhs]))
@@ -113,13 +123,13 @@ class ConstraintInterpreter(Interpreter):
 
 class ConstrainedVariable(W_Root):
     CONSTRAINT_IVAR = "__constrained_variable__"
-    _immutable_fields_ = ["cell", "w_owner", "ivar", "cvar", "idx", "w_key", "w_self"]
+    _immutable_fields_ = ["cell", "w_owner", "ivar", "cvar", "idx?", "w_key", "w_self"]
 
     def __init__(self, space, cell=None, w_owner=None, ivar=None, cvar=None, idx=-1, w_key=None, w_self=None):
-        self.solvers_w = []
-        self.constraints_w = []
-        self.external_variables_w = []
-        self.readonly_constraints = []
+        # per solver state, indexed by the solver's registry id
+        self.slots = []
+        # the same slots, in the order the solvers were added
+        self.solver_slots = []
         self.cell = cell
         self.w_owner = w_owner
         self.ivar = ivar
@@ -127,11 +137,25 @@ class ConstrainedVariable(W_Root):
         self.idx = idx
         self.w_key = w_key
         self.w_self = w_self
-        self.constraints_w = []
         self.identical_variables = []
         self.w_readonly_constraint = None
         self.w_remembered_value = None
+        # set once the array element or hash entry left its owner
+        self.removed = False
+        self.w_removed_value = None
         self.has_readonly = False
+        # value last pushed to the non-defining solvers, reads only
+        # propagate again if it changed or the dependencies did
+        self.w_propagated_value = None
+        self.downstream_dirty = True
+        # memoized strongest solver, valid while defining_version
+        # matches the version of the SolverRegistry
+        self.w_defining_solver = None
+        self.defining_version = -1
+        # solution epoch of the defining solver when the value was last
+        # stored, reads return the stored value until it advances
+        self.w_read_solver = None
+        self.read_epoch = -1
 
         if cell:
             from topaz.closure import ClosureCell
@@ -146,16 +170,28 @@ class ConstrainedVariable(W_Root):
         # TODO: remove external variable from solver
         pass
 
-    def add_solver(self, w_solver):
-        if w_solver not in self.solvers_w:
-            self.solvers_w.append(w_solver)
-
-    def solver_idx(self, w_solver):
-        try:
-            return self.solvers_w.index(w_solver)
-        except ValueError:
-            self.solvers_w.append(w_solver)
-            return len(self.solvers_w) - 1
+    def add_solver(self, space, w_solver):
+        self.slot_for(space, w_solver)
+
+    def find_slot(self, space, w_solver):
+        solver_id = space.fromcache(SolverRegistry).solver_id(w_solver)
+        if solver_id >= 0 and solver_id < len(self.slots):
+            return self.slots[solver_id]
+        return None
+
+    def slot_for(self, space, w_solver):
+        registry = space.fromcache(SolverRegistry)
+        registry.register(w_solver)
+        solver_id = registry.solver_id(w_solver)
+        if solver_id >= len(self.slots):
+            self.slots += [None] * (solver_id - len(self.slots) + 1)
+        slot = self.slots[solver_id]
+        if slot is None:
+            slot = SolverSlot(w_solver)
+            self.slots[solver_id] = slot
+            self.solver_slots.append(slot)
+            self.defining_version = -1
+        return slot
 
     def ensure_external_variable(self, space, w_solver):
         w_value = self.load_value(space)
@@ -166,9 +202,9 @@ class ConstrainedVariable(W_Root):
                 with space.normal_execution():
                     w_solver = space.send(w_value, "constraint_solver")
                     space.set_current_solver(w_solver)
-        self.add_solver(w_solver)
+        self.add_solver(space, w_solver)
 
-        if w_solver and w_solver is not space.w_nil and not self._is_solveable(w_solver):
+        if w_solver and w_solver is not space.w_nil and not self._is_solveable(space, w_solver):
             with space.normal_execution():
                 w_external_variable = space.send(
                     w_solver,
@@ -193,7 +229,7 @@ class ConstrainedVariable(W_Root):
                             )
                         elif not w_solver:
                             w_solver = w_external_solver
-                            self.add_solver(w_external_solver)
+                            self.add_solver(space, w_external_solver)
                         w_external_variable = space.send(w_external_constraint, "value")
 
         if w_external_variable is not space.w_nil:
@@ -201,90 +237,69 @@ class ConstrainedVariable(W_Root):
             space.set_instance_var(w_external_variable, self.CONSTRAINT_IVAR, self)
 
     def set_external_variable(self, space, w_solver, w_external_variable):
-        idx = self.solver_idx(w_solver)
-        if len(self.external_variables_w) <= idx:
-            self.external_variables_w += [None] * (idx - len(self.external_variables_w) + 1)
-        self.external_variables_w[idx] = w_external_variable
-        self.update_readonly_annotations(space, w_solver)
+        self.downstream_dirty = True
+        self.slot_for(space, w_solver).w_external_variable = w_external_variable
+        self.defining_version = -1
+        self.update_readonly_annotations(space)
 
     def get_external_variable(self, space):
-        return self._get_external_variable(space.current_solver())
+        return self._get_external_variable(space, space.current_solver())
 
-    @jit.elidable
-    def _get_external_variable(self, w_solver):
-        idx = self.solver_idx(w_solver)
-        try:
-            return self.external_variables_w[idx]
-        except IndexError:
+    def _get_external_variable(self, space, w_solver):
+        slot = self.find_slot(space, w_solver)
+        if slot is None:
             return None
+        return slot.w_external_variable
 
-    def get_solver_constraints_w(self, w_solver):
-        idx = self.solver_idx(w_solver)
-        try:
-            if self.constraints_w[idx] is None:
-                self.constraints_w[idx] = []
-            return self.constraints_w[idx]
-        except IndexError:
-            self.constraints_w += [None] * (idx - len(self.constraints_w) + 1)
-            self.constraints_w[idx] = []
-            return self.constraints_w[idx]
+    def get_solver_constraints_w(self, space, w_solver):
+        return self.slot_for(space, w_solver).constraints_w
 
     # XXX: remove once we find another way to store the ConstrainedVariable object
     def is_kind_of(self, space, w_cls):
         return False
 
-    def make_readonly(self, space, w_external_variable=None):
-        if not w_external_variable:
-            w_external_variable = self.get_external_variable(space)
-        if not self.is_readonly(w_external_variable):
-            space.send(w_external_variable, "readonly!")
-            self.mark_readonly(w_external_variable)
-
-    def is_readonly(self, w_external_variable):
-        idx = self.external_variables_w.index(w_external_variable)
-        try:
-            return self.readonly_constraints[idx]
-        except IndexError:
-            return False
-
-    def mark_readonly(self, w_external_variable, flag=True):
-        idx = self.external_variables_w.index(w_external_variable)
-        if len(self.readonly_constraints) <= idx:
-            self.readonly_constraints += [False] * (idx - len(self.readonly_constraints) + 1)
-        self.readonly_constraints[idx] = flag
-        self.has_readonly = True
-
-    def make_writable(self, w_external_variable):
-        if self.is_readonly(w_external_variable):
-            space.send(w_external_variable, "writable!")
-            self.mark_readonly(w_external_variable, False)
+    def make_readonly(self, space, slot=None):
+        if slot is None:
+            slot = self.find_slot(space, space.current_solver())
+            assert slot is not None
+        if not slot.readonly:
+            space.fromcache(SolverRegistry).solution_changed(slot.w_solver)
+            space.send(slot.w_external_variable, "readonly!")
+            slot.readonly = True
+            self.has_readonly = True
+
+    def make_writable(self, space, slot):
+        if slot.readonly:
+            space.fromcache(SolverRegistry).solution_changed(slot.w_solver)
+            space.send(slot.w_external_variable, "writable!")
+            slot.readonly = False
 
     def make_assignable(self, space):
         if self.has_readonly:
-            for i, v in enumerate(self.readonly_constraints):
-                if v:
-                    space.send(self.external_variables_w[i], "writable!")
+            for slot in self.solver_slots:
+                if slot.readonly:
+                    space.send(slot.w_external_variable, "writable!")
 
     def make_not_assignable(self, space):
         if self.has_readonly:
-            for i, v in enumerate(self.readonly_constraints):
-                if v:
-                    space.send(self.external_variables_w[i], "readonly!")
+            for slot in self.solver_slots:
+                if slot.readonly:
+                    space.send(slot.w_external_variable, "readonly!")
 
     def is_solveable(self, space=None):
         if space:
-            return self._is_solveable(space.current_solver())
+            return self._is_solveable(space, space.current_solver())
         else:
-            for w_var in self.external_variables_w:
-                if w_var is not None:
+            for slot in self.solver_slots:
+                if slot.w_external_variable is not None:
                     return True
             return False
 
-    @jit.elidable
-    def _is_solveable(self, w_solver=None):
-        return self._get_external_variable(w_solver) is not None
+    def _is_solveable(self, space, w_solver):
+        return self._get_external_variable(space, w_solver) is not None
 
     def constrain_identity(self, space, other):
+        self.downstream_dirty = True
         self.__constrain_identity__(space, other)
         other.__begin_assign__(space, space.get_value(self))
         other.__assign__(space)
@@ -313,18 +328,29 @@ class ConstrainedVariable(W_Root):
         return array
 
     def add_to_constraint(self, space, w_constraint):
-        solver_constraints_w = self.get_solver_constraints_w(space.current_solver())
+        solver_constraints_w = self.get_solver_constraints_w(space, space.current_solver())
         if w_constraint not in solver_constraints_w:
             solver_constraints_w.append(w_constraint)
+            self.downstream_dirty = True
         w_constraint.add_constraint_variable(self)
 
-    def _set_solver_for_unbound_constraint(self, w_constraint, w_solver):
-        unbound_constraints_w = self.get_solver_constraints_w(None)
+    def move_constraint(self, space, w_constraint, w_old_solver, w_new_solver):
+        old_constraints_w = self.get_solver_constraints_w(space, w_old_solver)
+        if w_constraint in old_constraints_w:
+            old_constraints_w.remove(w_constraint)
+        new_constraints_w = self.get_solver_constraints_w(space, w_new_solver)
+        if w_constraint not in new_constraints_w:
+            new_constraints_w.append(w_constraint)
+        self.downstream_dirty = True
+
+    def _set_solver_for_unbound_constraint(self, space, w_constraint, w_solver):
+        unbound_constraints_w = self.get_solver_constraints_w(space, None)
         assert w_constraint in unbound_constraints_w
         unbound_constraints_w.remove(w_constraint)
-        solver_constraints_w = self.get_solver_constraints_w(w_solver)
+        solver_constraints_w = self.get_solver_constraints_w(space, w_solver)
         assert w_constraint not in solver_constraints_w
         solver_constraints_w.append(w_constraint)
+        self.downstream_dirty = True
 
     def load_value(self, space):
         if self.cell:
@@ -335,8 +361,14 @@ class ConstrainedVariable(W_Root):
             return self.w_owner.find_instance_var(space, self.ivar) or space.w_nil
         elif self.cvar is not None:
             return self.w_owner.find_class_var(space, self.cvar) or space.w_nil
+        elif self.removed:
+            return self.w_removed_value or space.w_nil
         elif self.idx >= 0:
             return space.listview(self.w_owner)[self.idx] or space.w_nil
+        elif self.w_key is not None:
+            from topaz.objects.hashobject import W_HashObject
+            assert isinstance(self.w_owner, W_HashObject)
+            return self.w_owner.find_item(space, self.w_key) or space.w_nil
         else:
             raise NotImplementedError("inconsistent constraint variable")
 
@@ -349,8 +381,14 @@ class ConstrainedVariable(W_Root):
             self.w_owner.set_instance_var(space, self.ivar, w_value)
         elif self.cvar is not None:
             self.w_owner.set_class_var(space, self.cvar, w_value)
+        elif self.removed:
+            self.w_removed_value = w_value
         elif self.idx >= 0:
             space.listview(self.w_owner)[self.idx] = w_value
+        elif self.w_key is not None:
+            from topaz.objects.hashobject import W_HashObject
+            assert isinstance(self.w_owner, W_HashObject)
+            self.w_owner.store_item(space, self.w_key, w_value)
         else:
             raise NotImplementedError("inconsistent constraint variable")
 
@@ -364,53 +402,86 @@ class ConstrainedVariable(W_Root):
             storagestr = "ivar(%s)" % self.ivar
         elif self.cvar is not None:
             storagestr = "cvar(%s)" % self.cvar
+        elif self.removed:
+            storagestr = "removed item"
         elif self.idx > 0:
             storagestr = "item(%d)" % self.idx
+        elif self.w_key is not None:
+            storagestr = "key(%s)" % space.str_w(space.send(self.w_key, "inspect"))
         else:
             storagestr = "unknown"
         return space.newstr_fromstr("%s-%s" % (storagestr, inspectstr))
 
+    def move_to_idx(self, idx):
+        assert idx >= 0
+        self.idx = idx
+
+    def remove_from_owner(self, w_value):
+        # the element left its array or hash, the variable keeps the last
+        # value so constraints on it stay satisfiable
+        self.w_removed_value = w_value
+        self.removed = True
+
     def begin_assign(self, space, w_value):
         for other in self.all_identical_variables([]):
             other.__begin_assign__(space, w_value)
 
+    def solutions_changed(self, space):
+        registry = space.fromcache(SolverRegistry)
+        for slot in self.solver_slots:
+            registry.solution_changed(slot.w_solver)
+
     def __begin_assign__(self, space, w_value):
+        self.solutions_changed(space)
         self.make_assignable(space)
         self.store_value(space, w_value)
         defining_variable = self.defining_variable(space)
         if defining_variable:
             with space.constraint_execution():
-                space.send(defining_variable, "begin_assign", [w_value])
+                self.send_external(space, self.defining_solver(space), defining_variable,
+                                   "begin_assign", [w_value])
+
+    def send_external(self, space, w_solver, w_external_variable, name, args_w=None):
+        with space.fromcache(ConstraintProfile).solver_event(space, w_solver, name):
+            w_res = space.send(w_external_variable, name, args_w)
+        return w_res
 
     def assign(self, space):
         for other in self.all_identical_variables([]):
             other.__assign__(space)
 
-    def __assign__(self, space):
+    def __assign__(self, space, solve=True):
+        # solve is False if the defining solver already ran for an
+        # atomic assignment group this variable is part of
         defining_variable = self.defining_variable(space)
         if defining_variable:
-            with space.constraint_execution():
-                space.send(defining_variable, "assign")
+            self.solutions_changed(space)
+            if solve:
+                with space.constraint_execution():
+                    self.send_external(space, self.defining_solver(space), defining_variable, "assign")
             # now update the other external variables
-            new_value = self.get_i(space)
-            for w_external_variable in self.external_variables_w:
+            self.set_i(space)
+            new_value = self.load_value(space)
+            for slot in self.solver_slots:
+                w_external_variable = slot.w_external_variable
                 if w_external_variable and w_external_variable is not defining_variable:
-                    space.send(w_external_variable, "begin_assign", [new_value])
-                    space.send(w_external_variable, "assign")
+                    self.send_external(space, slot.w_solver, w_external_variable, "begin_assign", [new_value])
+                    self.send_external(space, slot.w_solver, w_external_variable, "assign")
 
     def end_assign(self, space):
         for other in self.all_identical_variables([]):
             other.__end_assign__(space)
 
     def __end_assign__(self, space):
-        for w_external_variable in self.external_variables_w:
-            if w_external_variable:
-                space.send(w_external_variable, "end_assign")
+        self.solutions_changed(space)
+        for slot in self.solver_slots:
+            if slot.w_external_variable:
+                self.send_external(space, slot.w_solver, slot.w_external_variable, "end_assign")
         self.make_not_assignable(space)
-        for i, cs_w in enumerate(self.constraints_w):
-            if (len(self.external_variables_w) < i + 1 or
-                self.external_variables_w[i] is None):
-                self.recalculate_path(space, cs_w)
+        for slot in self.solver_slots:
+            if slot.w_external_variable is None:
+                self.recalculate_path(space, slot.constraints_w)
+        self.mark_propagated(self.load_value(space))
 
     def assign_value(self, space, w_value):
         self.begin_assign(space, w_value)
@@ -418,24 +489,33 @@ class ConstrainedVariable(W_Root):
         self.end_assign(space)
 
     def defining_solver(self, space):
+        registry = space.fromcache(SolverRegistry)
+        if self.defining_version != registry.version:
+            self.w_defining_solver = self.find_defining_solver(space, registry)
+            self.defining_version = registry.version
+        return self.w_defining_solver
+
+    def find_defining_solver(self, space, registry):
         w_strongest_solver = None
         strongest_weight = -1000 # XXX: Magic number
-        for i, w_solver in enumerate(self.solvers_w):
-            if w_solver and self._is_solveable(w_solver):
-                new_weight = Coerce.int(space, space.send(w_solver, "weight"))
+        for slot in self.solver_slots:
+            w_solver = slot.w_solver
+            if w_solver and slot.w_external_variable is not None:
+                new_weight = registry.weight_of(space, w_solver)
                 if new_weight > strongest_weight:
                     strongest_weight = new_weight
                     w_strongest_solver = w_solver
         return w_strongest_solver
 
     def defining_variable(self, space):
-        return self._get_external_variable(self.defining_solver(space))
+        return self._get_external_variable(space, self.defining_solver(space))
 
-    def update_readonly_annotations(self, space, w_solver):
+    def update_readonly_annotations(self, space):
         defining_variable = self.defining_variable(space)
-        for w_external_variable in self.external_variables_w:
-            if w_external_variable is not defining_variable:
-                self.make_readonly(space, w_external_variable)
+        for slot in self.solver_slots:
+            if (slot.w_external_variable is not None and
+                    slot.w_external_variable is not defining_variable):
+                self.make_readonly(space, slot)
 
     def set_i(self, space):
         if self.is_solveable():
@@ -456,26 +536,445 @@ class ConstrainedVariable(W_Root):
         return space.w_nil
 
     def get_i(self, space):
+        shared = len(self.solver_slots) > 1
+        if shared:
+            space.fromcache(PropagationCounters).reads += 1
+        registry = space.fromcache(SolverRegistry)
+        w_solver = self.defining_solver(space)
+        if (w_solver is self.w_read_solver and not (shared and self.downstream_dirty) and
+                registry.epoch_of(w_solver) == self.read_epoch):
+            # the defining solver has not changed its solution since we
+            # stored the value, and there is no other solver to push it to
+            return self.load_value(space)
         self.set_i(space)
         w_value = self.load_value(space)
-        if len(self.solvers_w) > 1:
-            self.update_downstream_variables(space, w_value)
+        if shared:
+            if self.downstream_dirty or not self.is_propagated(space, w_value):
+                space.fromcache(PropagationCounters).propagating_reads += 1
+                self.update_downstream_variables(space, w_value)
+        self.w_read_solver = w_solver
+        self.read_epoch = registry.epoch_of(w_solver)
         return w_value
 
+    def is_propagated(self, space, w_value):
+        w_propagated_value = self.w_propagated_value
+        if w_propagated_value is None:
+            return False
+        return w_value is w_propagated_value or space.eq_w(w_value, w_propagated_value)
+
+    def mark_propagated(self, w_value):
+        self.w_propagated_value = w_value
+        self.downstream_dirty = False
+
     def update_downstream_variables(self, space, w_value):
+        counters = space.fromcache(PropagationCounters)
+        registry = space.fromcache(SolverRegistry)
         self.make_assignable(space)
         defining_variable = self.defining_variable(space)
-        for w_external_variable in self.external_variables_w:
+        for slot in self.solver_slots:
+            w_external_variable = slot.w_external_variable
             if w_external_variable and w_external_variable is not defining_variable:
-                space.send(w_external_variable, "begin_assign", [w_value])
-                space.send(w_external_variable, "assign")
-                space.send(w_external_variable, "end_assign")
+                registry.solution_changed(slot.w_solver)
+                self.send_external(space, slot.w_solver, w_external_variable, "begin_assign", [w_value])
+                self.send_external(space, slot.w_solver, w_external_variable, "assign")
+                self.send_external(space, slot.w_solver, w_external_variable, "end_assign")
+                counters.solves += 1
         self.make_not_assignable(space)
-        for i, cs_w in enumerate(self.constraints_w):
-            if (len(self.external_variables_w) < i + 1 or
-                self.external_variables_w[i] is None):
-                self.recalculate_path(space, cs_w)
+        for slot in self.solver_slots:
+            if slot.w_external_variable is None:
+                counters.recalculations += len(slot.constraints_w)
+                self.recalculate_path(space, slot.constraints_w)
+        self.mark_propagated(w_value)
 
     def recalculate_path(self, space, constraints_w):
         for w_constraint in constraints_w:
             space.send(w_constraint, "recalculate", [self])
+
+
+class PropagationCounters(object):
+    """Counts what reads of variables shared between solvers cost."""
+
+    def __init__(self, space):
+        self.reset()
+
+    def reset(self):
+        # reads of variables in more than one solver
+        self.reads = 0
+        # reads that had to propagate to the non-defining solvers
+        self.propagating_reads = 0
+        # assignments in non-defining solvers caused by reads
+        self.solves = 0
+        # constraint recalculations caused by reads
+        self.recalculations = 0
+
+
+class EventTiming(object):
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+
+class EventTimings(object):
+    """Counts and times events by name, in the order they first happened."""
+
+    def __init__(self):
+        self.names = []
+        self.timings = {}
+
+    def add(self, name, seconds):
+        timing = self.timings.get(name, None)
+        if timing is None:
+            timing = EventTiming()
+            self.timings[name] = timing
+            self.names.append(name)
+        timing.count += 1
+        timing.seconds += seconds
+
+    def to_json(self):
+        entries = []
+        for name in self.names:
+            timing = self.timings[name]
+            entries.append('"%s": {"count": %d, "seconds": %s}' % (
+                name, timing.count, formatd(timing.seconds, "f", 6)
+            ))
+        return "{%s}" % ", ".join(entries)
+
+
+class ConstraintProfile(object):
+    """Counts and times what constraints and solvers do while enabled,
+    in total, per constraint and per solver class. Times include nested
+    events, a recalculation includes the predicate run it caused.
+    Reported by Topaz::ConstraintStats."""
+    _immutable_fields_ = ["enabled?"]
+
+    def __init__(self, space):
+        self.enabled = False
+        # file to write the JSON report to at exit, "-" for stderr
+        self.dump_path = None
+        self.idle_timer = ProfileTimer(None, None, None, "")
+        self.reset()
+
+    def reset(self):
+        self.totals = EventTimings()
+        self.constraints_w = []
+        self.constraint_timings = {}
+        self.solver_names = []
+        self.solver_timings = {}
+
+    def constraint_event(self, w_constraint, name):
+        if not self.enabled:
+            return self.idle_timer
+        return ProfileTimer(self, w_constraint, None, name)
+
+    def solver_event(self, space, w_solver, name):
+        if not self.enabled:
+            return self.idle_timer
+        solver_name = "nil"
+        if w_solver is not None:
+            solver_name = space.obj_to_s(space.getnonsingletonclass(w_solver))
+        return ProfileTimer(self, None, solver_name, name)
+
+    def record(self, w_constraint, solver_name, name, seconds):
+        self.totals.add(name, seconds)
+        if w_constraint is not None:
+            timings = self.constraint_timings.get(w_constraint, None)
+            if timings is None:
+                timings = EventTimings()
+                self.constraint_timings[w_constraint] = timings
+                self.constraints_w.append(w_constraint)
+            timings.add(name, seconds)
+        if solver_name is not None:
+            timings = self.solver_timings.get(solver_name, None)
+            if timings is None:
+                timings = EventTimings()
+                self.solver_timings[solver_name] = timings
+                self.solver_names.append(solver_name)
+            timings.add(name, seconds)
+
+    def constraint_solver_name(self, space, w_constraint):
+        w_solver = w_constraint.get_solver()
+        if w_solver is None:
+            return "nil"
+        return space.obj_to_s(space.getnonsingletonclass(w_solver))
+
+    def to_json(self, space):
+        constraints = []
+        for w_constraint in self.constraints_w:
+            constraints.append('{"source_location": "%s", "solver": "%s", "events": %s}' % (
+                json_escape(w_constraint.source_location()),
+                json_escape(self.constraint_solver_name(space, w_constraint)),
+                self.constraint_timings[w_constraint].to_json()
+            ))
+        solvers = []
+        for solver_name in self.solver_names:
+            solvers.append('"%s": %s' % (
+                json_escape(solver_name), self.solver_timings[solver_name].to_json()
+            ))
+        return '{"events": %s, "constraints": [%s], "solvers": {%s}}' % (
+            self.totals.to_json(), ", ".join(constraints), ", ".join(solvers)
+        )
+
+    def dump_at_exit(self, space):
+        path = self.dump_path
+        if path is None:
+            return
+        report = self.to_json(space) + "\n"
+        if path == "-":
+            os.write(2, report)
+            return
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0644)
+        except OSError:
+            os.write(2, "could not write constraint stats to %s\n" % path)
+            return
+        try:
+            os.write(fd, report)
+        finally:
+            os.close(fd)
+
+
+class ProfileTimer(object):
+    def __init__(self, profile, w_constraint, solver_name, name):
+        self.profile = profile
+        self.w_constraint = w_constraint
+        self.solver_name = solver_name
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        if self.profile is not None:
+            self.start = time.time()
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if self.profile is not None:
+            self.profile.record(self.w_constraint, self.solver_name, self.name, time.time() - self.start)
+
+
+HEX_DIGITS = "0123456789abcdef"
+
+
+def json_escape(string):
+    chars = []
+    for c in string:
+        if c == '"' or c == "\\":
+            chars.append("\\")
+            chars.append(c)
+        elif ord(c) < 0x20:
+            chars.append("\\u00")
+            chars.append(HEX_DIGITS[ord(c) >> 4])
+            chars.append(HEX_DIGITS[ord(c) & 0xf])
+        else:
+            chars.append(c)
+    return "".join(chars)
+
+
+class SolverSlot(object):
+    """The state a ConstrainedVariable keeps for one of its solvers."""
+    _immutable_fields_ = ["w_solver", "w_external_variable?", "constraints_w"]
+
+    def __init__(self, w_solver):
+        self.w_solver = w_solver
+        self.w_external_variable = None
+        self.readonly = False
+        self.constraints_w = []
+
+
+class SolverRegistry(object):
+    """Gives every solver a small integer id to index the slots of
+    constrained variables with, and remembers the weight of each solver,
+    so choosing the defining solver does not send #weight on every read.
+    Redefining any method named weight clears the weights."""
+    _immutable_fields_ = ["ids_version?"]
+
+    def __init__(self, space):
+        # id 0 is for constraints that have no solver (yet)
+        self.ids = {}
+        # bumped whenever a solver is registered, lookups are elidable
+        # for a given version
+        self.ids_version = 0
+        self.weights = {}
+        self.version = 0
+        # solution epoch per solver id, advanced whenever a solver may
+        # have come up with a different solution
+        self.epochs = [0]
+        # the Constraints currently enabling or disabling their constraint
+        # objects, so solvers can tell which one a shared object belongs to
+        self.enabling_w = []
+
+    def register(self, w_solver):
+        if w_solver is None or w_solver in self.ids:
+            return
+        self.ids[w_solver] = len(self.ids) + 1
+        self.epochs.append(0)
+        self.ids_version += 1
+
+    def solver_id(self, w_solver):
+        # -1 if the solver was never registered
+        if w_solver is None:
+            return 0
+        return self._lookup_id(w_solver, self.ids_version)
+
+    @jit.elidable
+    def _lookup_id(self, w_solver, ids_version):
+        return self.ids.get(w_solver, -1)
+
+    def epoch_of(self, w_solver):
+        solver_id = self.solver_id(w_solver)
+        if solver_id < 0:
+            # nothing has read from it yet
+            return 0
+        return self.epochs[solver_id]
+
+    def solution_changed(self, w_solver):
+        solver_id = self.solver_id(w_solver)
+        if solver_id >= 0:
+            self.epochs[solver_id] += 1
+
+    def all_solutions_changed(self):
+        for i in range(len(self.epochs)):
+            self.epochs[i] += 1
+
+    def invalidate(self):
+        self.weights.clear()
+        self.version += 1
+
+    def enabling(self, w_constraint):
+        return EnablingScope(self, w_constraint)
+
+    def enabling_constraint(self):
+        if not self.enabling_w:
+            return None
+        return self.enabling_w[-1]
+
+    def weight_of(self, space, w_solver):
+        try:
+            return self.weights[w_solver]
+        except KeyError:
+            weight = Coerce.int(space, space.send(w_solver, "weight"))
+            self.weights[w_solver] = weight
+            return weight
+
+
+class EnablingScope(object):
+    def __init__(self, registry, w_constraint):
+        self.registry = registry
+        self.w_constraint = w_constraint
+
+    def __enter__(self):
+        self.registry.enabling_w.append(self.w_constraint)
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.registry.enabling_w.pop()
+
+
+class TemplateNode(object):
+    """A node in the expression DAG a constraint predicate built."""
+    _attrs_ = []
+
+    def instantiate(self, space, w_solver, values_w):
+        raise NotImplementedError
+
+
+class ConstantNode(TemplateNode):
+    _attrs_ = ["w_value"]
+    _immutable_fields_ = ["w_value"]
+
+    def __init__(self, w_value):
+        self.w_value = w_value
+
+    def instantiate(self, space, w_solver, values_w):
+        return self.w_value
+
+
+class VariableNode(TemplateNode):
+    _attrs_ = ["c_var"]
+    _immutable_fields_ = ["c_var"]
+
+    def __init__(self, c_var):
+        self.c_var = c_var
+
+    def instantiate(self, space, w_solver, values_w):
+        return self.c_var._get_external_variable(space, w_solver)
+
+
+class SendNode(TemplateNode):
+    _attrs_ = ["index", "receiver", "name", "args"]
+    _immutable_fields_ = ["index", "receiver", "name", "args[*]"]
+
+    def __init__(self, index, receiver, name, args):
+        self.index = index
+        self.receiver = receiver
+        self.name = name
+        self.args = args
+
+    def instantiate(self, space, w_solver, values_w):
+        return values_w[self.index]
+
+    def run(self, space, w_solver, values_w):
+        w_receiver = self.receiver.instantiate(space, w_solver, values_w)
+        args_w = [arg.instantiate(space, w_solver, values_w) for arg in self.args]
+        values_w[self.index] = space.send(w_receiver, self.name, args_w)
+
+
+class ConstraintTemplate(object):
+    """Records the messages a predicate sends to constraint objects while
+    it is constructed, with the external variables it used as leaves, so
+    the same constraint objects can be built for another solver without
+    running the predicate again."""
+
+    def __init__(self):
+        self.sends = []
+        self.results = []
+        # {w_obj: node} for objects a recorded send returned
+        self.nodes = {}
+        self.c_vars = []
+        self.valid = True
+
+    def node_for(self, space, w_obj):
+        try:
+            return self.nodes[w_obj]
+        except KeyError:
+            pass
+        if isinstance(w_obj, W_Object) and space.is_kind_of(w_obj, space.w_constraintobject):
+            c_var = w_obj.find_instance_var(space, ConstrainedVariable.CONSTRAINT_IVAR)
+        else:
+            c_var = None
+        if isinstance(c_var, ConstrainedVariable):
+            if c_var not in self.c_vars:
+                self.c_vars.append(c_var)
+            return VariableNode(c_var)
+        if isinstance(w_obj, W_Object) and space.is_kind_of(w_obj, space.w_constraintobject):
+            # built by a send we did not record, such as a coerced
+            # constant, and only valid in the solver it was built for
+            self.valid = False
+        return ConstantNode(w_obj)
+
+    def record_send(self, space, w_receiver, name, args_w, block, w_result):
+        if not self.valid:
+            return
+        if block is not None:
+            # blocks may capture solver objects we cannot rewrite
+            self.valid = False
+            return
+        receiver = self.node_for(space, w_receiver)
+        args = [self.node_for(space, w_arg) for w_arg in args_w]
+        node = SendNode(len(self.sends), receiver, name, args)
+        self.sends.append(node)
+        if w_result is not None:
+            self.nodes[w_result] = node
+
+    def finish(self, space, constraint_objects_w):
+        self.results = [self.node_for(space, w_obj) for w_obj in constraint_objects_w]
+        self.nodes.clear()
+
+    def instantiate(self, space, w_solver):
+        for c_var in self.c_vars:
+            if not c_var._is_solveable(space, w_solver):
+                c_var.ensure_external_variable(space, w_solver)
+                if not c_var._is_solveable(space, w_solver):
+                    return None
+        values_w = [None] * len(self.sends)
+        with space.normal_execution():
+            for node in self.sends:
+                node.run(space, w_solver, values_w)
+        return [node.instantiate(space, w_solver, values_w) for node in self.results]
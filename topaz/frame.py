@@ -13,16 +13,25 @@ class BaseFrame(object):
         self.escaped = False
 
 
+class Activation(object):
+    """Identifies one execution of a frame, so that non-local returns and
+    breaks from blocks created in it find their target frame."""
+    _attrs_ = ["finished"]
+
+    def __init__(self):
+        self.finished = False
+
+
 class Frame(BaseFrame):
     _virtualizable_ = [
         "bytecode", "localsstack_w[*]", "stackpos", "w_self", "block",
-        "cells[*]", "lastblock", "lexical_scope", "last_instr", "parent_interp",
-        "top_parent_interp",
+        "cells[*]", "lastblock", "lexical_scope", "last_instr", "parent_activation",
+        "top_parent_activation",
     ]
 
     @jit.unroll_safe
-    def __init__(self, bytecode, w_self, lexical_scope, block, parent_interp,
-                 top_parent_interp, regexp_match_cell):
+    def __init__(self, bytecode, w_self, lexical_scope, block, parent_activation,
+                 top_parent_activation, regexp_match_cell):
         self = jit.hint(self, fresh_virtualizable=True, access_directly=True)
         BaseFrame.__init__(self)
         self.bytecode = bytecode
@@ -34,10 +43,23 @@ class Frame(BaseFrame):
         self.w_self = w_self
         self.lexical_scope = lexical_scope
         self.block = block
-        self.parent_interp = parent_interp
-        self.top_parent_interp = top_parent_interp
+        self.parent_activation = parent_activation
+        self.top_parent_activation = top_parent_activation
         self.visibility = W_FunctionObject.PUBLIC
         self.lastblock = None
+        # created with the first block built in this frame
+        self.activation = None
+        # lhs's of "and" and "or" bytecodes during constraint construction
+        self.junction_stack = None
+
+    def get_activation(self):
+        if self.activation is None:
+            self.activation = Activation()
+        return self.activation
+
+    def finish(self):
+        if self.activation is not None:
+            self.activation.finished = True
 
     def _set_arg(self, space, pos, w_value):
         assert pos >= 0
@@ -58,8 +80,6 @@ class Frame(BaseFrame):
 
     @jit.unroll_safe
     def handle_args(self, space, bytecode, args_w, block):
-        from topaz.interpreter import Interpreter
-
         if (len(args_w) < (len(bytecode.arg_pos) - len(bytecode.defaults)) or
             (bytecode.splat_arg_pos == -1 and len(args_w) > len(bytecode.arg_pos))):
             raise space.error(space.w_ArgumentError,
@@ -72,8 +92,11 @@ class Frame(BaseFrame):
         for i in xrange(len(bytecode.arg_pos) - len(args_w)):
             bc = bytecode.defaults[i + defl_start]
             self.bytecode = bc
-            w_value = Interpreter().interpret(space, self, bc)
+            w_value = space.interpreter.interpret(space, self, bc)
             self._set_arg(space, bytecode.arg_pos[i + len(args_w)], w_value)
+        # the default arguments ran in this frame, but its body did not
+        if self.activation is not None:
+            self.activation.finished = False
         self.bytecode = bytecode
 
         if bytecode.splat_arg_pos != -1:
@@ -28,9 +28,6 @@ class Interpreter(object):
         check_untranslated=False
     )
 
-    def __init__(self):
-        self.finished = False
-
     def get_block_bytecode(self, block):
         return block.bytecode if block is not None else None
 
@@ -45,13 +42,13 @@ class Interpreter(object):
                 )
                 pc = self._interpret(space, pc, frame, bytecode)
         except RaiseReturn as e:
-            if e.parent_interp is self:
+            if e.parent_activation is frame.activation:
                 return e.w_value
             raise
         except Return as e:
             return e.w_value
         finally:
-            self.finished = True
+            frame.finish()
 
     def _interpret(self, space, pc, frame, bytecode):
         prev_instr = frame.last_instr
@@ -110,7 +107,7 @@ class Interpreter(object):
         try:
             res = method(space, bytecode, frame, pc, *args)
         except RaiseBreak as e:
-            if e.parent_interp is not self:
+            if e.parent_activation is not frame.activation:
                 raise
             frame.push(e.w_value)
             res = None
@@ -129,14 +126,14 @@ class Interpreter(object):
         block = frame.unrollstack(RaiseReturnValue.kind)
         if block is None:
             raise e
-        unroller = RaiseReturnValue(e.parent_interp, e.w_value)
+        unroller = RaiseReturnValue(e.parent_activation, e.w_value)
         return block.handle(space, frame, unroller)
 
     def handle_raise_break(self, space, pc, frame, bytecode, e):
         block = frame.unrollstack(RaiseBreakValue.kind)
         if block is None:
             raise e
-        unroller = RaiseBreakValue(e.parent_interp, e.w_value)
+        unroller = RaiseBreakValue(e.parent_activation, e.w_value)
         return block.handle(space, frame, unroller)
 
     def handle_throw(self, space, pc, frame, bytecode, e):
@@ -177,8 +174,8 @@ class Interpreter(object):
 
     def LOAD_DEREF(self, space, bytecode, frame, pc, idx):
         c_var = space.newconstraintvariable(cell=frame.cells[idx])
-        # TODO: think of something to mark these dirty so we don't do
-        # this lookup all the time
+        # get_value only asks the solver again if its solution epoch
+        # advanced since the value was last stored
         if c_var:
             frame.push(space.get_value(c_var))
         else:
@@ -243,6 +240,9 @@ class Interpreter(object):
     def LOAD_INSTANCE_VAR(self, space, bytecode, frame, pc, idx):
         name = space.symbol_w(bytecode.consts_w[idx])
         w_obj = frame.pop()
+        if not space.may_have_constraint_ivars(w_obj):
+            frame.push(space.find_instance_var(w_obj, name) or space.w_nil)
+            return
         c_var = space.newconstraintvariable(w_owner=w_obj, ivar=name)
         if c_var:
             w_res = space.get_value(c_var)
@@ -254,6 +254,10 @@ class Interpreter(object):
         name = space.symbol_w(bytecode.consts_w[idx])
         w_value = frame.pop()
         w_obj = frame.pop()
+        if not space.may_have_constraint_ivars(w_obj):
+            space.set_instance_var(w_obj, name, w_value)
+            frame.push(w_value)
+            return
         c_var = space.newconstraintvariable(w_owner=w_obj, ivar=name)
         if not c_var or not space.assign_value(c_var, w_value):
             space.set_instance_var(w_obj, name, w_value)
@@ -359,9 +363,10 @@ class Interpreter(object):
         cells = [frame.pop() for _ in range(n_cells)]
         w_code = frame.pop()
         assert isinstance(w_code, W_CodeObject)
+        activation = frame.get_activation()
         frame.push(space.newproc(
             w_code, frame.w_self, frame.lexical_scope, cells, frame.block,
-            self, frame.top_parent_interp or self, frame.regexp_match_cell
+            activation, frame.top_parent_activation or activation, frame.regexp_match_cell
         ))
 
     def BUILD_LAMBDA(self, space, bytecode, frame, pc):
@@ -722,8 +727,8 @@ class Interpreter(object):
         w_returnvalue = frame.pop()
         block = frame.unrollstack(RaiseReturnValue.kind)
         if block is None:
-            raise RaiseReturn(frame.top_parent_interp, w_returnvalue)
-        unroller = RaiseReturnValue(frame.top_parent_interp, w_returnvalue)
+            raise RaiseReturn(frame.top_parent_activation, w_returnvalue)
+        unroller = RaiseReturnValue(frame.top_parent_activation, w_returnvalue)
         return block.handle(space, frame, unroller)
 
     def YIELD(self, space, bytecode, frame, pc, n_args):
@@ -761,13 +766,13 @@ class Interpreter(object):
         return frame.unrollstack_and_jump(space, BreakLoop(w_obj))
 
     def RAISE_BREAK(self, space, bytecode, frame, pc):
-        if frame.parent_interp.finished:
+        if frame.parent_activation.finished:
             raise space.error(space.w_LocalJumpError, "break from proc-closure")
         w_value = frame.pop()
         block = frame.unrollstack(RaiseBreakValue.kind)
         if block is None:
-            raise RaiseBreak(frame.parent_interp, w_value)
-        unroller = RaiseBreakValue(frame.parent_interp, w_value)
+            raise RaiseBreak(frame.parent_activation, w_value)
+        unroller = RaiseBreakValue(frame.parent_activation, w_value)
         return block.handle(space, frame, unroller)
 
     def BEGIN_MULTI_ASSIGNMENT(self, space, bytecode, frame, pc):
@@ -799,8 +804,8 @@ class Return(Exception):
 
 
 class RaiseFlow(Exception):
-    def __init__(self, parent_interp, w_value):
-        self.parent_interp = parent_interp
+    def __init__(self, parent_activation, w_value):
+        self.parent_activation = parent_activation
         self.w_value = w_value
 
 
@@ -845,12 +850,12 @@ class ReturnValue(SuspendedUnroller):
 class RaiseReturnValue(SuspendedUnroller):
     kind = 1 << 2
 
-    def __init__(self, parent_interp, w_returnvalue):
-        self.parent_interp = parent_interp
+    def __init__(self, parent_activation, w_returnvalue):
+        self.parent_activation = parent_activation
         self.w_returnvalue = w_returnvalue
 
     def nomoreblocks(self):
-        raise RaiseReturn(self.parent_interp, self.w_returnvalue)
+        raise RaiseReturn(self.parent_activation, self.w_returnvalue)
 
 
 class ContinueLoop(SuspendedUnroller):
@@ -870,12 +875,12 @@ class BreakLoop(SuspendedUnroller):
 class RaiseBreakValue(SuspendedUnroller):
     kind = 1 << 5
 
-    def __init__(self, parent_interp, w_value):
-        self.parent_interp = parent_interp
+    def __init__(self, parent_activation, w_value):
+        self.parent_activation = parent_activation
         self.w_value = w_value
 
     def nomoreblocks(self):
-        raise RaiseBreak(self.parent_interp, self.w_value)
+        raise RaiseBreak(self.parent_activation, self.w_value)
 
 
 class ThrowValue(SuspendedUnroller):
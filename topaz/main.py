@@ -7,6 +7,7 @@ from rpython.rlib import jit
 from rpython.rlib.objectmodel import specialize
 from rpython.rlib.streamio import open_file_as_stream, fdopen_as_stream
 
+from topaz.constraintinterpreter import ConstraintProfile
 from topaz.error import RubyError, print_traceback
 from topaz.objects.exceptionobject import W_SystemExit
 from topaz.objspace import ObjectSpace
@@ -292,6 +293,11 @@ def _entry_point(space, argv):
     w_program_name = space.newstr_fromstr(path)
     space.globals.set(space, "$0", w_program_name)
     space.globals.set(space, "$PROGRAM_NAME", w_program_name)
+    stats_path = os.environ.get("TOPAZ_CONSTRAINT_STATS")
+    if stats_path:
+        profile = space.fromcache(ConstraintProfile)
+        profile.enabled = True
+        profile.dump_path = stats_path
     status = 0
     w_exit_error = None
     explicit_status = False
@@ -320,6 +326,7 @@ def _entry_point(space, argv):
             w_exit_error = w_exc
             status = 1
     exit_handler_status = space.run_exit_handlers()
+    space.fromcache(ConstraintProfile).dump_at_exit(space)
     if not explicit_status and exit_handler_status != -1:
         status = exit_handler_status
     if w_exit_error is not None:
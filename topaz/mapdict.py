@@ -26,8 +26,11 @@ class MapTransitionCache(object):
 
 
 class BaseNode(object):
-    _attrs_ = ["size_estimate"]
-    _immutable_fields_ = ["size_estimate"]
+    _attrs_ = ["size_estimate", "has_constraint_vars"]
+    # has_constraint_vars is True if this node or one of its ancestors
+    # is a ConstraintVarNode, so objects whose map never had one can
+    # skip the search for constraint variables
+    _immutable_fields_ = ["size_estimate", "has_constraint_vars"]
 
     @jit.elidable
     def find(self, node_cls, name=None):
@@ -54,6 +57,7 @@ class ClassNode(BaseNode):
     def __init__(self, w_cls):
         self.w_cls = w_cls
         self.size_estimate = SizeEstimate(0, 0)
+        self.has_constraint_vars = False
 
     def getclass(self):
         return self.w_cls
@@ -78,6 +82,7 @@ class StorageNode(BaseNode):
         self.prev = prev
         self.name = name
         self.pos = self.compute_position()
+        self.has_constraint_vars = prev.has_constraint_vars
 
     def length(self):
         return self.pos + 1
@@ -239,6 +244,7 @@ class ConstraintVarNode(StorageNode):
             self.length() * NUM_DIGITS_POW2,
             prev.size_estimate._unboxed_size_estimate,
         )
+        self.has_constraint_vars = True
 
     def compute_position(self):
         return compute_position(self, "uses_object_storage")
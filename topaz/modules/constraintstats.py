@@ -0,0 +1,72 @@
+from __future__ import absolute_import
+
+from topaz.constraintinterpreter import ConstraintProfile
+from topaz.module import ModuleDef
+
+
+def timings_hash(space, timings):
+    w_timings = space.newhash()
+    for name in timings.names:
+        timing = timings.timings[name]
+        w_timing = space.newhash()
+        space.send(w_timing, "[]=", [space.newsymbol("count"), space.newint(timing.count)])
+        space.send(w_timing, "[]=", [space.newsymbol("seconds"), space.newfloat(timing.seconds)])
+        space.send(w_timings, "[]=", [space.newsymbol(name), w_timing])
+    return w_timings
+
+
+class ConstraintStats(object):
+    """Topaz::ConstraintStats, counts and times constraint construction,
+    enable and disable, recalculation, assignments and solver runs while
+    enabled."""
+    moduledef = ModuleDef("ConstraintStats")
+
+    @moduledef.function("enable")
+    def method_enable(self, space):
+        space.fromcache(ConstraintProfile).enabled = True
+        return space.w_nil
+
+    @moduledef.function("disable")
+    def method_disable(self, space):
+        space.fromcache(ConstraintProfile).enabled = False
+        return space.w_nil
+
+    @moduledef.function("enabled?")
+    def method_enabledp(self, space):
+        return space.newbool(space.fromcache(ConstraintProfile).enabled)
+
+    @moduledef.function("reset")
+    def method_reset(self, space):
+        space.fromcache(ConstraintProfile).reset()
+        return space.w_nil
+
+    @moduledef.function("report")
+    def method_report(self, space):
+        profile = space.fromcache(ConstraintProfile)
+        w_constraints = space.newhash()
+        for w_constraint in profile.constraints_w:
+            space.send(w_constraints, "[]=", [
+                w_constraint, timings_hash(space, profile.constraint_timings[w_constraint])
+            ])
+        w_solvers = space.newhash()
+        for solver_name in profile.solver_names:
+            space.send(w_solvers, "[]=", [
+                space.newstr_fromstr(solver_name),
+                timings_hash(space, profile.solver_timings[solver_name])
+            ])
+        w_report = space.newhash()
+        space.send(w_report, "[]=", [space.newsymbol("events"), timings_hash(space, profile.totals)])
+        space.send(w_report, "[]=", [space.newsymbol("constraints"), w_constraints])
+        space.send(w_report, "[]=", [space.newsymbol("solvers"), w_solvers])
+        return w_report
+
+    @moduledef.function("to_json")
+    def method_to_json(self, space):
+        return space.newstr_fromstr(space.fromcache(ConstraintProfile).to_json(space))
+
+    @moduledef.function("dump_at_exit", path="str")
+    def method_dump_at_exit(self, space, path="-"):
+        profile = space.fromcache(ConstraintProfile)
+        profile.enabled = True
+        profile.dump_path = path
+        return space.w_nil
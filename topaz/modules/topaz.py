@@ -3,7 +3,9 @@ import sys
 
 from rpython.rlib.rarithmetic import intmask
 
+from topaz.constraintinterpreter import PropagationCounters
 from topaz.module import ModuleDef
+from topaz.modules.constraintstats import ConstraintStats
 from topaz.objects.classobject import W_ClassObject
 
 
@@ -13,6 +15,7 @@ class Topaz(object):
     @moduledef.setup_module
     def setup_module(space, w_mod):
         space.set_const(w_mod, "FIXNUM_MAX", space.newint(sys.maxint))
+        space.set_const(w_mod, "ConstraintStats", space.getmoduleobject(ConstraintStats.moduledef))
 
     @moduledef.function("intmask")
     def method_intmask(self, space, w_int):
@@ -42,3 +45,19 @@ class Topaz(object):
     def method_infect(self, space, w_dest, w_src, taint=True, untrust=True, freeze=False):
         space.infect(w_dest, w_src, taint=taint, untrust=untrust, freeze=freeze)
         return self
+
+    @moduledef.function("propagation_stats")
+    def method_propagation_stats(self, space):
+        counters = space.fromcache(PropagationCounters)
+        w_stats = space.newhash()
+        for name, count in [("reads", counters.reads),
+                            ("propagating_reads", counters.propagating_reads),
+                            ("solves", counters.solves),
+                            ("recalculations", counters.recalculations)]:
+            space.send(w_stats, "[]=", [space.newsymbol(name), space.newint(count)])
+        return w_stats
+
+    @moduledef.function("reset_propagation_stats")
+    def method_reset_propagation_stats(self, space):
+        space.fromcache(PropagationCounters).reset()
+        return space.w_nil
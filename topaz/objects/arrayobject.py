@@ -2,7 +2,6 @@ import copy
 
 from rpython.rlib import jit
 from rpython.rlib.listsort import make_timsort_class
-from rpython.rlib.objectmodel import newlist_hint
 from rpython.rlib.rbigint import rbigint
 
 from topaz.coerce import Coerce
@@ -44,6 +43,35 @@ class RubySortBy(BaseRubySortBy):
         return self.space.int_w(w_cmp_res) < 0
 
 
+BaseRubyIndexSorter = make_timsort_class()
+
+
+# sorts the indices of items_w by their items, for arrays that have to
+# move the constraints on their elements along
+class RubyIndexSorter(BaseRubyIndexSorter):
+    def __init__(self, space, list, items_w, sortblock=None, by=False):
+        BaseRubyIndexSorter.__init__(self, list)
+        self.space = space
+        self.items_w = items_w
+        self.sortblock = sortblock
+        self.by = by
+
+    def lt(self, a, b):
+        w_a = self.items_w[a]
+        w_b = self.items_w[b]
+        if self.by:
+            w_cmp_res = self.space.compare(
+                self.space.invoke_block(self.sortblock, [w_a]),
+                self.space.invoke_block(self.sortblock, [w_b])
+            )
+        else:
+            w_cmp_res = self.space.compare(w_a, w_b, self.sortblock)
+        if self.space.is_kind_of(w_cmp_res, self.space.w_bignum):
+            return self.space.bigint_w(w_cmp_res).lt(rbigint.fromint(0))
+        else:
+            return self.space.int_w(w_cmp_res) < 0
+
+
 class W_ArrayObject(W_Object):
     classdef = ClassDef("Array", W_Object.classdef)
     classdef.include_module(Enumerable)
@@ -51,27 +79,88 @@ class W_ArrayObject(W_Object):
     def __init__(self, space, items_w, klass=None):
         W_Object.__init__(self, space, klass)
         self.items_w = items_w
-        self.constraint_items_w = newlist_hint(len(items_w))
+        # maps the indices of constrained elements to their variables,
+        # only allocated once an element gets constrained
+        self.constraint_items = None
 
     def __deepcopy__(self, memo):
         obj = super(W_ArrayObject, self).__deepcopy__(memo)
         obj.items_w = copy.deepcopy(self.items_w, memo)
-        obj.constraint_items_w = copy.deepcopy(self.constraint_items_w, memo)
+        obj.constraint_items = copy.deepcopy(self.constraint_items, memo)
         return obj
 
     def listview(self, space):
         return self.items_w
 
     def find_constraint_on_idx(self, space, idx):
-        if idx >= len(self.constraint_items_w):
+        if self.constraint_items is None:
             return None
         else:
-            return self.constraint_items_w[idx]
+            return self.constraint_items.get(idx, None)
 
     def set_constraint_on_idx(self, space, idx, c_var):
-        if idx >= len(self.constraint_items_w):
-            self.constraint_items_w += [None] * (len(self.items_w) - len(self.constraint_items_w))
-        self.constraint_items_w[idx] = c_var
+        if self.constraint_items is None:
+            self.constraint_items = {}
+        self.constraint_items[idx] = c_var
+
+    def _splice_constraints(self, space, start, removed, inserted):
+        # must run before `removed` items at `start` are replaced by
+        # `inserted` new ones
+        if self.constraint_items is None:
+            return
+        delta = inserted - removed
+        constraint_items = {}
+        for idx, c_var in self.constraint_items.iteritems():
+            if idx < start:
+                constraint_items[idx] = c_var
+            elif idx < start + removed:
+                c_var.remove_from_owner(self.items_w[idx])
+            else:
+                c_var.move_to_idx(idx + delta)
+                constraint_items[idx + delta] = c_var
+        self._set_constraint_items(constraint_items)
+
+    def _rotate_constraints(self, space, n):
+        if self.constraint_items is None:
+            return
+        length = self.length()
+        constraint_items = {}
+        for idx, c_var in self.constraint_items.iteritems():
+            new_idx = (idx - n) % length
+            c_var.move_to_idx(new_idx)
+            constraint_items[new_idx] = c_var
+        self.constraint_items = constraint_items
+
+    def _reverse_constraints(self, space):
+        if self.constraint_items is None:
+            return
+        last = self.length() - 1
+        constraint_items = {}
+        for idx, c_var in self.constraint_items.iteritems():
+            c_var.move_to_idx(last - idx)
+            constraint_items[last - idx] = c_var
+        self.constraint_items = constraint_items
+
+    def _sort_constrained(self, space, sortblock, by):
+        # order[i] is the index of the item that ends up at i
+        order = range(self.length())
+        RubyIndexSorter(space, order, self.items_w, sortblock=sortblock, by=by).sort()
+        new_idx = [0] * len(order)
+        for i, idx in enumerate(order):
+            new_idx[idx] = i
+        constraint_items = {}
+        for idx, c_var in self.constraint_items.iteritems():
+            c_var.move_to_idx(new_idx[idx])
+            constraint_items[new_idx[idx]] = c_var
+        self.constraint_items = constraint_items
+        items_w = [self.items_w[idx] for idx in order]
+        self.items_w[:] = items_w
+
+    def _set_constraint_items(self, constraint_items):
+        if constraint_items:
+            self.constraint_items = constraint_items
+        else:
+            self.constraint_items = None
 
     def length(self):
         return len(self.items_w)
@@ -84,6 +173,7 @@ class W_ArrayObject(W_Object):
     @classdef.method("replace", other_w="array")
     @check_frozen()
     def method_replace(self, space, other_w):
+        self._splice_constraints(space, 0, self.length(), len(other_w))
         del self.items_w[:]
         self.items_w.extend(other_w)
         return self
@@ -150,6 +240,7 @@ class W_ArrayObject(W_Object):
 
     def _subscript_assign_range(self, space, start, end, rep_w):
         assert end >= 0
+        self._splice_constraints(space, start, end - start, len(rep_w))
         delta = (end - start) - len(rep_w)
         if delta < 0:
             self.items_w += [None] * -delta
@@ -174,10 +265,12 @@ class W_ArrayObject(W_Object):
             end = min(max(end, 0), self.length())
             delta = (end - start)
             assert delta >= 0
+            self._splice_constraints(space, start, delta, 0)
             w_items = self.items_w[start:start + delta]
             del self.items_w[start:start + delta]
             return space.newarray(w_items)
         else:
+            self._splice_constraints(space, start, 1, 0)
             w_item = self.items_w[start]
             del self.items_w[start]
             return w_item
@@ -229,12 +322,14 @@ class W_ArrayObject(W_Object):
     def method_shift(self, space, w_n=None):
         if w_n is None:
             if self.items_w:
+                self._splice_constraints(space, 0, 1, 0)
                 return self.items_w.pop(0)
             else:
                 return space.w_nil
         n = space.int_w(space.convert_type(w_n, space.w_fixnum, "to_int"))
         if n < 0:
             raise space.error(space.w_ArgumentError, "negative array size")
+        self._splice_constraints(space, 0, min(n, self.length()), 0)
         items_w = self.items_w[:n]
         del self.items_w[:n]
         return space.newarray(items_w)
@@ -242,6 +337,7 @@ class W_ArrayObject(W_Object):
     @classdef.method("unshift")
     @check_frozen()
     def method_unshift(self, space, args_w):
+        self._splice_constraints(space, 0, 0, len(args_w))
         for w_obj in reversed(args_w):
             self.items_w.insert(0, w_obj)
         return self
@@ -268,6 +364,7 @@ class W_ArrayObject(W_Object):
     def method_pop(self, space, w_num=None):
         if w_num is None:
             if self.items_w:
+                self._splice_constraints(space, self.length() - 1, 1, 0)
                 return self.items_w.pop()
             else:
                 return space.w_nil
@@ -279,6 +376,7 @@ class W_ArrayObject(W_Object):
                 raise space.error(space.w_ArgumentError, "negative array size")
             else:
                 pop_size = max(0, self.length() - num)
+                self._splice_constraints(space, pop_size, self.length() - pop_size, 0)
                 res_w = self.items_w[pop_size:]
                 del self.items_w[pop_size:]
                 return space.newarray(res_w)
@@ -291,6 +389,7 @@ class W_ArrayObject(W_Object):
         if idx < 0 or idx >= self.length():
             return space.w_nil
         else:
+            self._splice_constraints(space, idx, 1, 0)
             return self.items_w.pop(idx)
 
     @classdef.method("last")
@@ -324,13 +423,17 @@ class W_ArrayObject(W_Object):
     @classdef.method("clear")
     @check_frozen()
     def method_clear(self, space):
+        self._splice_constraints(space, 0, self.length(), 0)
         del self.items_w[:]
         return self
 
     @classdef.method("sort!")
     @check_frozen()
     def method_sort_i(self, space, block):
-        RubySorter(space, self.items_w, sortblock=block).sort()
+        if self.constraint_items is not None:
+            self._sort_constrained(space, block, False)
+        else:
+            RubySorter(space, self.items_w, sortblock=block).sort()
         return self
 
     @classdef.method("sort_by!")
@@ -338,12 +441,16 @@ class W_ArrayObject(W_Object):
     def method_sort_by_i(self, space, block):
         if block is None:
             return space.send(self, "enum_for", [space.newsymbol("sort_by!")])
-        RubySortBy(space, self.items_w, sortblock=block).sort()
+        if self.constraint_items is not None:
+            self._sort_constrained(space, block, True)
+        else:
+            RubySortBy(space, self.items_w, sortblock=block).sort()
         return self
 
     @classdef.method("reverse!")
     @check_frozen()
     def method_reverse_i(self, space):
+        self._reverse_constraints(space)
         self.items_w.reverse()
         return self
 
@@ -360,6 +467,7 @@ class W_ArrayObject(W_Object):
         if n == 0:
             return self
         assert n >= 0
+        self._rotate_constraints(space, n)
         self.items_w.extend(self.items_w[:n])
         del self.items_w[:n]
         return self
@@ -382,6 +490,7 @@ class W_ArrayObject(W_Object):
                 )
             i += length + 1
         assert i >= 0
+        self._splice_constraints(space, i, 0, len(args_w))
         for w_e in args_w:
             self.items_w.insert(i, w_e)
             i += 1
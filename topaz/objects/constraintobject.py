@@ -1,7 +1,7 @@
 from rpython.rlib import jit
 
 from topaz.celldict import CellDict, VersionTag
-from topaz.constraintinterpreter import ConstrainedVariable
+from topaz.constraintinterpreter import ConstrainedVariable, ConstraintTemplate, SolverRegistry, ConstraintProfile
 from topaz.module import ClassDef, ModuleDef
 from topaz.objects.hashobject import W_HashObject
 from topaz.objects.objectobject import W_Object, W_RootObject
@@ -66,7 +66,8 @@ class W_ConstraintMarkerObject(W_Object):
 class W_ConstraintObject(W_ConstraintMarkerObject):
     _attrs_ = ["w_strength", "block", "enabled",
                "constraint_objects_w", "constraint_variables_w",
-               "assignments_w", "w_solver", "last_cvar"]
+               "assignments_w", "w_solver", "last_cvar", "input_values_w",
+               "template"]
     classdef = ClassDef("Constraint", W_ConstraintMarkerObject.classdef)
 
     def __init__(self, space):
@@ -78,6 +79,10 @@ class W_ConstraintObject(W_ConstraintMarkerObject):
         self.constraint_variables_w = []
         self.assignments_w = []
         self.last_cvar = None
+        # values of the variables the predicate read that the solver
+        # does not handle, parallel to constraint_variables_w
+        self.input_values_w = None
+        self.template = None
 
     def get_constraint_objects(self):
         return self.constraint_objects_w
@@ -117,8 +122,12 @@ class W_ConstraintObject(W_ConstraintMarkerObject):
     @classdef.method("enable")
     def method_enable(self, space):
         if not self.enabled:
-            for w_constraint_object in self.constraint_objects_w:
-                self.enable_constraint_object(space, w_constraint_object)
+            registry = space.fromcache(SolverRegistry)
+            registry.all_solutions_changed()
+            with space.fromcache(ConstraintProfile).constraint_event(self, "enable"):
+                with registry.enabling(self):
+                    for w_constraint_object in self.constraint_objects_w:
+                        self.enable_constraint_object(space, w_constraint_object)
             self.enabled = True
             return space.w_true
         else:
@@ -154,9 +163,13 @@ class W_ConstraintObject(W_ConstraintMarkerObject):
     @classdef.method("disable")
     def method_disable(self, space):
         if self.enabled:
-            for w_constraint_object in self.constraint_objects_w:
-                if space.respond_to(w_constraint_object, "disable"):
-                    space.send(w_constraint_object, "disable")
+            registry = space.fromcache(SolverRegistry)
+            registry.all_solutions_changed()
+            with space.fromcache(ConstraintProfile).constraint_event(self, "disable"):
+                with registry.enabling(self):
+                    for w_constraint_object in self.constraint_objects_w:
+                        if space.respond_to(w_constraint_object, "disable"):
+                            space.send(w_constraint_object, "disable")
             self.enabled = False
             return space.w_true
         else:
@@ -164,6 +177,10 @@ class W_ConstraintObject(W_ConstraintMarkerObject):
 
     @classdef.method("recalculate")
     def method_recalculate(self, space, w_c_cause):
+        with space.fromcache(ConstraintProfile).constraint_event(self, "recalculate"):
+            self.recalculate(space, w_c_cause)
+
+    def recalculate(self, space, w_c_cause):
         if self.enabled:
             if self.isidentity():
                 for w_constraint_object in self.constraint_objects_w:
@@ -174,15 +191,50 @@ class W_ConstraintObject(W_ConstraintMarkerObject):
                         # of the identity-constrained variables is
                         # happening
                         return
+            if self.inputs_unchanged(space):
+                # the predicate would build the same constraints again
+                return
             space.send(self, "disable")
             del self.constraint_objects_w[:]
             self.run_predicate(space)
             space.send(self, "enable")
 
     def run_predicate(self, space):
-        with space.constraint_construction(self):
-            w_constraint_object = space.invoke_block(self.block, [])
-            self.add_constraint_object(w_constraint_object)
+        self.template = ConstraintTemplate()
+        with space.fromcache(ConstraintProfile).constraint_event(self, "run_predicate"):
+            with space.constraint_construction(self):
+                w_constraint_object = space.invoke_block(self.block, [])
+                self.add_constraint_object(w_constraint_object)
+        self.template.finish(space, self.constraint_objects_w)
+        self.record_inputs(space)
+
+    def record_send(self, space, w_receiver, name, args_w, block, w_result):
+        if self.template is not None:
+            self.template.record_send(space, w_receiver, name, args_w, block, w_result)
+
+    def record_inputs(self, space):
+        values_w = [None] * len(self.constraint_variables_w)
+        for i, c_var in enumerate(self.constraint_variables_w):
+            if not c_var._is_solveable(space, self.w_solver):
+                values_w[i] = c_var.load_value(space)
+        self.input_values_w = values_w
+
+    def inputs_unchanged(self, space):
+        values_w = self.input_values_w
+        if values_w is None or len(values_w) != len(self.constraint_variables_w):
+            return False
+        for i, c_var in enumerate(self.constraint_variables_w):
+            w_old_value = values_w[i]
+            if c_var._is_solveable(space, self.w_solver):
+                if w_old_value is not None:
+                    return False
+                continue
+            if w_old_value is None:
+                return False
+            w_value = c_var.load_value(space)
+            if w_value is not w_old_value and not space.eq_w(w_value, w_old_value):
+                return False
+        return True
 
     @classdef.method("primitive_constraints")
     def method_solver_constraints(self, space):
@@ -192,8 +244,8 @@ class W_ConstraintObject(W_ConstraintMarkerObject):
     def method_solver_constraints(self, space):
         vars_w = []
         for w_var in self.constraint_variables_w:
-            if w_var._is_solveable(self.get_solver()):
-                vars_w.append(w_var._get_external_variable(self.get_solver()))
+            if w_var._is_solveable(space, self.get_solver()):
+                vars_w.append(w_var._get_external_variable(space, self.get_solver()))
         return space.newarray(vars_w)
 
     @classdef.method("predicate")
@@ -218,6 +270,38 @@ class W_ConstraintObject(W_ConstraintMarkerObject):
     def method_solver(self, space):
         return self.w_solver or space.w_nil
 
+    @classdef.method("solver=")
+    def method_set_solver(self, space, w_solver):
+        if w_solver is space.w_nil:
+            w_solver = None
+        if w_solver is self.w_solver:
+            return w_solver or space.w_nil
+        if self.isidentity():
+            raise space.error(
+                space.w_RuntimeError,
+                "identity constraints cannot be moved to another solver"
+            )
+        enabled = self.enabled
+        if enabled:
+            space.send(self, "disable")
+        w_old_solver = self.w_solver
+        constraint_objects_w = None
+        template = self.template
+        if w_solver is not None and template is not None and template.valid:
+            constraint_objects_w = template.instantiate(space, w_solver)
+        for c_var in self.constraint_variables_w:
+            c_var.move_constraint(space, self, w_old_solver, w_solver)
+        self.w_solver = w_solver
+        del self.constraint_objects_w[:]
+        if constraint_objects_w is None:
+            self.run_predicate(space)
+        else:
+            self.constraint_objects_w.extend(constraint_objects_w)
+            self.record_inputs(space)
+        if enabled:
+            space.send(self, "enable")
+        return w_solver or space.w_nil
+
     @classdef.method("initialize")
     def method_initialize(self, space, w_strength=None, w_options=None, block=None):
         if not block:
@@ -244,15 +328,26 @@ class W_ConstraintObject(W_ConstraintMarkerObject):
         assert self.w_solver is None
         self.w_solver = w_solver
         for c_var in self.constraint_variables_w:
-            c_var._set_solver_for_unbound_constraint(self, w_solver)
+            c_var._set_solver_for_unbound_constraint(space, self, w_solver)
 
     def get_solver(self):
         return self.w_solver
 
+    def source_location(self):
+        if self.block is None:
+            return "unknown"
+        bytecode = self.block.bytecode
+        return "%s:%d" % (bytecode.filepath, bytecode.lineno_table[0])
+
     @classdef.singleton_method("allocate")
     def singleton_method_allocate(self, space):
         return W_ConstraintObject(space)
 
+    @classdef.singleton_method("solution_changed")
+    def singleton_method_solution_changed(self, space, w_solver):
+        space.fromcache(SolverRegistry).solution_changed(w_solver)
+        return space.w_nil
+
     @classdef.method("value")
     def method_return_value(self, space):
         # last added constraint object is the return value
@@ -0,0 +1,418 @@
+from __future__ import absolute_import
+
+from topaz.coerce import Coerce
+from topaz.constraintinterpreter import SolverRegistry, ConstraintProfile
+from topaz.module import ClassDef
+from topaz.objects.objectobject import W_Object
+from topaz.objects.constraintobject import W_ConstraintMarkerObject
+from topaz.objects.procobject import W_ProcObject
+from topaz.utils.deltablue import (Planner, Variable, Method, Constraint,
+    PlanningError, Cycle, REQUIRED, STRONG, MEDIUM, WEAK)
+
+
+STRENGTHS = ["required", "strong", "medium", "weak"]
+
+
+def strength_of(space, w_strength):
+    if w_strength is None or w_strength is space.w_nil:
+        return REQUIRED
+    name = Coerce.symbol(space, w_strength)
+    if name == "required":
+        return REQUIRED
+    elif name == "strong":
+        return STRONG
+    elif name == "medium":
+        return MEDIUM
+    elif name == "weak":
+        return WEAK
+    raise space.error(space.w_ArgumentError, "unsupported strength %s" % name)
+
+
+def proc_arg(space, w_proc):
+    if not isinstance(w_proc, W_ProcObject):
+        raise space.error(
+            space.w_TypeError,
+            "wrong argument type %s (expected Proc)" % space.obj_to_s(space.getclass(w_proc))
+        )
+    return w_proc
+
+
+class FormulaMethod(Method):
+    def __init__(self, output, inputs, w_block):
+        Method.__init__(self, output, inputs)
+        self.w_block = w_block
+
+
+class W_DeltaBlueObject(W_Object):
+    _attrs_ = ["planner", "plan_count"]
+    classdef = ClassDef("DeltaBlue", W_Object.classdef)
+
+    def __init__(self, space, klass=None):
+        W_Object.__init__(self, space, klass=klass)
+        self.planner = Planner()
+        # plans extracted for assignments, reused ones not counted
+        self.plan_count = 0
+
+    @classdef.setup_class
+    def setup_class(cls, space, w_cls):
+        space.set_const(w_cls, "Variable", space.getclassfor(W_DeltaBlueVariable))
+        space.set_const(w_cls, "Formula", space.getclassfor(W_DeltaBlueFormula))
+        space.set_const(w_cls, "Constraint", space.getclassfor(W_DeltaBlueConstraint))
+
+    @classdef.singleton_method("allocate")
+    def method_allocate(self, space):
+        return W_DeltaBlueObject(space, self)
+
+    @classdef.method("weight")
+    def method_weight(self, space):
+        return space.newint(10)
+
+    # each variable checks its own predicates in #assign, so atomic
+    # assignments cannot be batched into one call
+    @classdef.method("per_variable_assign?")
+    def method_per_variable_assign(self, space):
+        return space.w_true
+
+    @classdef.method("constraint_variable_for")
+    def method_constraint_variable_for(self, space, w_value):
+        return W_DeltaBlueVariable(space, self, w_value)
+
+    @classdef.method("plan_count")
+    def method_plan_count(self, space):
+        return space.newint(self.plan_count)
+
+    @classdef.method("add_constraint")
+    def method_add_constraint(self, space, w_predicate, w_strength, w_methods):
+        # The methods block returns an array of formulas, built with
+        # Variable#< while its variables are ours
+        w_constraint = space.send(
+            space.w_constraint, "new", [self.solver_options(space)], proc_arg(space, w_methods)
+        )
+        formulas_w = []
+        for w_formula in space.listview(space.send(w_constraint, "value")):
+            if not isinstance(w_formula, W_DeltaBlueFormula) or w_formula.w_output.w_solver is not self:
+                raise space.error(
+                    space.w_TypeError,
+                    "expected %s, got %s" % (
+                        space.getclassfor(W_DeltaBlueFormula).name,
+                        space.getclass(w_formula).name
+                    )
+                )
+            formulas_w.append(w_formula)
+        if not formulas_w:
+            raise space.error(space.w_ArgumentError, "no formulas given")
+        if w_predicate is space.w_nil:
+            w_predicate = None
+        else:
+            w_predicate = proc_arg(space, w_predicate)
+        w_deltablue_constraint = W_DeltaBlueConstraint(
+            space, self, formulas_w, w_predicate, strength_of(space, w_strength)
+        )
+        self.add_constraint(space, w_deltablue_constraint)
+        return w_deltablue_constraint
+
+    def solver_options(self, space):
+        w_options = space.newhash()
+        space.send(w_options, "[]=", [space.newsymbol("solver"), self])
+        return w_options
+
+    def add_constraint(self, space, w_constraint):
+        planner = self.planner
+        error = None
+        try:
+            planner.add_constraint(w_constraint.constraint)
+        except PlanningError as e:
+            error = self.planning_failed(e)
+        self.execute(space, planner.take_executed())
+        if error is not None:
+            raise space.error(space.w_RuntimeError, error)
+        w_constraint.enabled = True
+        for w_var in w_constraint.variables_w():
+            w_var.constraints_w.append(w_constraint)
+
+    def remove_constraint(self, space, w_constraint):
+        planner = self.planner
+        error = None
+        try:
+            planner.remove_constraint(w_constraint.constraint)
+        except PlanningError as e:
+            error = self.planning_failed(e)
+        self.execute(space, planner.take_executed())
+        self.unlink(w_constraint)
+        if error is not None:
+            raise space.error(space.w_RuntimeError, error)
+
+    def unlink(self, w_constraint):
+        w_constraint.enabled = False
+        for w_var in w_constraint.variables_w():
+            w_var.constraints_w.remove(w_constraint)
+
+    def planning_failed(self, error):
+        # the planner is consistent again, but constraints that closed a
+        # cycle are out of its graph, so they are not enabled anymore
+        for constraint in self.planner.take_dropped():
+            w_constraint = constraint.owner
+            if isinstance(w_constraint, W_DeltaBlueConstraint) and w_constraint.enabled:
+                self.unlink(w_constraint)
+        if isinstance(error, Cycle):
+            return "cyclic constraint graph"
+        return "Failed to enforce a required constraint"
+
+    def execute(self, space, constraints):
+        registry = space.fromcache(SolverRegistry)
+        for constraint in constraints:
+            method = constraint.method()
+            if isinstance(method, FormulaMethod):
+                w_var = method.output.owner
+                w_var.w_value = space.invoke_block(method.w_block, [])
+                # later formulas read the variable through its local
+                registry.solution_changed(self)
+
+    def predicates_hold(self, space, w_var):
+        for w_constraint in w_var.constraints_w:
+            w_predicate = w_constraint.w_predicate
+            if w_predicate is None:
+                # without a predicate we cannot tell, so propagate
+                return False
+            if not space.is_true(space.invoke_block(w_predicate, [])):
+                return False
+        return True
+
+    def assign(self, space, w_var):
+        registry = space.fromcache(SolverRegistry)
+        w_previous = w_var.w_value
+        w_var.w_value = w_var.w_proposed
+        registry.solution_changed(self)
+        if self.predicates_hold(space, w_var):
+            return
+        w_var.w_value = w_previous
+        registry.solution_changed(self)
+        with space.fromcache(ConstraintProfile).solver_event(space, self, "solve"):
+            self.propagate(space, w_var)
+
+    def propagate(self, space, w_var):
+        registry = space.fromcache(SolverRegistry)
+        planner = self.planner
+        if w_var.plan is not None and w_var.plan_version == planner.version:
+            w_var.w_value = w_var.w_proposed
+            self.execute(space, w_var.plan)
+            return
+
+        # DeltaBlue's change: edit the variable, run the plan for that
+        # and retract the edit again
+        version = planner.version
+        edit = w_var.edit_constraint()
+        error = None
+        try:
+            planner.add_constraint(edit)
+        except PlanningError as e:
+            error = self.planning_failed(e)
+        self.execute(space, planner.take_executed())
+        if error is not None:
+            raise space.error(space.w_RuntimeError, error)
+        plan = planner.extract_plan([edit])
+        self.plan_count += 1
+        w_var.w_value = w_var.w_proposed
+        registry.solution_changed(self)
+        self.execute(space, plan)
+        try:
+            planner.remove_constraint(edit)
+        except PlanningError as e:
+            error = self.planning_failed(e)
+        self.execute(space, planner.take_executed())
+        if error is not None:
+            w_var.plan = None
+            raise space.error(space.w_RuntimeError, error)
+        if planner.version == version:
+            # the edit did not change the graph, so the same plan works
+            # for the next assignment until something else does
+            w_var.plan = plan
+            w_var.plan_version = version
+        else:
+            w_var.plan = None
+
+    def set_readonly(self, space, w_var, readonly):
+        planner = self.planner
+        error = None
+        if readonly and w_var.stay is None:
+            stay = Constraint(REQUIRED, [Method(w_var.variable, [])])
+            try:
+                planner.add_constraint(stay)
+                w_var.stay = stay
+            except PlanningError as e:
+                error = self.planning_failed(e)
+        elif not readonly and w_var.stay is not None:
+            stay = w_var.stay
+            w_var.stay = None
+            try:
+                planner.remove_constraint(stay)
+            except PlanningError as e:
+                error = self.planning_failed(e)
+        self.execute(space, planner.take_executed())
+        if error is not None:
+            raise space.error(space.w_RuntimeError, error)
+
+
+class W_DeltaBlueVariable(W_ConstraintMarkerObject):
+    _attrs_ = ["w_solver", "variable", "w_value", "w_proposed", "constraints_w",
+               "edit", "stay", "plan", "plan_version"]
+    _immutable_fields_ = ["w_solver", "variable"]
+    classdef = ClassDef("DeltaBlueVariable", W_ConstraintMarkerObject.classdef)
+
+    def __init__(self, space, w_solver, w_value):
+        W_Object.__init__(self, space)
+        self.w_solver = w_solver
+        self.variable = Variable(self)
+        self.w_value = w_value
+        self.w_proposed = None
+        # enabled constraints on this variable, for their predicates
+        self.constraints_w = []
+        self.edit = None
+        self.stay = None
+        # the plan of the last assignment and the planner version it
+        # is valid for
+        self.plan = None
+        self.plan_version = -1
+
+    classdef.undefine_allocator()
+
+    def edit_constraint(self):
+        if self.edit is None:
+            self.edit = Constraint(REQUIRED, [Method(self.variable, [])], is_input=True)
+        return self.edit
+
+    @classdef.method("<")
+    def method_lt(self, space, w_block):
+        # var <-> { ... } is a formula for var, reading the variables of
+        # the block as its inputs
+        w_block = proc_arg(space, w_block)
+        w_constraint = space.send(
+            space.w_constraint, "new", [self.w_solver.solver_options(space)], w_block
+        )
+        inputs_w = []
+        for w_var in space.listview(space.send(w_constraint, "constraint_variables")):
+            if (isinstance(w_var, W_DeltaBlueVariable) and w_var is not self and
+                    w_var.w_solver is self.w_solver and w_var not in inputs_w):
+                inputs_w.append(w_var)
+        return W_DeltaBlueFormula(space, self, inputs_w, w_block)
+
+    @classdef.method("value")
+    def method_value(self, space):
+        return self.w_value
+
+    @classdef.method("begin_assign")
+    def method_begin_assign(self, space, w_value):
+        self.w_proposed = w_value
+        return self
+
+    @classdef.method("assign")
+    def method_assign(self, space):
+        if self.w_proposed is not None:
+            self.w_solver.assign(space, self)
+        return self
+
+    @classdef.method("end_assign")
+    def method_end_assign(self, space):
+        self.w_proposed = None
+        return self
+
+    @classdef.method("readonly!")
+    def method_readonly(self, space):
+        self.w_solver.set_readonly(space, self, True)
+        return self
+
+    @classdef.method("writable!")
+    def method_writable(self, space):
+        self.w_solver.set_readonly(space, self, False)
+        return self
+
+    @classdef.method("finalize")
+    def method_finalize(self, space):
+        return space.w_nil
+
+    @classdef.method("solver")
+    def method_solver(self, space):
+        return self.w_solver
+
+
+class W_DeltaBlueFormula(W_ConstraintMarkerObject):
+    _attrs_ = ["w_output", "inputs_w", "w_block"]
+    _immutable_fields_ = ["w_output", "inputs_w[*]", "w_block"]
+    classdef = ClassDef("DeltaBlueFormula", W_ConstraintMarkerObject.classdef)
+
+    def __init__(self, space, w_output, inputs_w, w_block):
+        W_Object.__init__(self, space)
+        self.w_output = w_output
+        self.inputs_w = inputs_w
+        self.w_block = w_block
+
+    classdef.undefine_allocator()
+
+    def method(self):
+        return FormulaMethod(
+            self.w_output.variable,
+            [w_var.variable for w_var in self.inputs_w],
+            self.w_block
+        )
+
+    @classdef.method("output")
+    def method_output(self, space):
+        return self.w_output
+
+    @classdef.method("inputs")
+    def method_inputs(self, space):
+        return space.newarray([w_var for w_var in self.inputs_w])
+
+
+class W_DeltaBlueConstraint(W_ConstraintMarkerObject):
+    _attrs_ = ["w_solver", "formulas_w", "w_predicate", "constraint", "enabled"]
+    _immutable_fields_ = ["w_solver", "formulas_w[*]", "w_predicate", "constraint"]
+    classdef = ClassDef("DeltaBlueConstraint", W_ConstraintMarkerObject.classdef)
+
+    def __init__(self, space, w_solver, formulas_w, w_predicate, strength):
+        W_Object.__init__(self, space)
+        self.w_solver = w_solver
+        self.formulas_w = formulas_w
+        self.w_predicate = w_predicate
+        self.constraint = Constraint(
+            strength, [w_formula.method() for w_formula in formulas_w], owner=self
+        )
+        self.enabled = False
+
+    classdef.undefine_allocator()
+
+    def variables_w(self):
+        variables_w = []
+        for w_formula in self.formulas_w:
+            for w_var in w_formula.inputs_w + [w_formula.w_output]:
+                if w_var not in variables_w:
+                    variables_w.append(w_var)
+        return variables_w
+
+    @classdef.method("enable")
+    def method_enable(self, space, w_strength=None):
+        if self.enabled:
+            return space.w_nil
+        if w_strength is not None and w_strength is not space.w_nil:
+            self.constraint.strength = strength_of(space, w_strength)
+        self.w_solver.add_constraint(space, self)
+        return space.w_true
+
+    @classdef.method("disable")
+    def method_disable(self, space):
+        if not self.enabled:
+            return space.w_nil
+        self.w_solver.remove_constraint(space, self)
+        return space.w_true
+
+    @classdef.method("strength")
+    def method_strength(self, space):
+        return space.newsymbol(STRENGTHS[self.constraint.strength])
+
+    @classdef.method("predicate")
+    def method_predicate(self, space):
+        return self.w_predicate or space.w_nil
+
+    @classdef.method("solver")
+    def method_solver(self, space):
+        return self.w_solver
@@ -1,6 +1,7 @@
 import copy
 from rpython.rlib.rerased import new_static_erasing_pair
 
+from topaz.constraintinterpreter import ConstrainedVariable
 from topaz.module import ClassDef, check_frozen
 from topaz.modules.enumerable import Enumerable
 from topaz.objects.objectobject import W_Object
@@ -96,6 +97,9 @@ class W_HashObject(W_Object):
         self.dict_storage = self.strategy.get_empty_storage(space)
         self.w_default = space.w_nil
         self.default_proc = None
+        # constrained variables of entries, keyed like dict_storage and
+        # only allocated once an entry gets constrained
+        self.constraint_items = None
 
     def __deepcopy__(self, memo):
         obj = super(W_HashObject, self).__deepcopy__(memo)
@@ -103,8 +107,93 @@ class W_HashObject(W_Object):
         obj.dict_storage = self.strategy.copy(self.dict_storage)
         obj.w_default = self.w_default
         obj.default_proc = copy.deepcopy(self.default_proc)
+        if self.constraint_items is not None:
+            obj.constraint_items = self.strategy.copy(self.constraint_items)
         return obj
 
+    def find_item(self, space, w_key):
+        try:
+            return self.strategy.getitem(self.dict_storage, w_key)
+        except KeyError:
+            return None
+
+    def store_item(self, space, w_key, w_value):
+        self.strategy.setitem(self.dict_storage, w_key, w_value)
+
+    def find_constraint_on_key(self, space, w_key):
+        if self.constraint_items is None:
+            return None
+        try:
+            c_var = self.strategy.getitem(self.constraint_items, w_key)
+        except KeyError:
+            return None
+        assert isinstance(c_var, ConstrainedVariable)
+        return c_var
+
+    def set_constraint_on_key(self, space, w_key, c_var):
+        if self.constraint_items is None:
+            self.constraint_items = self.strategy.get_empty_storage(space)
+        self.strategy.setitem(self.constraint_items, w_key, c_var)
+
+    def _read_value(self, space, w_key, w_value):
+        # the solver's value of a constrained entry, as #[] returns it
+        if self.constraint_items is not None and space.is_executing_normally():
+            c_var = self.find_constraint_on_key(space, w_key)
+            if c_var is not None:
+                return space.get_value(c_var)
+        return w_value
+
+    def _read_constrained_values(self, space):
+        if self.constraint_items is None:
+            return
+        for w_key in self.strategy.keys(self.constraint_items):
+            self._read_value(space, w_key, None)
+
+    def _frozen_key(self, space, w_key):
+        if (space.is_kind_of(w_key, space.w_string) and
+            not space.is_true(space.send(w_key, "frozen?"))):
+
+            w_key = space.send(w_key, "dup")
+            w_key = space.send(w_key, "freeze")
+        return w_key
+
+    def _remove_constraint_on_key(self, space, w_key, w_value):
+        if self.constraint_items is None:
+            return
+        c_var = self.strategy.pop(self.constraint_items, w_key, None)
+        if c_var is not None:
+            assert isinstance(c_var, ConstrainedVariable)
+            c_var.remove_from_owner(w_value)
+            if not self.strategy.bool(self.constraint_items):
+                self.constraint_items = None
+
+    def _remove_constraints(self, space):
+        # must run before the entries are removed from dict_storage
+        if self.constraint_items is None:
+            return
+        iter = self.strategy.iteritems(self.constraint_items)
+        while True:
+            try:
+                w_key, c_var = self.strategy.iternext(iter)
+            except StopIteration:
+                break
+            assert isinstance(c_var, ConstrainedVariable)
+            c_var.remove_from_owner(self.find_item(space, w_key))
+        self.constraint_items = None
+
+    def _rehash_constraints(self, space, strategy):
+        if self.constraint_items is None:
+            return
+        constraint_items = strategy.get_empty_storage(space)
+        iter = self.strategy.iteritems(self.constraint_items)
+        while True:
+            try:
+                w_key, c_var = self.strategy.iternext(iter)
+            except StopIteration:
+                break
+            strategy.setitem(constraint_items, w_key, c_var)
+        self.constraint_items = constraint_items
+
     @classdef.singleton_method("allocate")
     def method_allocate(self, space):
         return W_HashObject(space, self)
@@ -163,6 +252,7 @@ class W_HashObject(W_Object):
             except StopIteration:
                 break
             strategy.setitem(storage, w_key, w_value)
+        self._rehash_constraints(space, strategy)
         self.strategy = strategy
         self.dict_storage = storage
         return self
@@ -183,11 +273,21 @@ class W_HashObject(W_Object):
             except StopIteration:
                 break
             self.strategy.setitem(storage, w_key, w_value)
+        self._rehash_constraints(space, self.strategy)
         self.dict_storage = storage
         return self
 
     @classdef.method("[]")
     def method_subscript(self, space, w_key):
+        if space.is_constructing_constraint():
+            if self.strategy.contains(self.dict_storage, w_key):
+                c_var = space.newconstraintvariable(w_owner=self, w_key=self._frozen_key(space, w_key))
+                if c_var and c_var.is_solveable(space):
+                    return c_var.get_external_variable(space)
+        elif space.is_executing_normally() and self.constraint_items is not None:
+            c_var = space.newconstraintvariable(w_owner=self, w_key=w_key)
+            if c_var:
+                return space.get_value(c_var)
         try:
             return self.strategy.getitem(self.dict_storage, w_key)
         except KeyError:
@@ -196,7 +296,7 @@ class W_HashObject(W_Object):
     @classdef.method("fetch")
     def method_fetch(self, space, w_key, w_value=None, block=None):
         try:
-            return self.strategy.getitem(self.dict_storage, w_key)
+            return self._read_value(space, w_key, self.strategy.getitem(self.dict_storage, w_key))
         except KeyError:
             if block is not None:
                 return space.invoke_block(block, [w_key])
@@ -209,11 +309,11 @@ class W_HashObject(W_Object):
     @classdef.method("[]=")
     @check_frozen()
     def method_subscript_assign(self, space, w_key, w_value):
-        if (space.is_kind_of(w_key, space.w_string) and
-            not space.is_true(space.send(w_key, "frozen?"))):
-
-            w_key = space.send(w_key, "dup")
-            w_key = space.send(w_key, "freeze")
+        w_key = self._frozen_key(space, w_key)
+        if self.constraint_items is not None:
+            c_var = space.newconstraintvariable(w_owner=self, w_key=w_key)
+            if c_var and space.assign_value(c_var, w_value):
+                return w_value
         self.strategy.setitem(self.dict_storage, w_key, w_value)
         return w_value
 
@@ -229,8 +329,13 @@ class W_HashObject(W_Object):
     @classdef.method("delete")
     @check_frozen()
     def method_delete(self, space, w_key, block):
+        if self.constraint_items is not None:
+            # reading a constrained entry stores the solver's value
+            self._read_value(space, w_key, None)
         w_res = self.strategy.pop(self.dict_storage, w_key, None)
-        if w_res is None:
+        if w_res is not None:
+            self._remove_constraint_on_key(space, w_key, w_res)
+        else:
             if block:
                 return space.invoke_block(block, [w_key])
             w_res = space.w_nil
@@ -239,6 +344,7 @@ class W_HashObject(W_Object):
     @classdef.method("clear")
     @check_frozen()
     def method_clear(self, space):
+        self._remove_constraints(space)
         self.strategy.clear(self.dict_storage)
         return self
 
@@ -247,7 +353,9 @@ class W_HashObject(W_Object):
     def method_shift(self, space):
         if not self.strategy.bool(self.dict_storage):
             return space.send(self, "default", [space.w_nil])
+        self._read_constrained_values(space)
         w_key, w_value = self.strategy.popitem(self.dict_storage)
+        self._remove_constraint_on_key(space, w_key, w_value)
         return space.newarray([w_key, w_value])
 
     @classdef.method("initialize_copy")
@@ -256,6 +364,8 @@ class W_HashObject(W_Object):
     def method_replace(self, space, w_hash):
         w_hash = space.convert_type(w_hash, space.w_hash, "to_hash")
         assert isinstance(w_hash, W_HashObject)
+        w_hash._read_constrained_values(space)
+        self._remove_constraints(space)
         self.strategy = w_hash.strategy
         self.dict_storage = self.strategy.copy(w_hash.dict_storage)
         self.w_default = w_hash.w_default
@@ -268,7 +378,12 @@ class W_HashObject(W_Object):
 
     @classdef.method("values")
     def method_values(self, space):
-        return space.newarray(self.strategy.values(self.dict_storage))
+        if self.constraint_items is None:
+            return space.newarray(self.strategy.values(self.dict_storage))
+        values_w = []
+        for w_key in self.strategy.keys(self.dict_storage):
+            values_w.append(self._read_value(space, w_key, self.strategy.getitem(self.dict_storage, w_key)))
+        return space.newarray(values_w)
 
     @classdef.method("to_hash")
     def method_to_hash(self, space):
@@ -295,6 +410,7 @@ class W_HashIterator(W_Object):
     @classdef.method("initialize")
     def method_initialize(self, w_obj):
         assert isinstance(w_obj, W_HashObject)
+        self.w_hash = w_obj
         self.strategy = w_obj.strategy
         self.iterator = self.strategy.iteritems(w_obj.dict_storage)
         return self
@@ -305,4 +421,4 @@ class W_HashIterator(W_Object):
             w_k, w_v = self.strategy.iternext(self.iterator)
         except StopIteration:
             raise space.error(space.w_StopIteration)
-        return space.newarray([w_k, w_v])
+        return space.newarray([w_k, self.w_hash._read_value(space, w_k, w_v)])
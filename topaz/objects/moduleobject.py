@@ -25,6 +25,8 @@ class AttributeReader(W_FunctionObject):
         return obj
 
     def call(self, space, w_obj, args_w, block):
+        if not space.may_have_constraint_ivars(w_obj):
+            return space.find_instance_var(w_obj, self.varname) or space.w_nil
         c_var = space.newconstraintvariable(w_owner=w_obj, ivar=self.varname)
         if c_var:
             if space.is_constructing_constraint() and c_var.is_solveable(space):
@@ -48,6 +50,9 @@ class AttributeWriter(W_FunctionObject):
 
     def call(self, space, w_obj, args_w, block):
         [w_value] = args_w
+        if not space.may_have_constraint_ivars(w_obj):
+            space.set_instance_var(w_obj, self.varname, w_value)
+            return w_value
         c_var = space.newconstraintvariable(w_owner=w_obj, ivar=self.varname)
         if not c_var or not space.assign_value(c_var, w_value):
             space.set_instance_var(w_obj, self.varname, w_value)
@@ -160,6 +165,7 @@ class W_ModuleObject(W_RootObject):
             method.update_visibility(W_FunctionObject.PRIVATE)
         self.mutated()
         self.methods_w[name] = method
+        space.method_redefined(name)
         if not space.bootstrap:
             if isinstance(method, UndefMethod):
                 self.method_undefined(space, space.newsymbol(name))
@@ -807,6 +813,7 @@ class W_ModuleObject(W_RootObject):
             )
         del self.methods_w[name]
         self.mutated()
+        space.method_redefined(name)
         self.method_removed(space, space.newsymbol(name))
         return self
 
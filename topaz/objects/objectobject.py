@@ -238,7 +238,10 @@ class W_Object(W_RootObject):
             node.write(space, self, space.w_false)
 
     def find_constraint_var(self, space, name):
-        node = jit.promote(self.map).find(mapdict.ConstraintVarNode, name)
+        map = jit.promote(self.map)
+        if not map.has_constraint_vars:
+            return None
+        node = map.find(mapdict.ConstraintVarNode, name)
         if node is None:
             return None
         return node.read(space, self)
@@ -251,7 +254,8 @@ class W_Object(W_RootObject):
 
     def copy_constraint_vars(self, space, w_other):
         assert isinstance(w_other, W_Object)
-        w_other.map.copy_constraint_vars(space, w_other, self)
+        if w_other.map.has_constraint_vars:
+            w_other.map.copy_constraint_vars(space, w_other, self)
 
     def get_constraint(self):
         return self.self_constraint
@@ -6,7 +6,7 @@ class W_ProcObject(W_Object):
     classdef = ClassDef("Proc", W_Object.classdef)
 
     def __init__(self, space, bytecode, w_self, lexical_scope, cells, block,
-                 parent_interp, top_parent_interp, regexp_match_cell,
+                 parent_activation, top_parent_activation, regexp_match_cell,
                  is_lambda):
         W_Object.__init__(self, space)
         self.bytecode = bytecode
@@ -14,8 +14,8 @@ class W_ProcObject(W_Object):
         self.lexical_scope = lexical_scope
         self.cells = cells
         self.block = block
-        self.parent_interp = parent_interp
-        self.top_parent_interp = top_parent_interp
+        self.parent_activation = parent_activation
+        self.top_parent_activation = top_parent_activation
         self.regexp_match_cell = regexp_match_cell
         self.is_lambda = is_lambda
     def copy(self, space, w_self=None, lexical_scope=None, is_lambda=False):
@@ -23,7 +23,7 @@ class W_ProcObject(W_Object):
             space, self.bytecode,
             w_self or self.w_self,
             lexical_scope or self.lexical_scope,
-            self.cells, self.block, self.parent_interp, self.top_parent_interp,
+            self.cells, self.block, self.parent_activation, self.top_parent_activation,
             self.regexp_match_cell,
             is_lambda or self.is_lambda
         )
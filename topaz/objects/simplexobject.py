@@ -0,0 +1,693 @@
+from __future__ import absolute_import
+
+from topaz.coerce import Coerce
+from topaz.constraintinterpreter import SolverRegistry, ConstraintProfile
+from topaz.module import ClassDef
+from topaz.objects.objectobject import W_Object
+from topaz.objects.constraintobject import W_ConstraintMarkerObject
+from topaz.utils.simplex import Tableau, Infeasible, Unbounded, TOLERANCE
+
+
+# Strengths are objective levels of the tableau, compared
+# lexicographically. Required constraints are the phase one objective
+REQUIRED = 0
+STRONG = 1
+MEDIUM = 2
+WEAK = 3
+LEVELS = 4
+NO_EDIT = -1
+
+EQ = 0
+GEQ = 1
+
+
+def strength_level(space, w_strength, default):
+    if w_strength is None or w_strength is space.w_nil:
+        return default
+    name = Coerce.symbol(space, w_strength)
+    if name == "required":
+        return REQUIRED
+    elif name == "strong":
+        return STRONG
+    elif name == "medium":
+        return MEDIUM
+    elif name == "weak":
+        return WEAK
+    raise space.error(space.w_ArgumentError, "unknown strength %s" % name)
+
+
+class W_SimplexObject(W_Object):
+    _attrs_ = ["constraints_w", "added_w", "removed_w", "columns_w",
+               "edit_vars_w", "retuned_w", "suggested_w", "tableau", "dirty",
+               "dead_columns", "rebuilds"]
+    classdef = ClassDef("SimplexSolver", W_Object.classdef)
+
+    def __init__(self, space, klass=None):
+        W_Object.__init__(self, space, klass=klass)
+        # enabled constraints, one tableau row each
+        self.constraints_w = []
+        # constraints whose rows are to be added or removed
+        self.added_w = []
+        self.removed_w = []
+        # variables with a pair of columns in the tableau
+        self.columns_w = []
+        self.edit_vars_w = []
+        # variables whose edit strength changed since the last solve
+        self.retuned_w = []
+        # variables with a suggested value to move their anchor to
+        self.suggested_w = []
+        self.tableau = None
+        # the tableau has to be built again
+        self.dirty = True
+        # barred columns of removed rows, dropped when rebuilding
+        self.dead_columns = 0
+        self.rebuilds = 0
+
+    @classdef.setup_class
+    def setup_class(cls, space, w_cls):
+        space.set_const(w_cls, "Variable", space.getclassfor(W_SimplexVariable))
+        space.set_const(w_cls, "Expression", space.getclassfor(W_SimplexExpression))
+        space.set_const(w_cls, "Constraint", space.getclassfor(W_SimplexConstraint))
+
+    @classdef.singleton_method("allocate")
+    def method_allocate(self, space):
+        return W_SimplexObject(space, self)
+
+    @classdef.method("weight")
+    def method_weight(self, space):
+        return space.newint(200)
+
+    @classdef.method("constraint_variable_for")
+    def method_constraint_variable_for(self, space, w_value):
+        if w_value is space.w_nil:
+            return W_SimplexVariable(space, self, 0.0)
+        elif space.is_kind_of(w_value, space.w_numeric):
+            return W_SimplexVariable(space, self, Coerce.float(space, w_value))
+        return space.w_nil
+
+    @classdef.method("constant")
+    def method_constant(self, space, w_value):
+        return W_SimplexExpression(space, self, [], [], Coerce.float(space, w_value))
+
+    @classdef.method("sum")
+    def method_sum(self, space, w_terms):
+        combination = LinearCombination()
+        for w_term in space.listview(w_terms):
+            combination.add(self.coerce_term(space, w_term), 1.0)
+        return combination.as_expression(space, self)
+
+    def coerce_term(self, space, w_term):
+        if isinstance(w_term, W_SimplexTerm):
+            if w_term.w_solver is not self:
+                raise space.error(space.w_ArgumentError, "term belongs to another SimplexSolver")
+            return w_term.as_expression(space)
+        return W_SimplexExpression(space, self, [], [], Coerce.float(space, w_term))
+
+    def assert_variable(self, space, w_var):
+        if not isinstance(w_var, W_SimplexVariable) or w_var.w_solver is not self:
+            raise space.error(
+                space.w_TypeError,
+                "expected %s, got %s" % (
+                    space.getclassfor(W_SimplexVariable).name,
+                    space.getclass(w_var).name
+                )
+            )
+
+    def assert_constraint(self, space, w_constraint):
+        if not isinstance(w_constraint, W_SimplexConstraint) or w_constraint.w_solver is not self:
+            raise space.error(
+                space.w_TypeError,
+                "expected %s, got %s" % (
+                    space.getclassfor(W_SimplexConstraint).name,
+                    space.getclass(w_constraint).name
+                )
+            )
+
+    def add_constraint(self, w_constraint, level):
+        if w_constraint.marker >= 0 and w_constraint.level != level:
+            # its row has other columns, start over
+            self.dirty = True
+        w_constraint.level = level
+        if w_constraint in self.constraints_w:
+            return
+        self.constraints_w.append(w_constraint)
+        if w_constraint in self.removed_w:
+            self.removed_w.remove(w_constraint)
+        else:
+            self.added_w.append(w_constraint)
+
+    def remove_constraint(self, w_constraint):
+        if w_constraint not in self.constraints_w:
+            return False
+        self.constraints_w.remove(w_constraint)
+        if w_constraint in self.added_w:
+            self.added_w.remove(w_constraint)
+        elif w_constraint.marker >= 0:
+            self.removed_w.append(w_constraint)
+        return True
+
+    def add_edit(self, w_var, level):
+        if w_var.edit_level == NO_EDIT:
+            self.edit_vars_w.append(w_var)
+        if w_var.edit_level != level:
+            w_var.edit_level = level
+            self.retuned_w.append(w_var)
+
+    def remove_edit(self, w_var):
+        if w_var.edit_level != NO_EDIT:
+            self.edit_vars_w.remove(w_var)
+            w_var.edit_level = NO_EDIT
+            self.retuned_w.append(w_var)
+
+    def suggest(self, w_var, value):
+        w_var.target = value
+        if not w_var.suggested:
+            w_var.suggested = True
+            self.suggested_w.append(w_var)
+
+    def set_readonly(self, w_var, readonly):
+        # Read-only variables keep both columns at zero, which pins them
+        # to their anchor without touching the rows
+        if w_var.readonly == readonly:
+            return
+        w_var.readonly = readonly
+        tableau = self.tableau
+        if tableau is None or self.dirty or w_var.column < 0:
+            return
+        for col in [w_var.column, w_var.column + 1]:
+            if not readonly:
+                tableau.unpin(col)
+            elif not tableau.pin(col):
+                self.dirty = True
+
+    @classdef.method("add_constraint")
+    def method_add_constraint(self, space, w_constraint, w_strength=None):
+        self.assert_constraint(space, w_constraint)
+        assert isinstance(w_constraint, W_SimplexConstraint)
+        self.add_constraint(w_constraint, strength_level(space, w_strength, REQUIRED))
+        return w_constraint
+
+    @classdef.method("remove_constraint")
+    def method_remove_constraint(self, space, w_constraint):
+        self.assert_constraint(space, w_constraint)
+        assert isinstance(w_constraint, W_SimplexConstraint)
+        if self.remove_constraint(w_constraint):
+            return w_constraint
+        return space.w_nil
+
+    @classdef.method("rebuild_count")
+    def method_rebuild_count(self, space):
+        return space.newint(self.rebuilds)
+
+    @classdef.method("add_edit_var")
+    def method_add_edit_var(self, space, w_var, w_strength=None):
+        self.assert_variable(space, w_var)
+        assert isinstance(w_var, W_SimplexVariable)
+        level = strength_level(space, w_strength, STRONG)
+        if level == REQUIRED:
+            raise space.error(space.w_ArgumentError, "edit variables cannot be required")
+        self.add_edit(w_var, level)
+        return w_var
+
+    @classdef.method("remove_edit_var")
+    def method_remove_edit_var(self, space, w_var):
+        self.assert_variable(space, w_var)
+        assert isinstance(w_var, W_SimplexVariable)
+        self.remove_edit(w_var)
+        return w_var
+
+    @classdef.method("edit_variables")
+    def method_edit_variables(self, space):
+        return space.newarray([w_var for w_var in self.edit_vars_w])
+
+    @classdef.method("suggest_value")
+    def method_suggest_value(self, space, w_var, w_value):
+        self.assert_variable(space, w_var)
+        assert isinstance(w_var, W_SimplexVariable)
+        self.suggest(w_var, Coerce.float(space, w_value))
+        return w_value
+
+    @classdef.method("begin_edit")
+    def method_begin_edit(self, space):
+        return self
+
+    @classdef.method("end_edit")
+    def method_end_edit(self, space):
+        while self.edit_vars_w:
+            self.remove_edit(self.edit_vars_w[-1])
+        return self
+
+    @classdef.method("resolve")
+    def method_resolve(self, space, w_values=None):
+        if w_values is not None:
+            values_w = space.listview(w_values)
+            if len(values_w) != len(self.edit_vars_w):
+                raise space.error(
+                    space.w_ArgumentError,
+                    "%d values for %d edit variables" % (len(values_w), len(self.edit_vars_w))
+                )
+            for i, w_var in enumerate(self.edit_vars_w):
+                self.suggest(w_var, Coerce.float(space, values_w[i]))
+        return self.method_solve(space)
+
+    @classdef.method("solve")
+    def method_solve(self, space):
+        try:
+            with space.fromcache(ConstraintProfile).solver_event(space, self, "solve"):
+                self.solve()
+        except Infeasible:
+            raise space.error(space.w_RuntimeError, "unsatisfiable constraint system")
+        except Unbounded:
+            raise space.error(space.w_RuntimeError, "unbounded constraint system")
+        space.fromcache(SolverRegistry).solution_changed(self)
+        return space.w_true
+
+    def solve(self):
+        try:
+            if self.dirty or self.tableau is None:
+                self.rebuild()
+            else:
+                self.reoptimize()
+        except (Infeasible, Unbounded):
+            self.tableau = None
+            self.dirty = True
+            raise
+        self.reanchor()
+        if self.dead_columns > self.tableau.ncols / 2:
+            # compact the tableau on the next solve
+            self.dirty = True
+
+    def rebuild(self):
+        for w_var in self.suggested_w:
+            w_var.anchor = w_var.target
+            w_var.suggested = False
+        del self.suggested_w[:]
+        del self.retuned_w[:]
+        for w_var in self.columns_w:
+            w_var.column = -1
+        del self.columns_w[:]
+        for w_constraint in self.removed_w:
+            w_constraint.marker = -1
+        del self.removed_w[:]
+        del self.added_w[:]
+        self.dead_columns = 0
+
+        tableau = Tableau(LEVELS)
+        self.tableau = tableau
+        self.rebuilds += 1
+        for w_constraint in self.constraints_w:
+            self.add_row(tableau, w_constraint)
+        self.settle(tableau, self.constraints_w)
+        self.dirty = False
+
+    def reoptimize(self):
+        tableau = self.tableau
+        for w_constraint in self.removed_w:
+            if not self.remove_row(tableau, w_constraint):
+                self.rebuild()
+                return
+        del self.removed_w[:]
+        if self.added_w:
+            for w_constraint in self.added_w:
+                self.add_row(tableau, w_constraint)
+            self.settle(tableau, self.added_w)
+            del self.added_w[:]
+        # edit strengths only change costs, the basis stays feasible
+        for w_var in self.retuned_w:
+            if w_var.column >= 0 and w_var.applied_level != w_var.edit_level:
+                for col in [w_var.column, w_var.column + 1]:
+                    if w_var.applied_level != NO_EDIT:
+                        tableau.add_cost(w_var.applied_level, col, -1.0)
+                    if w_var.edit_level != NO_EDIT:
+                        tableau.add_cost(w_var.edit_level, col, 1.0)
+                w_var.applied_level = w_var.edit_level
+        del self.retuned_w[:]
+        tableau.optimize()
+        # suggested values only change right hand sides, the basis
+        # stays optimal
+        for w_var in self.suggested_w:
+            if w_var.column >= 0:
+                tableau.shift_rhs(w_var.column, w_var.target - w_var.anchor)
+            w_var.anchor = w_var.target
+            w_var.suggested = False
+        del self.suggested_w[:]
+        tableau.restore_feasibility()
+
+    def add_columns(self, tableau, w_var):
+        # a variable is its anchor plus the first minus the second
+        # column, both cost a weak stay and the edit strength if any
+        w_var.column = tableau.add_column()
+        tableau.add_column()
+        w_var.applied_level = w_var.edit_level
+        self.columns_w.append(w_var)
+        for col in [w_var.column, w_var.column + 1]:
+            tableau.add_cost(WEAK, col, 1.0)
+            if w_var.edit_level != NO_EDIT:
+                tableau.add_cost(w_var.edit_level, col, 1.0)
+            if w_var.readonly:
+                tableau.pin(col)
+
+    def add_row(self, tableau, w_constraint):
+        # The row starts out with an artificial column as its basic
+        # variable, which also marks it for removal later
+        for w_var in w_constraint.expression.variables_w:
+            if w_var.column < 0:
+                self.add_columns(tableau, w_var)
+        r = tableau.add_row()
+        w_constraint.fill_row(tableau, r)
+        tableau.canonicalize(r)
+        if tableau.rhs[r] < 0.0:
+            tableau.negate(r)
+        marker = tableau.add_column()
+        tableau.rows[r][marker] = 1.0
+        tableau.set_basic(r, marker)
+        tableau.add_cost(REQUIRED, marker, 1.0)
+        w_constraint.marker = marker
+
+    def settle(self, tableau, constraints_w):
+        # phase one for the rows just added, their artificial columns
+        # have to reach zero
+        tableau.first_level = REQUIRED
+        tableau.optimize()
+        for w_constraint in constraints_w:
+            if tableau.value(w_constraint.marker) > TOLERANCE:
+                raise Infeasible
+        for w_constraint in constraints_w:
+            tableau.retire(w_constraint.marker)
+        tableau.first_level = STRONG
+        tableau.optimize()
+
+    def remove_row(self, tableau, w_constraint):
+        marker = w_constraint.marker
+        w_constraint.marker = -1
+        tableau.remove_marked_row(marker)
+        # the slack and error columns of the row are unused now
+        for col in range(marker - w_constraint.extra_columns(), marker):
+            if tableau.basic_row[col] >= 0:
+                return False
+            tableau.barred[col] = True
+        self.dead_columns += w_constraint.extra_columns() + 1
+        return True
+
+    def reanchor(self):
+        # Move each anchor to the solution, which zeroes the columns
+        # measured from it. That is the stay on the new value, and
+        # leaves the basis optimal
+        tableau = self.tableau
+        for w_var in self.columns_w:
+            col = w_var.column
+            w_var.anchor += tableau.value(col) - tableau.value(col + 1)
+            for c in [col, col + 1]:
+                row = tableau.basic_row[c]
+                if row >= 0:
+                    tableau.rhs[row] = 0.0
+
+
+class LinearCombination(object):
+    def __init__(self):
+        self.variables_w = []
+        self.coefficients = []
+        self.positions = {}
+        self.constant = 0.0
+
+    def add(self, w_expression, factor):
+        self.constant += factor * w_expression.constant
+        for i, w_var in enumerate(w_expression.variables_w):
+            coefficient = factor * w_expression.coefficients[i]
+            position = self.positions.get(w_var, -1)
+            if position < 0:
+                self.positions[w_var] = len(self.variables_w)
+                self.variables_w.append(w_var)
+                self.coefficients.append(coefficient)
+            else:
+                self.coefficients[position] += coefficient
+
+    def as_expression(self, space, w_solver):
+        variables_w = []
+        coefficients = []
+        for i, w_var in enumerate(self.variables_w):
+            if self.coefficients[i] != 0.0:
+                variables_w.append(w_var)
+                coefficients.append(self.coefficients[i])
+        return W_SimplexExpression(space, w_solver, variables_w, coefficients, self.constant)
+
+
+class W_SimplexTerm(W_ConstraintMarkerObject):
+    _attrs_ = ["w_solver"]
+    _immutable_fields_ = ["w_solver"]
+    classdef = ClassDef("SimplexTerm", W_ConstraintMarkerObject.classdef)
+
+    def __init__(self, space, w_solver):
+        W_Object.__init__(self, space)
+        self.w_solver = w_solver
+
+    classdef.undefine_allocator()
+
+    def as_expression(self, space):
+        raise NotImplementedError
+
+    def evaluate(self):
+        raise NotImplementedError
+
+    def combine(self, space, w_other, factor):
+        combination = LinearCombination()
+        combination.add(self.as_expression(space), 1.0)
+        combination.add(self.w_solver.coerce_term(space, w_other), factor)
+        return combination.as_expression(space, self.w_solver)
+
+    def scale(self, space, w_expression, factor):
+        combination = LinearCombination()
+        combination.add(w_expression, factor)
+        return combination.as_expression(space, self.w_solver)
+
+    def relation(self, space, w_lhs, w_rhs, op, margin=0.0):
+        # lhs >= rhs becomes lhs - rhs >= 0
+        w_expression = w_lhs.combine(space, w_rhs, -1.0)
+        if margin != 0.0:
+            w_expression = W_SimplexExpression(
+                space,
+                self.w_solver,
+                w_expression.variables_w,
+                w_expression.coefficients,
+                w_expression.constant - margin
+            )
+        return W_SimplexConstraint(space, self.w_solver, w_expression, op)
+
+    @classdef.method("+")
+    def method_add(self, space, w_other):
+        return self.combine(space, w_other, 1.0)
+
+    @classdef.method("-")
+    def method_sub(self, space, w_other):
+        return self.combine(space, w_other, -1.0)
+
+    @classdef.method("-@")
+    def method_unary_minus(self, space):
+        return self.scale(space, self.as_expression(space), -1.0)
+
+    @classdef.method("*")
+    def method_mul(self, space, w_other):
+        w_lhs = self.as_expression(space)
+        w_rhs = self.w_solver.coerce_term(space, w_other)
+        if w_rhs.is_constant():
+            return self.scale(space, w_lhs, w_rhs.constant)
+        elif w_lhs.is_constant():
+            return self.scale(space, w_rhs, w_lhs.constant)
+        raise space.error(space.w_RuntimeError, "nonlinear expression")
+
+    @classdef.method("/")
+    def method_div(self, space, w_other):
+        w_rhs = self.w_solver.coerce_term(space, w_other)
+        if not w_rhs.is_constant():
+            raise space.error(space.w_RuntimeError, "nonlinear expression")
+        elif w_rhs.constant == 0.0:
+            raise space.error(space.w_ZeroDivisionError, "divided by 0")
+        return self.scale(space, self.as_expression(space), 1.0 / w_rhs.constant)
+
+    @classdef.method("==")
+    def method_eq(self, space, w_other):
+        return self.relation(space, self, w_other, EQ)
+
+    @classdef.method(">=")
+    def method_ge(self, space, w_other):
+        return self.relation(space, self, w_other, GEQ)
+
+    @classdef.method("<=")
+    def method_le(self, space, w_other):
+        w_lhs = self.w_solver.coerce_term(space, w_other)
+        return self.relation(space, w_lhs, self, GEQ)
+
+    # strict inequalities keep a distance of 1, as in Cassowary
+    @classdef.method(">")
+    def method_gt(self, space, w_other):
+        return self.relation(space, self, w_other, GEQ, 1.0)
+
+    @classdef.method("<")
+    def method_lt(self, space, w_other):
+        w_lhs = self.w_solver.coerce_term(space, w_other)
+        return self.relation(space, w_lhs, self, GEQ, 1.0)
+
+    @classdef.method("value")
+    def method_value(self, space):
+        return space.newfloat(self.evaluate())
+
+    @classdef.method("solver")
+    def method_solver(self, space):
+        return self.w_solver
+
+
+class W_SimplexExpression(W_SimplexTerm):
+    _attrs_ = ["variables_w", "coefficients", "constant"]
+    _immutable_fields_ = ["variables_w[*]", "coefficients[*]", "constant"]
+    classdef = ClassDef("SimplexExpression", W_SimplexTerm.classdef)
+
+    def __init__(self, space, w_solver, variables_w, coefficients, constant):
+        W_SimplexTerm.__init__(self, space, w_solver)
+        self.variables_w = variables_w
+        self.coefficients = coefficients
+        self.constant = constant
+
+    classdef.undefine_allocator()
+
+    def as_expression(self, space):
+        return self
+
+    def is_constant(self):
+        return len(self.variables_w) == 0
+
+    def evaluate(self):
+        value = self.constant
+        for i, w_var in enumerate(self.variables_w):
+            value += self.coefficients[i] * w_var.anchor
+        return value
+
+
+class W_SimplexVariable(W_SimplexTerm):
+    _attrs_ = ["anchor", "readonly", "column", "edit_level", "applied_level",
+               "target", "suggested"]
+    classdef = ClassDef("SimplexVariable", W_SimplexTerm.classdef)
+
+    def __init__(self, space, w_solver, value):
+        W_SimplexTerm.__init__(self, space, w_solver)
+        # the value of the last solve, which the stay keeps it close to
+        self.anchor = value
+        self.readonly = False
+        # first of the two tableau columns, or -1
+        self.column = -1
+        self.edit_level = NO_EDIT
+        # the edit strength the tableau costs reflect
+        self.applied_level = NO_EDIT
+        self.target = 0.0
+        self.suggested = False
+
+    classdef.undefine_allocator()
+
+    def as_expression(self, space):
+        return W_SimplexExpression(space, self.w_solver, [self], [1.0], 0.0)
+
+    def evaluate(self):
+        return self.anchor
+
+    @classdef.method("begin_assign")
+    def method_begin_assign(self, space, w_value):
+        self.w_solver.add_edit(self, STRONG)
+        self.w_solver.suggest(self, Coerce.float(space, w_value))
+        return self
+
+    @classdef.method("assign")
+    def method_assign(self, space):
+        return self.w_solver.method_solve(space)
+
+    @classdef.method("end_assign")
+    def method_end_assign(self, space):
+        self.w_solver.remove_edit(self)
+        return self
+
+    @classdef.method("readonly!")
+    def method_readonly(self, space):
+        self.w_solver.set_readonly(self, True)
+        return self
+
+    @classdef.method("writable!")
+    def method_writable(self, space):
+        self.w_solver.set_readonly(self, False)
+        return self
+
+    @classdef.method("finalize")
+    def method_finalize(self, space):
+        return space.w_nil
+
+
+class W_SimplexConstraint(W_ConstraintMarkerObject):
+    _attrs_ = ["w_solver", "expression", "op", "level", "marker"]
+    _immutable_fields_ = ["w_solver", "expression", "op"]
+    classdef = ClassDef("SimplexConstraint", W_ConstraintMarkerObject.classdef)
+
+    def __init__(self, space, w_solver, expression, op):
+        W_Object.__init__(self, space)
+        self.w_solver = w_solver
+        # expression == 0 or expression >= 0
+        self.expression = expression
+        self.op = op
+        self.level = REQUIRED
+        # the artificial column of its row in the tableau, or -1
+        self.marker = -1
+
+    classdef.undefine_allocator()
+
+    def extra_columns(self):
+        # a slack for inequalities, errors for non-required constraints
+        count = 1 if self.op == GEQ else 0
+        if self.level != REQUIRED:
+            count += 2 if self.op == EQ else 1
+        return count
+
+    def fill_row(self, tableau, r):
+        # Variables are their anchor plus the difference of their
+        # columns
+        row = tableau.rows[r]
+        expression = self.expression
+        rhs = -expression.constant
+        for j, w_var in enumerate(expression.variables_w):
+            coefficient = expression.coefficients[j]
+            rhs -= coefficient * w_var.anchor
+            if w_var.column >= 0:
+                row[w_var.column] += coefficient
+                row[w_var.column + 1] -= coefficient
+        if self.op == GEQ:
+            row[tableau.add_column()] = -1.0
+        if self.level != REQUIRED:
+            col = tableau.add_column()
+            row[col] = 1.0
+            tableau.add_cost(self.level, col, 1.0)
+            if self.op == EQ:
+                col = tableau.add_column()
+                row[col] = -1.0
+                tableau.add_cost(self.level, col, 1.0)
+        tableau.rhs[r] = rhs
+
+    @classdef.method("enable")
+    def method_enable(self, space, w_strength=None):
+        w_solver = self.w_solver
+        w_solver.add_constraint(self, strength_level(space, w_strength, REQUIRED))
+        try:
+            with space.fromcache(ConstraintProfile).solver_event(space, w_solver, "solve"):
+                w_solver.solve()
+        except (Infeasible, Unbounded):
+            w_solver.remove_constraint(self)
+            raise space.error(space.w_RuntimeError, "unsatisfiable constraint system")
+        space.fromcache(SolverRegistry).solution_changed(w_solver)
+        return self
+
+    @classdef.method("disable")
+    def method_disable(self, space):
+        self.w_solver.remove_constraint(self)
+        return self
+
+    @classdef.method("strength")
+    def method_strength(self, space):
+        return space.newsymbol(["required", "strong", "medium", "weak"][self.level])
+
+    @classdef.method("solver")
+    def method_solver(self, space):
+        return self.w_solver
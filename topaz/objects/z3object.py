@@ -2,28 +2,37 @@ from __future__ import absolute_import
 
 from rpython.rlib.rfloat import float_as_rbigint_ratio
 from rpython.rlib.rarithmetic import intmask, r_uint
+from rpython.rlib.rbigint import rbigint
+from rpython.rtyper.lltypesystem import lltype, rffi
 
 from topaz.coerce import Coerce
+from topaz.constraintinterpreter import SolverRegistry, ConstraintProfile
 from topaz.module import ClassDef
 from topaz.objects.objectobject import W_RootObject, W_Object
-from topaz.objects.constraintobject import W_ConstraintMarkerObject
+from topaz.objects.constraintobject import W_ConstraintMarkerObject, W_ConstraintObject
 from topaz.utils import rz3
-from topaz.system import IS_64BIT
 
 
 class Z3Exception(Exception):
     pass
 
 
-if IS_64BIT:
-    MAX_REAL_INT = 2**32 - 1 # hard in Z3
-else:
-    MAX_REAL_INT = intmask(2**31 - 1) # hard in Z3
+# Z3_mk_real takes C ints
+MAX_REAL_INT = intmask(2**31 - 1)
+# entries in each per-context numeral cache before it is flushed
+NUMERAL_CACHE_SIZE = 1024
+# same for the structural expression cache
+EXPRESSION_CACHE_SIZE = 4096
 
 
 class W_Z3Object(W_Object):
-    _attrs_ = ["ctx", "solver", "enabled_constraints", "is_solved", "next_id"]
-    _immutable_fields_ = ["ctx", "solver"]
+    _attrs_ = ["ctx", "solver", "enabled_constraints", "temporary_constraints",
+               "pending_constraints", "needs_reset", "has_scope", "incremental",
+               "epoch", "unsat_core_w", "model", "algebraic_precision",
+               "real_constants", "int_constants", "w_true", "w_false",
+               "expression_cache", "ast_cache", "toggled_constraints", "dirty",
+               "next_id", "owners_w", "from_tactic"]
+    _immutable_fields_ = ["ctx", "solver?"]
     classdef = ClassDef("Z3", W_Object.classdef)
 
     def __init__(self, space, klass=None):
@@ -32,12 +41,54 @@ class W_Z3Object(W_Object):
         rz3.z3_set_param_value(cfg, "MODEL", "true")
         ctx = rz3.z3_mk_context(cfg)
         rz3.z3_del_config(cfg)
+        rz3.z3_ignore_errors(ctx)
         solver = rz3.z3_mk_solver(ctx)
         rz3.z3_solver_inc_ref(ctx, solver)
         self.ctx = ctx
         self.solver = solver
-        self.enabled_constraints = []
-        self.is_solved = False
+        # {W_Z3Ptr: count}, permanent constraints. Hash-consed ASTs may be
+        # enabled by more than one Constraint, hence the count. In
+        # incremental mode each is asserted once as (indicator =>
+        # constraint) at the base level, and the indicators of enabled
+        # constraints are passed as assumptions when solving
+        self.enabled_constraints = {}
+        # {W_Z3Ptr: [W_ConstraintObject]}, the Constraints that enabled a
+        # permanent constraint, to name them when it is in an unsat core
+        self.owners_w = {}
+        # assignment equalities and read-only stays, asserted in a
+        # push/pop scope on top of the permanent constraints
+        self.temporary_constraints = []
+        # permanent constraints whose guard is not asserted yet
+        self.pending_constraints = []
+        self.needs_reset = False
+        self.has_scope = False
+        self.incremental = True
+        # solvers made from tactics do not take assumptions, so they
+        # cannot solve incrementally
+        self.from_tactic = False
+        # bumped on every reset, guards asserted in an older epoch are gone
+        self.epoch = 0
+        self.unsat_core_w = []
+        # model of the last successful solve, referenced until the next one
+        self.model = lltype.nullptr(rz3.Z3_model.TO)
+        # decimal places to which irrational results are approximated
+        self.algebraic_precision = 5
+        # hash-consed numerals, {float: W_Z3Ptr} and {int: W_Z3Ptr}
+        self.real_constants = {}
+        self.int_constants = {}
+        self.w_true = None
+        self.w_false = None
+        # {(operator, W_Z3Ptr, W_Z3Ptr or None): W_Z3Ptr}
+        self.expression_cache = {}
+        # {address: W_Z3Ptr} for n-ary terms. Z3 hash-conses ASTs itself,
+        # so building an equal term again returns the same address
+        self.ast_cache = {}
+        # {W_Z3Ptr: None}, constraints enabled or disabled since the last
+        # solve. A disable followed by an enable cancels out, so that
+        # recalculating an unchanged predicate does not solve again
+        self.toggled_constraints = {}
+        # temporary constraints or the solving mode changed
+        self.dirty = False
         self.next_id = 0
 
     @classdef.setup_class
@@ -60,9 +111,73 @@ class W_Z3Object(W_Object):
 
     @classdef.singleton_method("allocate")
     def method_allocate(self, space):
-        # TODO: context config passing
         return W_Z3Object(space)
 
+    @classdef.method("initialize")
+    def method_initialize(self, space, w_options=None):
+        if w_options is not None:
+            self.method_configure(space, w_options)
+        return self
+
+    def option_str(self, space, w_options, name):
+        w_value = space.send(w_options, "[]", [space.newsymbol(name)])
+        if w_value is space.w_nil:
+            return None
+        return space.str_w(space.send(w_value, "to_s"))
+
+    @classdef.method("configure")
+    def method_configure(self, space, w_options):
+        # only the solver is replaced, variables and terms made so far
+        # belong to the context and stay valid
+        if self.enabled_constraints or self.temporary_constraints or self.model:
+            raise space.error(space.w_RuntimeError, "cannot configure Z3 after it was used")
+        logic = self.option_str(space, w_options, "logic")
+        tactic = self.option_str(space, w_options, "tactic")
+        w_timeout = space.send(w_options, "[]", [space.newsymbol("timeout_ms")])
+        timeout = -1
+        if w_timeout is not space.w_nil:
+            timeout = Coerce.int(space, w_timeout)
+            if timeout < 0:
+                raise space.error(space.w_ArgumentError, "negative timeout")
+
+        if tactic is not None:
+            z3_tactic = rz3.z3_mk_tactic(self.ctx, tactic)
+            if rz3.z3_get_error_code(self.ctx) != 0:
+                raise space.error(space.w_ArgumentError, "unknown Z3 tactic %s" % tactic)
+            rz3.z3_tactic_inc_ref(self.ctx, z3_tactic)
+            solver = rz3.z3_mk_solver_from_tactic(self.ctx, z3_tactic)
+            rz3.z3_tactic_dec_ref(self.ctx, z3_tactic)
+        elif logic is not None:
+            symbol = rz3.z3_mk_string_symbol(self.ctx, logic)
+            solver = rz3.z3_mk_solver_for_logic(self.ctx, symbol)
+            if rz3.z3_get_error_code(self.ctx) != 0:
+                raise space.error(space.w_ArgumentError, "unknown Z3 logic %s" % logic)
+        else:
+            solver = rz3.z3_mk_solver(self.ctx)
+        rz3.z3_solver_inc_ref(self.ctx, solver)
+
+        if timeout >= 0:
+            params = rz3.z3_mk_params(self.ctx)
+            rz3.z3_params_inc_ref(self.ctx, params)
+            rz3.z3_params_set_uint(
+                self.ctx,
+                params,
+                rz3.z3_mk_string_symbol(self.ctx, "timeout"),
+                rffi.cast(rffi.UINT, timeout)
+            )
+            rz3.z3_solver_set_params(self.ctx, solver, params)
+            rz3.z3_params_dec_ref(self.ctx, params)
+
+        rz3.z3_solver_dec_ref(self.ctx, self.solver)
+        self.solver = solver
+        self.from_tactic = tactic is not None
+        if self.from_tactic:
+            self.incremental = False
+        self.has_scope = False
+        self.needs_reset = True
+        self.dirty = True
+        return self
+
     @classdef.method("make_real_variable")
     def make_real_variable(self, space, w_value):
         space.convert_type(w_value, space.w_float, "to_f") # Just for the error raising
@@ -72,27 +187,40 @@ class W_Z3Object(W_Object):
     @classdef.method("make_real")
     def make_real(self, space, w_value):
         value = Coerce.float(space, w_value)
+        try:
+            return self.real_constants[value]
+        except KeyError:
+            pass
         try:
             num, den = float_as_rbigint_ratio(value)
-        except OverflowError, ValueError:
+        except (OverflowError, ValueError):
             raise space.error(
                 space.w_ArgumentError,
                 "cannot rationalize %s" % space.str_w(
                     space.send(w_value, "inspect")
                 )
             )
+        int_num = int_den = 0
+        fits = False
         try:
             int_num = num.toint()
             int_den = den.toint()
+            fits = -MAX_REAL_INT <= int_num <= MAX_REAL_INT and int_den <= MAX_REAL_INT
         except OverflowError:
-            int_num = 1
-            int_den = 1
-
-        while int_num > MAX_REAL_INT or int_den > MAX_REAL_INT:
-            int_num = int_num >> 2
-            int_den = int_den >> 2
-
-        return W_Z3Ptr(space, self, rz3.z3_mk_real(self.ctx, int_num, int_den))
+            pass
+        if fits:
+            ast = rz3.z3_mk_real(self.ctx, int_num, int_den)
+        else:
+            ast = rz3.z3_mk_numeral(
+                self.ctx,
+                "%s/%s" % (num.str(), den.str()),
+                rz3.z3_mk_real_sort(self.ctx)
+            )
+        w_real = W_Z3Ptr(space, self, ast)
+        if len(self.real_constants) >= NUMERAL_CACHE_SIZE:
+            self.real_constants.clear()
+        self.real_constants[value] = w_real
+        return w_real
 
     @classdef.method("make_int_variable")
     def make_real_variable(self, space, w_value):
@@ -103,8 +231,16 @@ class W_Z3Object(W_Object):
     @classdef.method("make_int")
     def make_real(self, space, w_value):
         value = space.int_w(space.convert_type(w_value, space.w_fixnum, "to_int"))
+        try:
+            return self.int_constants[value]
+        except KeyError:
+            pass
         ty = rz3.z3_mk_int_sort(self.ctx)
-        return W_Z3Ptr(space, self, rz3.z3_mk_int(self.ctx, value, ty))
+        w_int = W_Z3Ptr(space, self, rz3.z3_mk_int64(self.ctx, value, ty))
+        if len(self.int_constants) >= NUMERAL_CACHE_SIZE:
+            self.int_constants.clear()
+        self.int_constants[value] = w_int
+        return w_int
 
     @classdef.method("make_bool_variable")
     def make_bool_variable(self, space, w_value):
@@ -116,78 +252,337 @@ class W_Z3Object(W_Object):
     @classdef.method("make_bool", value="bool")
     def make_bool(self, space, value):
         if value:
-            return W_Z3Ptr(space, self, rz3.z3_mk_true(self.ctx))
+            if self.w_true is None:
+                self.w_true = W_Z3Ptr(space, self, rz3.z3_mk_true(self.ctx))
+            return self.w_true
         else:
-            return W_Z3Ptr(space, self, rz3.z3_mk_false(self.ctx))
+            if self.w_false is None:
+                self.w_false = W_Z3Ptr(space, self, rz3.z3_mk_false(self.ctx))
+            return self.w_false
+
+    def cached_expression(self, key):
+        return self.expression_cache.get(key, None)
+
+    def cache_expression(self, key, w_expression):
+        if len(self.expression_cache) >= EXPRESSION_CACHE_SIZE:
+            self.expression_cache.clear()
+        self.expression_cache[key] = w_expression
+
+    def wrap_ast(self, space, ast):
+        key = rffi.cast(lltype.Signed, ast)
+        w_res = self.ast_cache.get(key, None)
+        if w_res is None:
+            w_res = W_Z3Ptr(space, self, ast)
+            if len(self.ast_cache) >= EXPRESSION_CACHE_SIZE:
+                self.ast_cache.clear()
+            self.ast_cache[key] = w_res
+        return w_res
+
+    def coerce_arg(self, space, w_arg):
+        w_z3ptr_cls = space.getclassfor(W_Z3Ptr)
+        if not space.is_kind_of(w_arg, w_z3ptr_cls):
+            if w_arg in [space.w_true, space.w_false, space.w_nil]:
+                w_other = space.send(self, "make_bool", [w_arg])
+            elif space.is_kind_of(w_arg, space.w_fixnum):
+                w_other = space.send(self, "make_int", [w_arg])
+            else:
+                w_other = space.send(self, "make_real", [w_arg])
+        else:
+            w_other = w_arg
+
+        if not space.is_kind_of(w_other, w_z3ptr_cls):
+            raise space.error(space.w_TypeError, "%s can't be coerced into %s::%s" % (
+                    space.getclass(w_arg).name,
+                    space.w_z3.name,
+                    w_z3ptr_cls.name
+            ))
+        else:
+            assert isinstance(w_other, W_Z3Ptr)
+            return w_other
+
+    def new_naryop(classdef, name, func, neutral):
+        @classdef.method(name)
+        def method(self, space, w_terms):
+            terms_w = space.listview(w_terms)
+            if not terms_w:
+                return neutral(self, space)
+            elif len(terms_w) == 1:
+                return self.coerce_arg(space, terms_w[0])
+            asts = [self.coerce_arg(space, w_term).pointer for w_term in terms_w]
+            return self.wrap_ast(space, func(self.ctx, asts))
+        method.__name__ = "method_%s" % func.__name__
+        return method
+    method_sum = new_naryop(classdef, "sum", rz3.z3_mk_add_n,
+                            lambda self, space: space.send(self, "make_int", [space.newint(0)]))
+    method_and = new_naryop(classdef, "and", rz3.z3_mk_and_n,
+                            lambda self, space: self.make_bool(space, True))
+    method_product = new_naryop(classdef, "product", rz3.z3_mk_mul_n,
+                                lambda self, space: space.send(self, "make_int", [space.newint(1)]))
+    method_or = new_naryop(classdef, "or", rz3.z3_mk_or_n,
+                           lambda self, space: self.make_bool(space, False))
+
+    @classdef.method("distinct")
+    def method_distinct(self, space, w_terms):
+        terms_w = space.listview(w_terms)
+        if len(terms_w) < 2:
+            return self.make_bool(space, True)
+        asts = [self.coerce_arg(space, w_term).pointer for w_term in terms_w]
+        return self.wrap_ast(space, rz3.z3_mk_distinct(self.ctx, asts))
+
+    def toggle(self, w_constraint):
+        if w_constraint in self.toggled_constraints:
+            del self.toggled_constraints[w_constraint]
+        else:
+            self.toggled_constraints[w_constraint] = None
 
     @classdef.method("add_constraint")
     def method_add_constraint(self, space, w_other):
         self.assert_ptr(space, w_other)
+        assert isinstance(w_other, W_Z3Ptr)
         # print rz3.z3_ast_to_string(self.ctx, w_other.pointer)
-        self.enabled_constraints.append(w_other)
+        count = self.enabled_constraints.get(w_other, 0)
+        self.enabled_constraints[w_other] = count + 1
+        w_owner = space.fromcache(SolverRegistry).enabling_constraint()
+        if w_owner is not None:
+            self.owners_w.setdefault(w_other, []).append(w_owner)
+        if count == 0:
+            self.toggle(w_other)
+            if w_other.guard_epoch != self.epoch:
+                self.pending_constraints.append(w_other)
         return w_other
 
     @classdef.method("remove_constraint")
     def method_remove_constraint(self, space, w_other):
+        self.assert_ptr(space, w_other)
+        assert isinstance(w_other, W_Z3Ptr)
+        count = self.enabled_constraints.get(w_other, 0)
+        if count == 0:
+            return space.w_nil
+        owners_w = self.owners_w.get(w_other, None)
+        if owners_w is not None:
+            w_owner = space.fromcache(SolverRegistry).enabling_constraint()
+            if w_owner in owners_w:
+                owners_w.remove(w_owner)
+            if not owners_w:
+                del self.owners_w[w_other]
+        if count == 1:
+            del self.enabled_constraints[w_other]
+            self.toggle(w_other)
+        else:
+            self.enabled_constraints[w_other] = count - 1
+        return w_other
+
+    @classdef.method("add_temporary_constraint")
+    def method_add_temporary_constraint(self, space, w_other):
+        self.assert_ptr(space, w_other)
+        self.temporary_constraints.append(w_other)
+        self.dirty = True
+        return w_other
+
+    @classdef.method("remove_temporary_constraint")
+    def method_remove_temporary_constraint(self, space, w_other):
         self.assert_ptr(space, w_other)
         try:
-            self.enabled_constraints.remove(w_other)
+            self.temporary_constraints.remove(w_other)
+            self.dirty = True
             return w_other
         except ValueError:
             return space.w_nil
 
-    @classdef.method("solve")
-    def method_solve(self, space):
-        self.is_solved = False
-        rz3.z3_solver_reset(self.ctx, self.solver)
-        for constraint in self.enabled_constraints:
+    @classdef.method("incremental")
+    def method_incremental(self, space):
+        return space.newbool(self.incremental)
+
+    @classdef.method("incremental=", value="bool")
+    def method_set_incremental(self, space, value):
+        if value and self.from_tactic:
+            raise space.error(space.w_RuntimeError, "cannot solve incrementally with a solver made from a tactic")
+        if value != self.incremental:
+            self.incremental = value
+            self.needs_reset = True
+            self.dirty = True
+        return space.newbool(value)
+
+    @classdef.method("algebraic_precision")
+    def method_algebraic_precision(self, space):
+        return space.newint(self.algebraic_precision)
+
+    @classdef.method("algebraic_precision=", precision="int")
+    def method_set_algebraic_precision(self, space, precision):
+        if precision < 0:
+            raise space.error(space.w_ArgumentError, "negative precision")
+        self.algebraic_precision = precision
+        return space.newint(precision)
+
+    @classdef.method("unsat_core")
+    def method_unsat_core(self, space):
+        return space.newarray(self.unsat_core_w[:])
+
+    def assert_all(self, constraints_w):
+        for constraint in constraints_w:
             assert isinstance(constraint, W_Z3Ptr)
             # print rz3.z3_ast_to_string(self.ctx, constraint.pointer)
             rz3.z3_solver_assert(self.ctx, self.solver, constraint.pointer)
-        solve_result = rz3.z3_solver_check(self.ctx, self.solver)
+
+    def assert_guard(self, w_constraint):
+        if not w_constraint.indicator:
+            indicator = rz3.z3_mk_fresh_const(self.ctx, "enabled", rz3.z3_mk_bool_sort(self.ctx))
+            rz3.z3_ast_inc_ref(self.ctx, indicator)
+            w_constraint.indicator = indicator
+        rz3.z3_solver_assert(
+            self.ctx,
+            self.solver,
+            rz3.z3_mk_implies(self.ctx, w_constraint.indicator, w_constraint.pointer)
+        )
+        w_constraint.guard_epoch = self.epoch
+
+    def reset(self):
+        rz3.z3_solver_reset(self.ctx, self.solver)
+        self.epoch += 1
+        self.has_scope = False
+        self.needs_reset = False
+        del self.pending_constraints[:]
+
+    def prepare_incremental(self):
+        # The temporary scope is kept open after solving so the model
+        # stays valid for reading, pop it before touching the base level
+        if self.has_scope:
+            rz3.z3_solver_pop(self.ctx, self.solver, 1)
+            self.has_scope = False
+        if self.needs_reset:
+            self.reset()
+            for w_constraint in self.enabled_constraints:
+                self.assert_guard(w_constraint)
+        else:
+            for w_constraint in self.pending_constraints:
+                if w_constraint.guard_epoch != self.epoch:
+                    self.assert_guard(w_constraint)
+            del self.pending_constraints[:]
+        if self.temporary_constraints:
+            rz3.z3_solver_push(self.ctx, self.solver)
+            self.has_scope = True
+            self.assert_all(self.temporary_constraints)
+
+    def check_incremental(self):
+        self.prepare_incremental()
+        assumptions = []
+        for w_constraint in self.enabled_constraints:
+            assumptions.append(w_constraint.indicator)
+        solve_result = rz3.z3_solver_check_assumptions(self.ctx, self.solver, assumptions)
         if solve_result < 0:
-            raise space.error(space.w_RuntimeError, "unsatisfiable constraint system")
+            self.collect_unsat_core()
+        return solve_result
+
+    def check_reset(self):
+        self.reset()
+        self.assert_all(self.enabled_constraints.keys())
+        self.assert_all(self.temporary_constraints)
+        # the guards are gone, the next incremental solve has to start over
+        self.needs_reset = True
+        return rz3.z3_solver_check(self.ctx, self.solver)
+
+    def collect_unsat_core(self):
+        del self.unsat_core_w[:]
+        for indicator in rz3.z3_solver_get_unsat_core(self.ctx, self.solver):
+            for w_constraint in self.enabled_constraints:
+                if w_constraint.indicator == indicator:
+                    owners_w = self.owners_w.get(w_constraint, None)
+                    if owners_w is None:
+                        owners_w = [w_constraint]
+                    for w_owner in owners_w:
+                        if w_owner not in self.unsat_core_w:
+                            self.unsat_core_w.append(w_owner)
+
+    def unsat_message(self, space):
+        if not self.unsat_core_w:
+            return "unsatisfiable constraint system"
+        conflicts = []
+        for w_owner in self.unsat_core_w:
+            if isinstance(w_owner, W_ConstraintObject):
+                conflicts.append("%s at %s" % (space.any_to_s(w_owner), w_owner.source_location()))
+            else:
+                conflicts.append(space.any_to_s(w_owner))
+        return "unsatisfiable constraint system, conflicting constraints: %s" % ", ".join(conflicts)
+
+    def drop_model(self):
+        if self.model:
+            rz3.z3_model_dec_ref(self.ctx, self.model)
+            self.model = lltype.nullptr(rz3.Z3_model.TO)
+
+    @classdef.method("solve")
+    def method_solve(self, space):
+        if self.model and not self.dirty and not self.toggled_constraints:
+            # nothing changed since the last solve, the model still holds
+            return space.w_true
+        self.drop_model()
+        del self.unsat_core_w[:]
+        with space.fromcache(ConstraintProfile).solver_event(space, self, "solve"):
+            if self.incremental:
+                solve_result = self.check_incremental()
+            else:
+                solve_result = self.check_reset()
+        if solve_result < 0:
+            raise space.error(space.w_RuntimeError, self.unsat_message(space))
         elif solve_result == 0:
             raise space.error(space.w_RuntimeError, "Z3 cannot solve this constraint system")
-        self.is_solved = True
+        model = rz3.z3_solver_get_model(self.ctx, self.solver)
+        rz3.z3_model_inc_ref(self.ctx, model)
+        self.model = model
+        self.toggled_constraints.clear()
+        self.dirty = False
+        space.fromcache(SolverRegistry).solution_changed(self)
         return space.w_true
 
     @classdef.method("[]")
     def method_get_interpretation(self, space, w_ast):
         self.assert_ptr(space, w_ast)
-        if not self.is_solved:
+        assert isinstance(w_ast, W_Z3Ptr)
+        if not self.model:
             return space.w_nil
         else:
-            model = rz3.z3_solver_get_model(self.ctx, self.solver)
+            return self.get_interpretation(space, w_ast)
+
+    @classdef.method("values_for")
+    def method_values_for(self, space, w_ary):
+        asts_w = space.listview(w_ary)
+        for w_ast in asts_w:
+            self.assert_ptr(space, w_ast)
+        if not self.model:
+            return space.newarray([space.w_nil] * len(asts_w))
+        values_w = [None] * len(asts_w)
+        for i, w_ast in enumerate(asts_w):
+            assert isinstance(w_ast, W_Z3Ptr)
+            values_w[i] = self.get_interpretation(space, w_ast)
+        return space.newarray(values_w)
+
+    def get_interpretation(self, space, w_ast):
+        try:
+            decl = w_ast.getdecl(self.ctx)
+        except Z3Exception:
+            return space.w_nil
+        if rz3.z3_model_has_interp(self.ctx, self.model, decl) == 0:
+            return space.w_nil
+        interp_ast = rz3.z3_model_get_const_interp(self.ctx, self.model, decl)
+        kind = rz3.z3_get_ast_kind(self.ctx, interp_ast)
+        if kind == 0: # Z3_NUMERAL_AST
             try:
-                decl = w_ast.getdecl(self.ctx)
-            except Z3Exception:
-                return space.w_nil
-            if rz3.z3_model_has_interp(self.ctx, model, decl) == 0:
-                return space.w_nil
-            interp_ast = rz3.z3_model_get_const_interp(self.ctx, model, decl)
-            kind = rz3.z3_get_ast_kind(self.ctx, interp_ast)
-            if kind == 0: # Z3_NUMERAL_AST
-                try:
-                    return space.newint(rz3.z3_get_numeral_int(self.ctx, interp_ast))
-                except rz3.Z3Error:
-                    return self.get_rounded_real(space, interp_ast)
-            elif kind == 1: # Z3_APP_AST ... XXX: bools, in our case
-                if rz3.z3_is_algebraic_number(self.ctx, interp_ast) == 1:
-                    # XXX TODO: number, but doesn't fit into real??
-                    # XXX: TODO: find a good precision
-                    return self.get_rounded_real(space, interp_ast, precision=5)
-                else:
-                    result = rz3.z3_get_bool_value(self.ctx, interp_ast)
-                    if result == -1:
-                        return space.w_false
-                    elif result == 1:
-                        return space.w_true
-                    else:
-                        strresult = rz3.z3_ast_to_string(self.ctx, interp_ast)
-                        return space.newfloat(self.parse_and_execute(strresult))
+                return space.newint_or_bigint(rz3.z3_get_numeral_int64(self.ctx, interp_ast))
+            except rz3.Z3Error:
+                return self.get_rounded_real(space, interp_ast)
+        elif kind == 1: # Z3_APP_AST ... XXX: bools, in our case
+            if rz3.z3_is_algebraic_number(self.ctx, interp_ast) == 1:
+                return self.get_rounded_real(space, interp_ast, algebraic=True)
             else:
-                raise NotImplementedError("Ast type %d" % kind)
+                result = rz3.z3_get_bool_value(self.ctx, interp_ast)
+                if result == -1:
+                    return space.w_false
+                elif result == 1:
+                    return space.w_true
+                else:
+                    strresult = rz3.z3_ast_to_string(self.ctx, interp_ast)
+                    return space.newfloat(self.parse_and_execute(strresult))
+        else:
+            raise NotImplementedError("Ast type %d" % kind)
 
     def parse_and_execute(self, sexp):
         sexp = sexp.strip()
@@ -270,24 +665,35 @@ class W_Z3Object(W_Object):
         else:
              return float(arg)
 
-    def get_rounded_real(self, space, interp_ast, precision=-1):
-        # TODO: figure out if we can do this more efficiently
-        # if precision == -1:
-        #     try:
-        #         return space.newfloat(rz3.z3_get_numeral_real(self.ctx, interp_ast))
-        #     except rz3.Z3Error:
-        #         precision = 10
-
-        # try:
-        #     real_ast = rz3.z3_get_algebraic_number_upper(self.ctx, interp_ast, precision)
-        #     return space.newfloat(rz3.z3_get_numeral_real(self.ctx, real_ast))
-        # except rz3.Z3Error:
-        strresult = rz3.z3_ast_to_string(self.ctx, interp_ast)
-        return space.newfloat(self.parse_and_execute(strresult))
+    def get_rounded_real(self, space, interp_ast, algebraic=False):
+        try:
+            if algebraic:
+                lower = rz3.z3_get_algebraic_number_lower(self.ctx, interp_ast, self.algebraic_precision)
+                upper = rz3.z3_get_algebraic_number_upper(self.ctx, interp_ast, self.algebraic_precision)
+                value = (self.rational_to_float(lower) + self.rational_to_float(upper)) / 2.0
+            else:
+                value = self.rational_to_float(interp_ast)
+        except (rz3.Z3Error, OverflowError):
+            # last resort, let Z3 print the number and evaluate that
+            strresult = rz3.z3_ast_to_string(self.ctx, interp_ast)
+            value = self.parse_and_execute(strresult)
+        return space.newfloat(value)
+
+    def rational_to_float(self, rational_ast):
+        num_ast = rz3.z3_get_numerator(self.ctx, rational_ast)
+        den_ast = rz3.z3_get_denominator(self.ctx, rational_ast)
+        try:
+            num = rz3.z3_get_numeral_int64(self.ctx, num_ast)
+            den = rz3.z3_get_numeral_int64(self.ctx, den_ast)
+            return float(num) / float(den)
+        except rz3.Z3Error:
+            big_num = rbigint.fromdecimalstr(rz3.z3_get_numeral_string(self.ctx, num_ast))
+            big_den = rbigint.fromdecimalstr(rz3.z3_get_numeral_string(self.ctx, den_ast))
+            return big_num.truediv(big_den)
 
 
 class W_Z3Ptr(W_ConstraintMarkerObject):
-    _attrs_ = ["w_z3", "pointer", "w_value"]
+    _attrs_ = ["w_z3", "pointer", "w_value", "indicator", "guard_epoch"]
     _immutable_fields_ = ["w_z3", "pointer"]
     classdef = ClassDef("Z3Pointer", W_ConstraintMarkerObject.classdef)
 
@@ -296,10 +702,15 @@ class W_Z3Ptr(W_ConstraintMarkerObject):
         self.w_z3 = w_z3
         self.pointer = pointer
         self.w_value = w_value
+        # boolean literal guarding this AST when it is used as a constraint
+        self.indicator = lltype.nullptr(rz3.Z3_ast.TO)
+        self.guard_epoch = -1
         rz3.z3_ast_inc_ref(self.w_z3.ctx, self.pointer)
 
     def __del__(self):
         rz3.z3_ast_dec_ref(self.w_z3.ctx, self.pointer)
+        if self.indicator:
+            rz3.z3_ast_dec_ref(self.w_z3.ctx, self.indicator)
 
     def getsingletonclass(self, space):
         raise space.error(space.w_TypeError, "can't define singleton")
@@ -314,33 +725,21 @@ class W_Z3Ptr(W_ConstraintMarkerObject):
     classdef.undefine_allocator()
 
     def coerce_constant_arg(self, space, w_arg):
-        w_z3ptr_cls = space.getclassfor(W_Z3Ptr)
-        if not space.is_kind_of(w_arg, w_z3ptr_cls):
-            if w_arg in [space.w_true, space.w_false, space.w_nil]:
-                w_other = space.send(self.w_z3, "make_bool", [w_arg])
-            elif space.is_kind_of(w_arg, space.w_fixnum):
-                w_other = space.send(self.w_z3, "make_int", [w_arg])
-            else:
-                w_other = space.send(self.w_z3, "make_real", [w_arg])
-        else:
-            w_other = w_arg
-
-        if not space.is_kind_of(w_other, w_z3ptr_cls):
-            raise space.error(space.w_TypeError, "%s can't be coerced into %s::%s" % (
-                    space.getclass(w_arg).name,
-                    space.w_z3.name,
-                    w_z3ptr_cls.name
-            ))
-        else:
-            assert isinstance(w_other, W_Z3Ptr)
-            return w_other.pointer
+        return self.w_z3.coerce_arg(space, w_arg)
 
     def new_binop(classdef, name, func):
         @classdef.method(name)
         def method(self, space, w_other):
-            other = self.coerce_constant_arg(space, w_other)
-            ast = func(self.w_z3.ctx, self.pointer, other)
-            return W_Z3Ptr(space, self.w_z3, ast)
+            w_rhs = self.coerce_constant_arg(space, w_other)
+            # operands are hash-consed too, so re-running an unchanged
+            # predicate yields the very same W_Z3Ptr
+            key = (name, self, w_rhs)
+            w_res = self.w_z3.cached_expression(key)
+            if w_res is None:
+                ast = func(self.w_z3.ctx, self.pointer, w_rhs.pointer)
+                w_res = W_Z3Ptr(space, self.w_z3, ast)
+                self.w_z3.cache_expression(key, w_res)
+            return w_res
         method.__name__ = "method_%s" % func.__name__
         return method
     method_lt = new_binop(classdef, "<", rz3.z3_mk_lt)
@@ -426,14 +825,23 @@ class W_Z3Ptr(W_ConstraintMarkerObject):
         if not w_constraint:
             raise space.error(space.w_RuntimeError)
         else:
-            asts_w = [self.coerce_constant_arg(space, w_arg) for w_arg in args_w]
+            asts_w = [self.coerce_constant_arg(space, w_arg).pointer for w_arg in args_w]
             asts_w.append(self.pointer)
             return W_Z3Ptr(space, self.w_z3, rz3.z3_mk_distinct(self.w_z3.ctx, asts_w))
 
+    @classdef.method("solver")
+    def method_solver(self, space):
+        return self.w_z3
+
     @classdef.method("-@")
     def method_unary_minus(self, space):
-        ast = rz3.z3_mk_unary_minus(self.w_z3.ctx, self.pointer)
-        return W_Z3Ptr(space, self.w_z3, ast)
+        key = ("-@", self, None)
+        w_res = self.w_z3.cached_expression(key)
+        if w_res is None:
+            ast = rz3.z3_mk_unary_minus(self.w_z3.ctx, self.pointer)
+            w_res = W_Z3Ptr(space, self.w_z3, ast)
+            self.w_z3.cache_expression(key, w_res)
+        return w_res
 
     @classdef.method("enable")
     def method_enable(self, space):
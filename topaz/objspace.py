@@ -19,7 +19,7 @@ from topaz import system
 from topaz.astcompiler import CompilerContext, SymbolTable
 from topaz.celldict import GlobalsDict
 from topaz.closure import ClosureCell
-from topaz.constraintinterpreter import ConstraintInterpreter, ConstrainedVariable
+from topaz.constraintinterpreter import ConstraintInterpreter, ConstrainedVariable, SolverRegistry
 from topaz.error import RubyError, print_traceback
 from topaz.executioncontext import ExecutionContext, ExecutionContextHolder
 from topaz.frame import Frame
@@ -45,6 +45,8 @@ from topaz.objects.codeobject import W_CodeObject
 
 from topaz.objects.constraintobject import W_ConstraintObject, W_ConstraintMarkerObject, W_IdentityConstraintObject
 from topaz.objects.z3object import W_Z3Object
+from topaz.objects.simplexobject import W_SimplexObject
+from topaz.objects.deltablueobject import W_DeltaBlueObject
 
 from topaz.objects.dirobject import W_DirObject
 from topaz.objects.encodingobject import W_EncodingObject
@@ -102,6 +104,10 @@ class ObjectSpace(object):
         self.exit_handlers_w = []
 
         self._executionmodes = ExecutionModeHolder(NormalExecution())
+        # interpreters keep no state of their own, so one of each is
+        # enough for all frames
+        self.interpreter = Interpreter()
+        self.constraint_interpreter = ConstraintInterpreter()
         self.constraint_stack = []
         self.remembered_assignments = RememberedAssignmentsHolder()
 
@@ -191,6 +197,8 @@ class ObjectSpace(object):
             self.w_constraint,
             self.w_constraintobject,
             self.w_z3,
+            self.getclassfor(W_SimplexObject),
+            self.getclassfor(W_DeltaBlueObject),
 
             self.getclassfor(W_NilObject),
             self.getclassfor(W_TrueObject),
@@ -347,7 +355,7 @@ class ObjectSpace(object):
         return ec
 
     def create_frame(self, bc, w_self=None, lexical_scope=None, block=None,
-                     parent_interp=None, top_parent_interp=None,
+                     parent_activation=None, top_parent_activation=None,
                      regexp_match_cell=None):
 
         if w_self is None:
@@ -355,15 +363,16 @@ class ObjectSpace(object):
         if regexp_match_cell is None:
             regexp_match_cell = ClosureCell(None)
         return Frame(
-            jit.promote(bc), w_self, lexical_scope, block, parent_interp,
-            top_parent_interp, regexp_match_cell
+            jit.promote(bc), w_self, lexical_scope, block, parent_activation,
+            top_parent_activation, regexp_match_cell
         )
 
     def execute_frame(self, frame, bc):
         if self.is_constructing_constraint():
-            return ConstraintInterpreter().interpret(self, frame, bc)
+            interpreter = self.constraint_interpreter
         else:
-            return Interpreter().interpret(self, frame, bc)
+            interpreter = self.interpreter
+        return jit.promote(interpreter).interpret(self, frame, bc)
 
     # Methods for allocating new objects.
 
@@ -463,11 +472,11 @@ class ObjectSpace(object):
             return W_UnboundMethodObject(self, w_cls, w_function)
 
     def newproc(self, bytecode, w_self, lexical_scope, cells, block,
-                parent_interp, top_parent_interp, regexp_match_cell,
+                parent_activation, top_parent_activation, regexp_match_cell,
                 is_lambda=False):
         return W_ProcObject(
-            self, bytecode, w_self, lexical_scope, cells, block, parent_interp,
-            top_parent_interp, regexp_match_cell, is_lambda=False
+            self, bytecode, w_self, lexical_scope, cells, block, parent_activation,
+            top_parent_activation, regexp_match_cell, is_lambda=False
         )
 
     def _findconstraintvariable(self, cell=None, w_owner=None, ivar=None, cvar=None, idx=-1, w_key=None, w_self=None):
@@ -485,12 +494,21 @@ class ObjectSpace(object):
             elif idx >= 0:
                 assert isinstance(w_owner, W_ArrayObject)
                 c_var = w_owner.find_constraint_on_idx(self, idx)
+            elif w_key is not None:
+                assert isinstance(w_owner, W_HashObject)
+                c_var = w_owner.find_constraint_on_key(self, w_key)
             else:
-                # TODO: Dictionary constraints
                 raise NotImplementedError
         assert c_var is None or isinstance(c_var, ConstrainedVariable)
         return c_var
 
+    def may_have_constraint_ivars(self, w_obj):
+        # the map tells whether a plain object has constrained instance
+        # variables, unless a constraint is being built that could add one
+        if isinstance(w_obj, W_Object) and not jit.promote(w_obj.map).has_constraint_vars:
+            return self.is_constructing_constraint()
+        return True
+
     def newconstraintvariable(self, cell=None, w_owner=None, ivar=None, cvar=None, idx=-1, w_key=None, w_self=None):
         c_var = self._findconstraintvariable(cell=cell, w_owner=w_owner, ivar=ivar, cvar=cvar, idx=idx, w_key=w_key, w_self=w_self)
 
@@ -512,8 +530,10 @@ class ObjectSpace(object):
                 elif idx >= 0:
                     assert isinstance(w_owner, W_ArrayObject)
                     w_owner.set_constraint_on_idx(self, idx, c_var)
+                elif w_key is not None:
+                    assert isinstance(w_owner, W_HashObject)
+                    w_owner.set_constraint_on_key(self, w_key, c_var)
                 else:
-                    # TODO: dictionary constraints
                     raise NotImplementedError
 
         if c_var and self.is_kind_of(c_var.load_value(self), self.w_constraintobject):
@@ -714,7 +734,11 @@ class ObjectSpace(object):
         if (self.is_constructing_constraint() and
             (self.is_kind_of(w_receiver, self.w_constraintobject) or self.w_constraintobject.is_ancestor_of(w_cls))):
             with self.normal_execution():
-                return self._send_raw(name, raw_method, w_receiver, w_cls, args_w, block)
+                w_res = self._send_raw(name, raw_method, w_receiver, w_cls, args_w, block)
+            w_constraint = self.current_constraint()
+            if w_constraint is not None:
+                w_constraint.record_send(self, w_receiver, name, args_w, block, w_res)
+            return w_res
         else:
             return self._send_raw(name, raw_method, w_receiver, w_cls, args_w, block)
 
@@ -748,8 +772,8 @@ class ObjectSpace(object):
         bc = block.bytecode
         frame = self.create_frame(
             bc, w_self=block.w_self, lexical_scope=block.lexical_scope,
-            block=block.block, parent_interp=block.parent_interp,
-            top_parent_interp=block.top_parent_interp,
+            block=block.block, parent_activation=block.parent_activation,
+            top_parent_activation=block.top_parent_activation,
             regexp_match_cell=block.regexp_match_cell,
         )
         if block.is_lambda:
@@ -968,11 +992,23 @@ class ObjectSpace(object):
 
     def end_multi_assignment(self):
         asgnmts = self.remembered_assignments.end()
-        for cvar in asgnmts.items():
-            cvar.assign(self)
+        for w_solver, c_vars in asgnmts.grouped_by_solver(self):
+            if self.assigns_per_variable(w_solver):
+                for c_var in c_vars:
+                    c_var.__assign__(self)
+            else:
+                # all proposed values are in the solver already, one
+                # run covers the whole group
+                c_vars[0].__assign__(self)
+                for c_var in c_vars[1:]:
+                    c_var.__assign__(self, solve=False)
         for cvar in asgnmts.items():
             cvar.end_assign(self)
 
+    def assigns_per_variable(self, w_solver):
+        return (self.respond_to(w_solver, "per_variable_assign?") and
+                self.is_true(self.send(w_solver, "per_variable_assign?")))
+
     def current_execution_mode(self):
         return self._executionmodes.get()
 
@@ -993,6 +1029,10 @@ class ObjectSpace(object):
         else:
             return None
 
+    def method_redefined(self, name):
+        if name == "weight":
+            self.fromcache(SolverRegistry).invalidate()
+
     def set_current_solver(self, w_solver):
         w_constraint = self.current_constraint()
         if w_constraint:
@@ -1106,3 +1146,24 @@ class RememberedAssignments(object):
 
     def items(self):
         return self._assignments
+
+    def grouped_by_solver(self, space):
+        solvers_w = []
+        groups = []
+        seen = []
+        for c_var in self._assignments:
+            for other in c_var.all_identical_variables([]):
+                if other in seen:
+                    continue
+                seen.append(other)
+                w_solver = other.defining_solver(space)
+                if w_solver is None:
+                    continue
+                for i, w_group_solver in enumerate(solvers_w):
+                    if w_group_solver is w_solver:
+                        groups[i].append(other)
+                        break
+                else:
+                    solvers_w.append(w_solver)
+                    groups.append([other])
+        return [(solvers_w[i], groups[i]) for i in range(len(groups))]
@@ -0,0 +1,336 @@
+"""The DeltaBlue incremental local propagation planner, as used by the
+DeltaBlue solver object.
+
+Constraints have one or more methods, each of which computes a single
+output variable from its inputs. Adding and removing constraints
+incrementally chooses a method for every satisfied constraint such that
+stronger constraints are preferred. Planning never looks at values:
+methods that have to run while the graph changes are queued in
+`executed`, in the order DeltaBlue would run them, for the caller to
+run. Every change to the methods chosen for non-edit constraints bumps
+`version`, plans extracted at an older version may be stale.
+
+A change that fails raises a PlanningError and leaves the graph
+consistent: a failed add is undone, and constraints that closed a cycle
+while being resatisfied are dropped from the graph and reported by
+`take_dropped`.
+"""
+
+REQUIRED = 0
+STRONG = 1
+MEDIUM = 2
+WEAK = 3
+WEAKEST = 4
+
+
+class PlanningError(Exception):
+    pass
+
+
+class Unsatisfiable(PlanningError):
+    pass
+
+
+class Cycle(PlanningError):
+    pass
+
+
+def stronger(a, b):
+    return a < b
+
+
+def weaker(a, b):
+    return a > b
+
+
+def weakest_of(a, b):
+    if weaker(a, b):
+        return a
+    return b
+
+
+class Variable(object):
+    def __init__(self, owner):
+        self.owner = owner
+        self.constraints = []
+        self.determined_by = None
+        self.mark = 0
+        self.walk_strength = WEAKEST
+        # the value is not computed from an edited variable
+        self.stay = True
+
+
+class Method(object):
+    def __init__(self, output, inputs):
+        self.output = output
+        self.inputs = inputs
+
+
+class Constraint(object):
+    def __init__(self, strength, methods, is_input=False, owner=None):
+        self.strength = strength
+        self.methods = methods
+        # the solver object's constraint, if there is one
+        self.owner = owner
+        # index of the chosen method, -1 if unsatisfied
+        self.selected = -1
+        # edit constraints make their output the source of a plan
+        self.is_input = is_input
+        self.in_graph = False
+
+    def is_satisfied(self):
+        return self.selected >= 0
+
+    def method(self):
+        return self.methods[self.selected]
+
+    def output(self):
+        return self.methods[self.selected].output
+
+    def variables(self):
+        variables = []
+        for method in self.methods:
+            for v in method.inputs + [method.output]:
+                if v not in variables:
+                    variables.append(v)
+        return variables
+
+    def add_to_graph(self):
+        for v in self.variables():
+            v.constraints.append(self)
+        self.selected = -1
+        self.in_graph = True
+
+    def remove_from_graph(self):
+        for v in self.variables():
+            v.constraints.remove(self)
+        self.selected = -1
+        self.in_graph = False
+
+    def choose_method(self, mark):
+        # the method whose output is weakest, if that is weaker than us
+        best = -1
+        best_strength = self.strength
+        for i, method in enumerate(self.methods):
+            output = method.output
+            if output.mark != mark and weaker(output.walk_strength, best_strength):
+                best = i
+                best_strength = output.walk_strength
+        return best
+
+    def reads(self, v):
+        # constraints only consume variables their chosen method reads,
+        # other methods may have other inputs
+        return v in self.method().inputs
+
+    def mark_inputs(self, mark):
+        for v in self.method().inputs:
+            v.mark = mark
+
+    def inputs_known(self, mark):
+        for v in self.method().inputs:
+            if not (v.mark == mark or v.stay or v.determined_by is None):
+                return False
+        return True
+
+    def recalculate(self):
+        # the output can be changed by retracting the weakest of this
+        # constraint and the constraints upstream of the other outputs
+        method = self.method()
+        output = method.output
+        strength = self.strength
+        for other in self.methods:
+            if other.output is not output:
+                strength = weakest_of(strength, other.output.walk_strength)
+        output.walk_strength = strength
+        stay = not self.is_input
+        for v in method.inputs:
+            if not v.stay:
+                stay = False
+        output.stay = stay
+        return stay
+
+
+class Planner(object):
+    def __init__(self):
+        self.current_mark = 0
+        self.version = 0
+        # constraints whose methods have to run, in order
+        self.executed = []
+        # constraints that lost their method while the graph changed
+        self.displaced = []
+        # constraints taken out of the graph because they closed a cycle
+        self.dropped = []
+
+    def new_mark(self):
+        self.current_mark += 1
+        return self.current_mark
+
+    def changed(self, c):
+        if not c.is_input:
+            self.version += 1
+
+    def take_executed(self):
+        executed = self.executed
+        self.executed = []
+        return executed
+
+    def take_dropped(self):
+        dropped = self.dropped
+        self.dropped = []
+        return dropped
+
+    def add_constraint(self, c):
+        c.add_to_graph()
+        self.changed(c)
+        start = len(self.dropped)
+        del self.displaced[:]
+        try:
+            self.incremental_add(c)
+        except PlanningError:
+            self.undo_add(c, start)
+            raise
+        del self.displaced[:]
+
+    def undo_add(self, c, start):
+        # takes c out again, puts back the constraints that closed a
+        # cycle because of it and resatisfies the ones it displaced
+        retry = self.displaced
+        self.displaced = []
+        for d in self.dropped[start:]:
+            if d is not c:
+                d.add_to_graph()
+                retry.append(d)
+        del self.dropped[start:]
+        if c.in_graph:
+            self.changed(c)
+            if c.is_satisfied():
+                retry.extend(self.unlink(c))
+            else:
+                c.remove_from_graph()
+        # the add fails either way, later errors would only hide why
+        self.resatisfy(retry)
+
+    def remove_constraint(self, c):
+        if not c.in_graph:
+            return
+        self.changed(c)
+        if c.is_satisfied():
+            error = self.incremental_remove(c)
+            del self.displaced[:]
+            if error is not None:
+                raise error
+        else:
+            c.remove_from_graph()
+
+    def incremental_add(self, c):
+        mark = self.new_mark()
+        overridden = self.satisfy(c, mark)
+        while overridden is not None:
+            overridden = self.satisfy(overridden, mark)
+
+    def satisfy(self, c, mark):
+        selected = c.choose_method(mark)
+        if selected != c.selected:
+            self.changed(c)
+        c.selected = selected
+        if selected < 0:
+            if c.strength == REQUIRED:
+                raise Unsatisfiable
+            return None
+        c.mark_inputs(mark)
+        output = c.output()
+        overridden = output.determined_by
+        if overridden is not None:
+            self.changed(overridden)
+            overridden.selected = -1
+            self.displaced.append(overridden)
+        output.determined_by = c
+        if not self.add_propagate(c, mark):
+            self.dropped.append(c)
+            self.incremental_remove(c)
+            raise Cycle
+        output.mark = mark
+        return overridden
+
+    def add_propagate(self, c, mark):
+        todo = [c]
+        while todo:
+            d = todo.pop(0)
+            if d.output().mark == mark:
+                return False
+            if d.recalculate():
+                self.executed.append(d)
+            self.add_constraints_consuming_to(d.output(), todo)
+        return True
+
+    def incremental_remove(self, c):
+        return self.resatisfy(self.unlink(c))
+
+    def unlink(self, c):
+        # takes a satisfied constraint out of the graph
+        output = c.output()
+        self.changed(c)
+        c.selected = -1
+        c.remove_from_graph()
+        return self.remove_propagate_from(output)
+
+    def resatisfy(self, unsatisfied):
+        # strongest first. A constraint that fails stays unsatisfied or
+        # is dropped, the others are still tried and the first error is
+        # returned
+        error = None
+        for strength in range(REQUIRED, WEAKEST):
+            for u in unsatisfied:
+                if u.strength == strength and u.in_graph and not u.is_satisfied():
+                    try:
+                        self.incremental_add(u)
+                    except PlanningError as e:
+                        if error is None:
+                            error = e
+        return error
+
+    def remove_propagate_from(self, output):
+        # resets what the removed constraint determined and returns the
+        # unsatisfied constraints that may be satisfiable now
+        output.determined_by = None
+        output.walk_strength = WEAKEST
+        output.stay = True
+        unsatisfied = []
+        todo = [output]
+        while todo:
+            v = todo.pop()
+            for c in v.constraints:
+                if not c.is_satisfied() and c not in unsatisfied:
+                    unsatisfied.append(c)
+            determining = v.determined_by
+            for c in v.constraints:
+                if c is not determining and c.is_satisfied() and c.reads(v):
+                    if c.recalculate():
+                        self.executed.append(c)
+                    todo.append(c.output())
+        return unsatisfied
+
+    def add_constraints_consuming_to(self, v, todo):
+        determining = v.determined_by
+        for c in v.constraints:
+            if c is not determining and c.is_satisfied() and c.reads(v):
+                todo.append(c)
+
+    def extract_plan(self, sources):
+        # the satisfied edit constraints among sources and everything
+        # downstream of them, in an order that computes inputs first
+        mark = self.new_mark()
+        plan = []
+        todo = []
+        for c in sources:
+            if c.is_input and c.is_satisfied():
+                todo.append(c)
+        while todo:
+            c = todo.pop(0)
+            output = c.output()
+            if output.mark != mark and c.inputs_known(mark):
+                plan.append(c)
+                output.mark = mark
+                self.add_constraints_consuming_to(output, todo)
+        return plan
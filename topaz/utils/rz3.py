@@ -2,6 +2,8 @@ import os
 import platform
 import sys
 
+from rpython.rlib.rarithmetic import intmask
+from rpython.rtyper.annlowlevel import llhelper
 from rpython.rtyper.tool import rffi_platform
 from rpython.rtyper.lltypesystem import rffi, lltype
 from rpython.translator.tool.cbuild import ExternalCompilationInfo
@@ -126,6 +128,26 @@ def z3_get_numeral_int(ctx, ast):
     else:
         return result
 
+_z3_get_numeral_int64 = rffi.llexternal(
+    "Z3_get_numeral_int64",
+    [Z3_context, Z3_ast, rffi.LONGLONGP],
+    Z3_bool,
+    compilation_info=eci
+)
+
+def z3_get_numeral_int64(ctx, ast):
+    ptr = lltype.malloc(rffi.LONGLONGP.TO, 1, flavor='raw', zero=True)
+    status = _z3_get_numeral_int64(ctx, ast, ptr)
+    result = ptr[0]
+    lltype.free(ptr, flavor='raw')
+    if status != 1:
+        raise Z3Error("result does not fit into int64")
+    else:
+        return result
+
+z3_get_numerator = rffi.llexternal("Z3_get_numerator", [Z3_context, Z3_ast], Z3_ast, compilation_info=eci)
+z3_get_denominator = rffi.llexternal("Z3_get_denominator", [Z3_context, Z3_ast], Z3_ast, compilation_info=eci)
+
 if _64BIT:
     _z3_get_numeral_real = rffi.llexternal(
         "Z3_get_numeral_rational_int64",
@@ -159,17 +181,16 @@ if _64BIT:
                 return 0
             return fnom / fden
 else:
-    _z3_get_denominator = rffi.llexternal("Z3_get_denominator", [Z3_context, Z3_ast], Z3_ast, compilation_info=eci)
-    _z3_get_numerator = rffi.llexternal("Z3_get_numerator", [Z3_context, Z3_ast], Z3_ast, compilation_info=eci)
     def z3_get_numeral_real(ctx, ast):
-        nom_ast = _z3_get_numerator(ctx, ast)
-        den_ast = _z3_get_denominator(ctx, ast)
+        nom_ast = z3_get_numerator(ctx, ast)
+        den_ast = z3_get_denominator(ctx, ast)
         nom = z3_get_numeral_int(ctx, nom_ast)
         den = z3_get_numeral_int(ctx, den_ast)
         return float(nom) / float(den)
 
 z3_is_algebraic_number = rffi.llexternal("Z3_is_algebraic_number", [Z3_context, Z3_ast], rffi.INT, compilation_info=eci)
 z3_get_algebraic_number_upper = rffi.llexternal("Z3_get_algebraic_number_upper", [Z3_context, Z3_ast, rffi.UINT], Z3_ast, compilation_info=eci)
+z3_get_algebraic_number_lower = rffi.llexternal("Z3_get_algebraic_number_lower", [Z3_context, Z3_ast, rffi.UINT], Z3_ast, compilation_info=eci)
 
 z3_get_ast_kind = rffi.llexternal("Z3_get_ast_kind", [Z3_context, Z3_ast], rffi.INT, compilation_info=eci)
 z3_get_app_decl = rffi.llexternal("Z3_get_app_decl", [Z3_context, Z3_ast], Z3_func_decl, compilation_info=eci)
@@ -196,6 +217,7 @@ binop("Z3_mk_eq")
 binop("Z3_mk_div")
 binop("Z3_mk_rem")
 binop("Z3_mk_mod")
+binop("Z3_mk_implies")
 
 z3_mk_unary_minus = rffi.llexternal("Z3_mk_unary_minus", [Z3_context, Z3_ast], Z3_ast, compilation_info=eci)
 
@@ -214,6 +236,18 @@ def multiop(name):
             return ast
         method.__name__ = name.lower()
         globals()[name.lower()] = method
+
+        # the same over any number of arguments, as one flat term
+        def method_n(ctx, asts):
+            size = len(asts)
+            ptr = lltype.malloc(Z3_astP.TO, size, flavor='raw')
+            for i, ast in enumerate(asts):
+                ptr[i] = ast
+            ast = func(ctx, size, ptr)
+            lltype.free(ptr, flavor='raw')
+            return ast
+        method_n.__name__ = name.lower() + "_n"
+        globals()[name.lower() + "_n"] = method_n
     create_method(
         rffi.llexternal(
             name,
@@ -231,6 +265,8 @@ multiop("Z3_mk_mul")
 # Numerals
 z3_mk_real = rffi.llexternal("Z3_mk_real", [Z3_context, rffi.INT, rffi.INT], Z3_ast, compilation_info=eci)
 z3_mk_int = rffi.llexternal("Z3_mk_int", [Z3_context, rffi.INT, Z3_sort], Z3_ast, compilation_info=eci)
+z3_mk_int64 = rffi.llexternal("Z3_mk_int64", [Z3_context, rffi.LONGLONG, Z3_sort], Z3_ast, compilation_info=eci)
+z3_mk_numeral = rffi.llexternal("Z3_mk_numeral", [Z3_context, rffi.CCHARP, Z3_sort], Z3_ast, compilation_info=eci)
 
 # Propositional Logic
 _z3_mk_distinct = rffi.llexternal("Z3_mk_distinct", [Z3_context, rffi.UINT, Z3_astP], Z3_ast, compilation_info=eci)
@@ -267,6 +303,7 @@ z3_mk_int_symbol = rffi.llexternal(
 
 # Constants
 z3_mk_const = rffi.llexternal("Z3_mk_const", [Z3_context, Z3_symbol, Z3_sort], Z3_ast, compilation_info=eci)
+z3_mk_fresh_const = rffi.llexternal("Z3_mk_fresh_const", [Z3_context, rffi.CCHARP, Z3_sort], Z3_ast, compilation_info=eci)
 
 # Models
 Z3_model = rffi.COpaquePtr("Z3_model")
@@ -286,6 +323,34 @@ z3_model_has_interp = rffi.llexternal(
 # Solvers
 Z3_solver = rffi.COpaquePtr("Z3_solver")
 z3_mk_solver = rffi.llexternal("Z3_mk_solver", [Z3_context], Z3_solver, compilation_info=eci)
+z3_mk_solver_for_logic = rffi.llexternal(
+    "Z3_mk_solver_for_logic",
+    [Z3_context, Z3_symbol],
+    Z3_solver,
+    compilation_info=eci
+)
+Z3_tactic = rffi.COpaquePtr("Z3_tactic")
+z3_mk_tactic = rffi.llexternal("Z3_mk_tactic", [Z3_context, rffi.CCHARP], Z3_tactic, compilation_info=eci)
+z3_mk_solver_from_tactic = rffi.llexternal(
+    "Z3_mk_solver_from_tactic",
+    [Z3_context, Z3_tactic],
+    Z3_solver,
+    compilation_info=eci
+)
+Z3_params = rffi.COpaquePtr("Z3_params")
+z3_mk_params = rffi.llexternal("Z3_mk_params", [Z3_context], Z3_params, compilation_info=eci)
+z3_params_set_uint = rffi.llexternal(
+    "Z3_params_set_uint",
+    [Z3_context, Z3_params, Z3_symbol, rffi.UINT],
+    lltype.Void,
+    compilation_info=eci
+)
+z3_solver_set_params = rffi.llexternal(
+    "Z3_solver_set_params",
+    [Z3_context, Z3_solver, Z3_params],
+    lltype.Void,
+    compilation_info=eci
+)
 z3_solver_check = rffi.llexternal(
     "Z3_solver_check",
     [Z3_context, Z3_solver],
@@ -304,11 +369,51 @@ z3_solver_get_model = rffi.llexternal(
     Z3_model,
     compilation_info=eci
 )
+_z3_solver_check_assumptions = rffi.llexternal(
+    "Z3_solver_check_assumptions",
+    [Z3_context, Z3_solver, rffi.UINT, Z3_astP],
+    Z3_bool,
+    compilation_info=eci
+)
+def z3_solver_check_assumptions(ctx, solver, assumptions):
+    size = len(assumptions)
+    ptr = lltype.malloc(Z3_astP.TO, size, flavor='raw')
+    for i, ast in enumerate(assumptions):
+        ptr[i] = ast
+    result = _z3_solver_check_assumptions(ctx, solver, size, ptr)
+    lltype.free(ptr, flavor='raw')
+    return result
+
+Z3_ast_vector = rffi.COpaquePtr("Z3_ast_vector")
+_z3_solver_get_unsat_core = rffi.llexternal(
+    "Z3_solver_get_unsat_core",
+    [Z3_context, Z3_solver],
+    Z3_ast_vector,
+    compilation_info=eci
+)
+z3_ast_vector_size = rffi.llexternal("Z3_ast_vector_size", [Z3_context, Z3_ast_vector], rffi.UINT, compilation_info=eci)
+z3_ast_vector_get = rffi.llexternal("Z3_ast_vector_get", [Z3_context, Z3_ast_vector, rffi.UINT], Z3_ast, compilation_info=eci)
+z3_ast_vector_inc_ref = rffi.llexternal("Z3_ast_vector_inc_ref", [Z3_context, Z3_ast_vector], lltype.Void, compilation_info=eci)
+z3_ast_vector_dec_ref = rffi.llexternal("Z3_ast_vector_dec_ref", [Z3_context, Z3_ast_vector], lltype.Void, compilation_info=eci)
+def z3_solver_get_unsat_core(ctx, solver):
+    vector = _z3_solver_get_unsat_core(ctx, solver)
+    z3_ast_vector_inc_ref(ctx, vector)
+    size = intmask(z3_ast_vector_size(ctx, vector))
+    asts = [z3_ast_vector_get(ctx, vector, i) for i in range(size)]
+    z3_ast_vector_dec_ref(ctx, vector)
+    return asts
+
 z3_solver_reset = rffi.llexternal("Z3_solver_reset", [Z3_context, Z3_solver], lltype.Void, compilation_info=eci)
+z3_solver_push = rffi.llexternal("Z3_solver_push", [Z3_context, Z3_solver], lltype.Void, compilation_info=eci)
+z3_solver_pop = rffi.llexternal("Z3_solver_pop", [Z3_context, Z3_solver, rffi.UINT], lltype.Void, compilation_info=eci)
 
 # Refcounting
 z3_solver_inc_ref = rffi.llexternal("Z3_solver_inc_ref", [Z3_context, Z3_solver], lltype.Void, compilation_info=eci)
 z3_solver_dec_ref = rffi.llexternal("Z3_solver_dec_ref", [Z3_context, Z3_solver], lltype.Void, compilation_info=eci)
+z3_tactic_inc_ref = rffi.llexternal("Z3_tactic_inc_ref", [Z3_context, Z3_tactic], lltype.Void, compilation_info=eci)
+z3_tactic_dec_ref = rffi.llexternal("Z3_tactic_dec_ref", [Z3_context, Z3_tactic], lltype.Void, compilation_info=eci)
+z3_params_inc_ref = rffi.llexternal("Z3_params_inc_ref", [Z3_context, Z3_params], lltype.Void, compilation_info=eci)
+z3_params_dec_ref = rffi.llexternal("Z3_params_dec_ref", [Z3_context, Z3_params], lltype.Void, compilation_info=eci)
 z3_model_inc_ref = rffi.llexternal("Z3_model_inc_ref", [Z3_context, Z3_model], lltype.Void, compilation_info=eci)
 z3_model_dec_ref = rffi.llexternal("Z3_model_dec_ref", [Z3_context, Z3_model], lltype.Void, compilation_info=eci)
 z3_ast_inc_ref = rffi.llexternal("Z3_inc_ref", [Z3_context, Z3_ast], lltype.Void, compilation_info=eci)
@@ -316,6 +421,19 @@ z3_ast_dec_ref = rffi.llexternal("Z3_dec_ref", [Z3_context, Z3_ast], lltype.Void
 
 # Errors
 z3_get_error_code = rffi.llexternal("Z3_get_error_code", [Z3_context], rffi.INT, compilation_info=eci)
+Z3_error_handler = lltype.Ptr(lltype.FuncType([Z3_context, rffi.INT], lltype.Void))
+z3_set_error_handler = rffi.llexternal(
+    "Z3_set_error_handler",
+    [Z3_context, Z3_error_handler],
+    lltype.Void,
+    compilation_info=eci
+)
+def _ignore_error(ctx, code):
+    pass
+def z3_ignore_errors(ctx):
+    # the default handler prints the error and exits the process, without
+    # one failing calls only set the error code for z3_get_error_code
+    z3_set_error_handler(ctx, llhelper(Z3_error_handler, _ignore_error))
 _z3_ast_to_string = rffi.llexternal("Z3_ast_to_string", [Z3_context, Z3_ast], rffi.CCHARP, compilation_info=eci)
 def z3_ast_to_string(ctx, ast):
     return rffi.charp2str(_z3_ast_to_string(ctx, ast))
@@ -0,0 +1,288 @@
+"""A dense simplex tableau minimizing a lexicographic series of
+objectives, as used by SimplexSolver.
+
+Every column is a non-negative variable. The objectives are kept as rows
+of reduced costs, level 0 is compared first and belongs to the
+artificial columns of phase one. Optimal tableaux are reused: rows can
+be added and removed, cost changes keep the basis primal feasible and
+are repaired with the primal simplex (optimize), right hand side changes
+keep it dual feasible and are repaired with the dual simplex
+(restore_feasibility).
+"""
+
+EPSILON = 1e-9
+# largest value of an artificial column still taken as zero
+TOLERANCE = 1e-7
+
+
+class Infeasible(Exception):
+    pass
+
+
+class Unbounded(Exception):
+    pass
+
+
+class Tableau(object):
+    def __init__(self, nlevels):
+        self.nrows = 0
+        self.ncols = 0
+        self.rows = []
+        self.rhs = []
+        self.objectives = [[] for k in range(nlevels)]
+        # row -> basic column and column -> row, or -1
+        self.basis = []
+        self.basic_row = []
+        # columns that may not enter the basis (any more)
+        self.barred = []
+        # objectives before this level are not compared
+        self.first_level = 1
+
+    def add_column(self):
+        for row in self.rows:
+            row.append(0.0)
+        for objective in self.objectives:
+            objective.append(0.0)
+        self.basic_row.append(-1)
+        self.barred.append(False)
+        self.ncols += 1
+        return self.ncols - 1
+
+    def add_row(self):
+        self.rows.append([0.0] * self.ncols)
+        self.rhs.append(0.0)
+        self.basis.append(-1)
+        self.nrows += 1
+        return self.nrows - 1
+
+    def remove_row(self, r):
+        del self.rows[r]
+        del self.rhs[r]
+        col = self.basis.pop(r)
+        if col >= 0:
+            self.basic_row[col] = -1
+        self.nrows -= 1
+        for i in range(r, self.nrows):
+            if self.basis[i] >= 0:
+                self.basic_row[self.basis[i]] = i
+
+    def set_basic(self, row, col):
+        self.basis[row] = col
+        self.basic_row[col] = row
+
+    def value(self, col):
+        row = self.basic_row[col]
+        if row < 0:
+            return 0.0
+        return self.rhs[row]
+
+    def add_cost(self, level, col, delta):
+        # keeps the reduced costs priced out against the current basis
+        objective = self.objectives[level]
+        row = self.basic_row[col]
+        if row >= 0:
+            self.eliminate(objective, self.rows[row], delta)
+        objective[col] += delta
+
+    def shift_rhs(self, col, delta):
+        # the result of changing the constant that col is measured
+        # from by delta, col itself moves by -delta to compensate
+        for i in range(self.nrows):
+            factor = self.rows[i][col]
+            if factor != 0.0:
+                self.rhs[i] -= delta * factor
+
+    def canonicalize(self, r):
+        # expresses a new row in the current nonbasic columns
+        row = self.rows[r]
+        for j in range(self.ncols):
+            factor = row[j]
+            i = self.basic_row[j]
+            if factor != 0.0 and i >= 0 and i != r:
+                self.eliminate(row, self.rows[i], factor)
+                self.rhs[r] -= factor * self.rhs[i]
+                row[j] = 0.0
+
+    def negate(self, r):
+        row = self.rows[r]
+        for j in range(self.ncols):
+            row[j] = -row[j]
+        self.rhs[r] = -self.rhs[r]
+
+    def eliminate(self, target, row, factor):
+        for j in range(self.ncols):
+            entry = row[j]
+            if entry != 0.0:
+                target[j] -= factor * entry
+
+    def pivot(self, r, c):
+        row = self.rows[r]
+        inverse = 1.0 / row[c]
+        nonzero = []
+        for j in range(self.ncols):
+            if row[j] != 0.0:
+                row[j] *= inverse
+                nonzero.append(j)
+        row[c] = 1.0
+        self.rhs[r] *= inverse
+        rhs = self.rhs[r]
+        for i in range(self.nrows):
+            if i != r:
+                factor = self.rows[i][c]
+                if factor != 0.0:
+                    self.eliminate_nonzero(self.rows[i], row, c, nonzero)
+                    self.rhs[i] -= factor * rhs
+        for objective in self.objectives:
+            self.eliminate_nonzero(objective, row, c, nonzero)
+        old = self.basis[r]
+        if old >= 0:
+            self.basic_row[old] = -1
+        self.set_basic(r, c)
+
+    def eliminate_nonzero(self, target, row, c, nonzero):
+        factor = target[c]
+        if factor != 0.0:
+            for j in nonzero:
+                target[j] -= factor * row[j]
+            target[c] = 0.0
+
+    def lex_sign(self, col):
+        for k in range(self.first_level, len(self.objectives)):
+            cost = self.objectives[k][col]
+            if cost < -EPSILON:
+                return -1
+            elif cost > EPSILON:
+                return 1
+        return 0
+
+    def optimize(self):
+        while True:
+            col = self.entering_column()
+            if col < 0:
+                return
+            row = self.leaving_row(col)
+            if row < 0:
+                raise Unbounded
+            self.pivot(row, col)
+
+    def entering_column(self):
+        # Bland's rule, the first improving column
+        for j in range(self.ncols):
+            if not self.barred[j] and self.basic_row[j] < 0 and self.lex_sign(j) < 0:
+                return j
+        return -1
+
+    def leaving_row(self, col):
+        best = -1
+        best_ratio = 0.0
+        for r in range(self.nrows):
+            entry = self.rows[r][col]
+            if entry > EPSILON:
+                ratio = self.rhs[r] / entry
+                if (best < 0 or ratio < best_ratio - EPSILON or
+                        (ratio <= best_ratio + EPSILON and self.basis[r] < self.basis[best])):
+                    best = r
+                    best_ratio = ratio
+        return best
+
+    def restore_feasibility(self):
+        while True:
+            row = -1
+            worst = -EPSILON
+            for r in range(self.nrows):
+                if self.rhs[r] < worst:
+                    row = r
+                    worst = self.rhs[r]
+            if row < 0:
+                return
+            col = self.dual_entering_column(row)
+            if col < 0:
+                raise Infeasible
+            self.pivot(row, col)
+
+    def dual_entering_column(self, r):
+        # the column whose reduced costs over the pivot entry are
+        # lexicographically smallest, which keeps the tableau optimal
+        row = self.rows[r]
+        best = -1
+        for j in range(self.ncols):
+            if not self.barred[j] and self.basic_row[j] < 0 and row[j] < -EPSILON:
+                if best < 0 or self.ratio_less(j, -row[j], best, -row[best]):
+                    best = j
+        return best
+
+    def ratio_less(self, j, a, i, b):
+        for k in range(self.first_level, len(self.objectives)):
+            objective = self.objectives[k]
+            lhs = objective[j] / a
+            rhs = objective[i] / b
+            if lhs < rhs - EPSILON:
+                return True
+            elif lhs > rhs + EPSILON:
+                return False
+        return False
+
+    def retire(self, col):
+        # Takes an artificial column at zero out of the basis where its
+        # row allows that, keeps it from entering again and drops its
+        # phase one cost, which later pivots would spread otherwise
+        r = self.basic_row[col]
+        if r >= 0:
+            self.rhs[r] = 0.0
+            row = self.rows[r]
+            for j in range(self.ncols):
+                if j != col and not self.barred[j] and (row[j] > EPSILON or row[j] < -EPSILON):
+                    self.pivot(r, j)
+                    break
+        self.barred[col] = True
+        self.add_cost(0, col, -1.0)
+
+    def pin(self, col):
+        # Keeps a column at zero: bars it, after pivoting it out of the
+        # basis where it is basic at zero. False if its row has no other
+        # column to pivot on
+        r = self.basic_row[col]
+        if r >= 0:
+            if self.rhs[r] > EPSILON or self.rhs[r] < -EPSILON:
+                return False
+            row = self.rows[r]
+            pivoted = False
+            for j in range(self.ncols):
+                if j != col and not self.barred[j] and (row[j] > EPSILON or row[j] < -EPSILON):
+                    self.pivot(r, j)
+                    pivoted = True
+                    break
+            if not pivoted:
+                return False
+        self.barred[col] = True
+        return True
+
+    def unpin(self, col):
+        self.barred[col] = False
+
+    def remove_marked_row(self, marker):
+        # Drops the row an artificial column was added with. Pivoting the
+        # marker into the basis picks the row so that the others stay
+        # feasible, what is left is optimal for the remaining rows
+        r = self.basic_row[marker]
+        if r < 0:
+            r = self.marker_row(marker)
+            if r < 0:
+                raise Infeasible
+            self.pivot(r, marker)
+        self.remove_row(r)
+
+    def marker_row(self, marker):
+        best = -1
+        best_ratio = 0.0
+        for negative in [True, False]:
+            for r in range(self.nrows):
+                entry = self.rows[r][marker]
+                if (entry < -EPSILON) if negative else (entry > EPSILON):
+                    ratio = self.rhs[r] / (-entry if negative else entry)
+                    if best < 0 or ratio < best_ratio:
+                        best = r
+                        best_ratio = ratio
+            if best >= 0:
+                return best
+        return best